@@ -4,4 +4,7 @@ set -o errexit
 pip install -r requirements.txt
 python manage.py collectstatic --no-input
 python manage.py migrate
+python manage.py build_image_variants
+python manage.py manage_booking_partitions
+python manage.py rebuild_search_index --if-empty
 python manage.py create_default_superuser
@@ -0,0 +1,78 @@
+"""Gunicorn settings for the web process (see Procfile).
+
+The app is loaded once in the master (``preload_app``) and warmed up
+there: templates compiled, URL patterns resolved and the lazily imported
+modules loaded (see ``hostels/startup.py``). Workers are forked from the
+warm master, so a deploy or scale-up does not make its first requests pay
+for that work, and the workers share the master's memory pages. The
+warm-up never touches the database. Each worker opens its own connection
+pool after the fork.
+
+Settings come from the environment:
+
+``WEB_CONCURRENCY``
+    Worker processes. Defaults to the CPUs this container may use (cgroup
+    quota or affinity, not the host's count): one per CPU plus one for
+    the async uvicorn workers, twice that plus one for sync workers.
+``GUNICORN_WORKER_CLASS``
+    ``uvicorn_worker.UvicornWorker`` (the default) for ``hostels.asgi``;
+    ``gthread`` for ``hostels.wsgi``.
+``GUNICORN_THREADS``
+    Threads per ``gthread`` worker (default 4). Uvicorn workers ignore it.
+``GUNICORN_PRELOAD``
+    ``0`` loads and warms the app in each worker instead, e.g. to let
+    ``kill -HUP`` pick up new code.
+``GUNICORN_TIMEOUT``
+    Seconds before a silent worker is restarted (default 30).
+"""
+
+import gc
+import math
+import os
+
+
+def _cpu_count():
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as source:
+            quota, period = source.read().split()
+        if quota != "max":
+            return max(1, math.ceil(int(quota) / int(period)))
+    except (OSError, ValueError):
+        pass
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "uvicorn_worker.UvicornWorker")
+_cpus = _cpu_count()
+workers = int(os.getenv("WEB_CONCURRENCY", "0")) or (_cpus + 1 if "uvicorn" in worker_class else 2 * _cpus + 1)
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+preload_app = os.getenv("GUNICORN_PRELOAD", "1") == "1"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "30"))
+
+
+def _warm_up(log):
+    from hostels import startup
+
+    log.info("Warm-up: %s", startup.describe(startup.warm_up()))
+
+
+def when_ready(server):
+    # Runs in the master after the preloaded app is imported, before any worker is forked.
+    if preload_app:
+        _warm_up(server.log)
+        # Keep the cycle collector off the objects every worker inherits;
+        # touching them would copy the shared pages into each worker.
+        gc.freeze()
+
+
+def post_worker_init(worker):
+    from hostels import startup
+
+    if not preload_app:
+        _warm_up(worker.log)
+    opened = startup.prime_connections()
+    if opened:
+        worker.log.info("Opened connection pools: %s", ", ".join(opened))
@@ -1,3 +1,20 @@
+"""ASGI entry point.
+
+Production runs this under gunicorn with uvicorn workers, preloaded and
+warmed up in the master (see Procfile and gunicorn.conf.py)::
+
+    gunicorn --config gunicorn.conf.py hostels.asgi:application
+
+The read-only views and the receipt download are async, so each worker
+serves many of them concurrently; receipt file I/O runs in a thread pool
+(``RECEIPT_RENDER_THREADS``) and rendering in ``run_workers``. The sync
+deployment still works::
+
+    GUNICORN_WORKER_CLASS=gthread gunicorn --config gunicorn.conf.py hostels.wsgi:application
+
+``python manage.py benchmark_asgi`` compares the two on the same machine.
+"""
+
 import os
 from django.core.asgi import get_asgi_application
 
@@ -37,11 +37,22 @@ MIDDLEWARE = [
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
 
+# Request profiling (see reservations/profiling.py). Off by default.
+PROFILING = os.getenv("PROFILING", "0") == "1"
+PROFILING_N_PLUS_ONE = int(os.getenv("PROFILING_N_PLUS_ONE", "10"))
+PROFILING_METRICS_TOKEN = os.getenv("PROFILING_METRICS_TOKEN", "")
+if PROFILING:
+    MIDDLEWARE.insert(0, "reservations.profiling.ProfilingMiddleware")
+
 ROOT_URLCONF = "hostels.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        "BACKEND": (
+            "reservations.profiling.ProfiledTemplates"
+            if PROFILING
+            else "django.template.backends.django.DjangoTemplates"
+        ),
         "DIRS": [BASE_DIR / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -57,16 +68,102 @@ TEMPLATES = [
 
 WSGI_APPLICATION = "hostels.wsgi.application"
 
+# With DATABASE_POOL=1 each process keeps a psycopg pool instead of one
+# persistent connection per thread. Size it so that web and worker
+# processes times DATABASE_POOL_MAX stays below Postgres' max_connections.
+DATABASE_POOL = os.getenv("DATABASE_POOL", "0") == "1"
+
+# SQLite takes the write lock at BEGIN so concurrent bookings wait their
+# turn instead of failing on lock upgrade.
+SQLITE_OPTIONS = {"transaction_mode": "IMMEDIATE", "timeout": 20}
+
+
+def _database(url):
+    postgres = url.startswith(("postgres://", "postgresql://"))
+    if not (DATABASE_POOL and postgres):
+        config = dj_database_url.parse(url, conn_max_age=600, conn_health_checks=True, ssl_require=postgres)
+        if config["ENGINE"] == "django.db.backends.sqlite3":
+            config["OPTIONS"] = {**SQLITE_OPTIONS, **config.get("OPTIONS", {})}
+        return config
+
+    # Pooled connections are returned after every request; Django requires
+    # CONN_MAX_AGE=0 here. With health checks on, Django has the pool check
+    # a connection before handing it out, so one the server dropped never
+    # reaches a request.
+    config = dj_database_url.parse(url, conn_max_age=0, conn_health_checks=True, ssl_require=True)
+    config["OPTIONS"]["pool"] = {
+        "min_size": int(os.getenv("DATABASE_POOL_MIN", "2")),
+        "max_size": int(os.getenv("DATABASE_POOL_MAX", "10")),
+        "timeout": float(os.getenv("DATABASE_POOL_TIMEOUT", "10")),
+        "max_idle": float(os.getenv("DATABASE_POOL_MAX_IDLE", "300")),
+    }
+    return config
+
+
 if os.getenv("DATABASE_URL"):
-    DATABASES = {"default": dj_database_url.config(conn_max_age=600, ssl_require=True)}
+    DATABASES = {"default": _database(os.environ["DATABASE_URL"])}
 else:
     DATABASES = {
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
             "NAME": BASE_DIR / "db.sqlite3",
+            "OPTIONS": dict(SQLITE_OPTIONS),
+        }
+    }
+
+# Read-only pages can read from a replica (see reservations/routers.py).
+# Any URL dj-database-url understands works, including sqlite:////path.
+if os.getenv("DATABASE_REPLICA_URL"):
+    DATABASES["replica"] = _database(os.environ["DATABASE_REPLICA_URL"])
+    DATABASES["replica"]["TEST"] = {"MIRROR": "default"}
+    DATABASE_ROUTERS = ["reservations.routers.PrimaryReplicaRouter"]
+    MIDDLEWARE.append("reservations.routers.ReplicaRoutingMiddleware")
+DATABASE_REPLICA_VIEWS = ["home", "hostel_detail", "hostel_search", "bookings_list", "staff_reports", "payment_export"]
+DATABASE_REPLICA_PIN_SECONDS = int(os.getenv("DATABASE_REPLICA_PIN_SECONDS", "10"))
+
+# Fragment caching needs no external service: per-process memory by default,
+# or a shared directory so every gunicorn worker sees the same entries.
+if os.getenv("CACHE_BACKEND", "locmem") == "file":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv("CACHE_LOCATION", str(BASE_DIR / ".cache")),
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "hostels",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
         }
     }
 
+# Sessions: "db" (Django's default), "cached_db", "cache" or
+# "signed_cookies". Only "db" and "cached_db" survive a cache flush, and
+# "cache" needs CACHE_BACKEND=file when several workers run.
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "db")
+SESSION_ENGINE = f"django.contrib.sessions.backends.{SESSION_BACKEND}"
+
+# AUTH_USER_CACHE=1 serves request.user from the cache (see reservations/auth.py).
+AUTH_USER_CACHE = os.getenv("AUTH_USER_CACHE", "0") == "1"
+AUTH_USER_CACHE_TIMEOUT = int(os.getenv("AUTH_USER_CACHE_TIMEOUT", "300"))
+if AUTH_USER_CACHE:
+    AUTHENTICATION_BACKENDS = ["reservations.auth.CachedModelBackend"]
+
+# 600k PBKDF2-SHA256 rounds is the OWASP recommendation; Django's own
+# default costs twice as much per login. Stored hashes are upgraded or
+# downgraded to this count at the next login.
+PASSWORD_HASH_ITERATIONS = int(os.getenv("PASSWORD_HASH_ITERATIONS", "600000"))
+PASSWORD_HASHERS = [
+    "reservations.auth.TunedPBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -94,12 +191,63 @@ USE_TZ = True
 STATIC_URL = "/static/"
 STATICFILES_DIRS = [BASE_DIR / "static"]
 STATIC_ROOT = BASE_DIR / "staticfiles"
-if not DEBUG:
-    STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
+# Uploads get content-hashed names (reservations/storage.py). Static files
+# get hashed, precompressed copies from whitenoise outside DEBUG. Receipts
+# hold guest details, so they are kept out of MEDIA_ROOT in RECEIPT_ROOT and
+# only sent by the booking_receipt view.
+RECEIPT_ROOT = Path(os.getenv("RECEIPT_ROOT", str(BASE_DIR / "private")))
+STORAGES = {
+    "default": {"BACKEND": "reservations.storage.HashedMediaStorage"},
+    "receipts": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+        "OPTIONS": {"location": RECEIPT_ROOT},
+    },
+    "staticfiles": {
+        "BACKEND": (
+            "django.contrib.staticfiles.storage.StaticFilesStorage"
+            if DEBUG
+            else "whitenoise.storage.CompressedManifestStaticFilesStorage"
+        ),
+    },
+}
 
 MEDIA_URL = "/media/"
 MEDIA_ROOT = Path(os.getenv("MEDIA_ROOT", BASE_DIR / "media"))
 SERVE_MEDIA = os.getenv("SERVE_MEDIA", "0") == "1"
+# How media is served when SERVE_MEDIA is on (see reservations/media.py):
+# "" sends files from Django, "x-accel" hands them to nginx, "x-sendfile"
+# to Apache/lighttpd.
+MEDIA_OFFLOAD = os.getenv("MEDIA_OFFLOAD", "")
+MEDIA_OFFLOAD_PREFIX = os.getenv("MEDIA_OFFLOAD_PREFIX", "/protected-media/")
+MEDIA_MAX_AGE = int(os.getenv("MEDIA_MAX_AGE", "3600"))
+RECEIPT_RENDER_THREADS = int(os.getenv("RECEIPT_RENDER_THREADS", "4"))
+# How long a receipt download waits for run_workers before rendering the
+# receipt itself.
+RECEIPT_WAIT_SECONDS = float(os.getenv("RECEIPT_WAIT_SECONDS", "3"))
+
+# Background jobs (see reservations/jobs.py), run by `manage.py run_workers`.
+# JOBS_EAGER=1 runs them in the web process after commit instead, which is
+# the default with DEBUG so development needs no worker.
+JOBS_EAGER = os.getenv("JOBS_EAGER", "1" if DEBUG else "0") == "1"
+JOBS_VISIBILITY_TIMEOUT = int(os.getenv("JOBS_VISIBILITY_TIMEOUT", "300"))
+
+# Unpaid self-service bookings hold their beds this long, after which
+# `manage.py expire_holds` deletes them (see reservations/holds.py).
+BOOKING_HOLD_HOURS = float(os.getenv("BOOKING_HOLD_HOURS", "24"))
+
+# The longest stay a booking may cover. Overlap checks rely on it to skip
+# bookings that start too early to reach the requested nights.
+BOOKING_MAX_NIGHTS = int(os.getenv("BOOKING_MAX_NIGHTS", "366"))
+
+# Bookings are partitioned by check-in year on PostgreSQL, and past years are
+# moved to ArchivedBooking with a gzipped JSONL copy in BOOKING_ARCHIVE_DIR
+# (see reservations/archive.py and `manage.py manage_booking_partitions`).
+# The copies hold guest details, so keep them out of MEDIA_ROOT.
+BOOKING_PARTITION_YEARS_AHEAD = int(os.getenv("BOOKING_PARTITION_YEARS_AHEAD", "2"))
+BOOKING_ARCHIVE_DIR = Path(os.getenv("BOOKING_ARCHIVE_DIR", str(BASE_DIR / "archive")))
+
+EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend")
+DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", "bookings@localhost")
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
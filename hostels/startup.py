@@ -0,0 +1,175 @@
+"""Process warm-up for gunicorn, and cold-start measurement.
+
+A fresh process pays for a lot of work on its first requests: Django
+compiles each template on first use, builds the URL resolver on the first
+request, and some modules (reportlab, Pillow) are only imported by the
+code path that needs them. :func:`warm_up` does that work up front.
+``gunicorn.conf.py`` runs it once in the master before the workers are
+forked (``preload_app``), so every worker starts warm and shares those
+pages with the master. :func:`prime_connections` then opens each worker's
+database pool before its first request.
+
+``manage.py startup_profile`` starts fresh interpreters running
+:func:`main` to measure import, warm-up and first-request times.
+"""
+
+import json
+import os
+import sys
+import time
+from importlib import import_module
+
+# Modules that are otherwise imported by the first request that needs them.
+LAZY_MODULES = [
+    "reportlab.pdfgen.canvas",
+    "reportlab.lib.colors",
+    "reportlab.lib.pagesizes",
+    "reportlab.lib.utils",
+    "PIL.Image",
+    "reservations.xlsx",
+    "django.contrib.admin.views.main",
+    "django.contrib.auth.views",
+]
+TEMPLATE_SUFFIXES = (".html", ".txt", ".xml")
+
+
+def compile_templates():
+    """Compile every template the template engines can find; return how many.
+
+    The cached template loader keeps them, so no request parses a template.
+    """
+    from django.template import engines
+
+    compiled = 0
+    for engine in engines.all():
+        for directory in engine.template_dirs:
+            for root, _, files in os.walk(directory):
+                for filename in files:
+                    if filename.endswith(TEMPLATE_SUFFIXES):
+                        engine.get_template(os.path.relpath(os.path.join(root, filename), directory))
+                        compiled += 1
+    return compiled
+
+
+def resolve_urls():
+    """Build the URL resolver and compile every pattern; return how many patterns there are."""
+    from django.urls import get_resolver
+
+    resolver = get_resolver()
+    # Reading the reverse lookup table populates the resolver.
+    resolver.reverse_dict
+
+    def walk(patterns):
+        count = 0
+        for pattern in patterns:
+            # Compiled on first access and cached on the pattern.
+            pattern.pattern.regex
+            count += 1
+            if hasattr(pattern, "url_patterns"):
+                count += walk(pattern.url_patterns)
+        return count
+
+    return walk(resolver.url_patterns)
+
+
+def import_modules():
+    from reservations import receipts
+
+    for name in LAZY_MODULES:
+        import_module(name)
+    # Decoded and scaled once per process.
+    receipts._logo()
+    return len(LAZY_MODULES)
+
+
+WARM_UP_STEPS = {"templates": compile_templates, "urls": resolve_urls, "imports": import_modules}
+
+
+def warm_up():
+    """Run every warm-up step; return ``{step: (count, seconds)}``.
+
+    None of the steps touches the database, so this is safe to run in a
+    process that forks afterwards.
+    """
+    timings = {}
+    for name, step in WARM_UP_STEPS.items():
+        started = time.perf_counter()
+        count = step()
+        timings[name] = (count, time.perf_counter() - started)
+    return timings
+
+
+def describe(timings):
+    return ", ".join(f"{name} {count} in {seconds * 1000:.0f} ms" for name, (count, seconds) in timings.items())
+
+
+def prime_connections():
+    """Open the connection pool of every pooled database; return the aliases opened.
+
+    Waits until each pool holds its ``min_size`` connections, so the first
+    requests do not pay for TCP, TLS and authentication. Without a pool
+    every request thread connects on its own and there is nothing to open
+    ahead of time.
+    """
+    from django.db import connections
+
+    opened = []
+    for alias in connections:
+        pool = connections[alias].pool if connections[alias].vendor == "postgresql" else None
+        if pool is not None:
+            pool.open(wait=True, timeout=pool.timeout)
+            opened.append(alias)
+    return opened
+
+
+def main(argv=None):
+    """Measure one cold start in this interpreter and print the timings as JSON.
+
+    Usage: ``python -m hostels.startup [--warm-up] HOST PATH...``. The
+    session cookie, if any, comes from ``STARTUP_PROFILE_SESSION``.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    warm = argv[0] == "--warm-up"
+    host, *paths = argv[1:] if warm else argv
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "hostels.settings")
+    steps = {}
+
+    started = time.perf_counter()
+    import django
+
+    django.setup()
+    steps["django.setup"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    import_module("hostels.asgi")
+    steps["application"] = time.perf_counter() - started
+
+    if warm:
+        for name, (_, seconds) in warm_up().items():
+            steps[f"warm-up {name}"] = seconds
+
+    from django.conf import settings
+    from django.db import connections
+    from django.test import Client
+
+    started = time.perf_counter()
+    connections["default"].ensure_connection()
+    steps["connect"] = time.perf_counter() - started
+
+    client = Client(HTTP_HOST=host)
+    if os.environ.get("STARTUP_PROFILE_SESSION"):
+        client.cookies[settings.SESSION_COOKIE_NAME] = os.environ["STARTUP_PROFILE_SESSION"]
+    requests = {}
+    for path in paths:
+        timings = []
+        for _ in range(2):
+            started = time.perf_counter()
+            response = client.get(path)
+            timings.append(time.perf_counter() - started)
+        requests[path] = {"status": response.status_code, "first": timings[0], "second": timings[1]}
+
+    json.dump({"steps": steps, "requests": requests}, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
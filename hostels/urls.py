@@ -1,9 +1,8 @@
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include, re_path
-from django.views.static import serve
-from reservations import views as reservation_views
+from reservations import profiling, views as reservation_views
+from reservations.media import serve_media
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -12,9 +11,10 @@ urlpatterns = [
     path("", include("reservations.urls")),
 ]
 
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-elif settings.SERVE_MEDIA:
+if settings.DEBUG or settings.SERVE_MEDIA:
     urlpatterns += [
-        re_path(r"^media/(?P<path>.*)$", serve, {"document_root": settings.MEDIA_ROOT}),
+        re_path(r"^media/(?P<path>.*)$", serve_media),
     ]
+
+if settings.PROFILING:
+    urlpatterns.insert(0, path("metrics/", profiling.metrics, name="profiling_metrics"))
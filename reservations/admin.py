@@ -1,6 +1,34 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
 from django.utils.html import format_html
-from .models import Amenity, Hostel, Room, Booking
+from . import bulk, images, jobs, search
+from .forms import CatalogImportForm
+from .models import Amenity, ArchivedBooking, Hostel, Job, Room, Booking
+from .pagination import EstimatedCountPaginator, IndexedDatesQuerySet
+
+
+def preview_url(image, width):
+    if images.has_variants(image.name):
+        return images.variant_url(image.name, width)
+    return image.url
+
+
+class IndexedSearchMixin:
+    """Search through ``reservations.search`` instead of ``icontains`` over ``search_fields``.
+
+    ``search_fields`` still turns the search box on and lists what the
+    search documents hold.
+    """
+
+    search_kind = None
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search.terms(search_term):
+            return queryset, False
+        return queryset.filter(id__in=search.matching(self.search_kind, search_term)), False
 
 
 @admin.register(Amenity)
@@ -14,9 +42,10 @@ class RoomInline(admin.TabularInline):
 
 
 @admin.register(Hostel)
-class HostelAdmin(admin.ModelAdmin):
+class HostelAdmin(IndexedSearchMixin, admin.ModelAdmin):
     list_display = ["name", "city", "image_preview"]
-    search_fields = ["name", "city"]
+    search_fields = ["name", "city", "address", "description", "amenities__name"]
+    search_kind = search.HOSTEL
     inlines = [RoomInline]
     readonly_fields = ["image_preview"]
     fieldsets = [
@@ -27,11 +56,46 @@ class HostelAdmin(admin.ModelAdmin):
 
     def image_preview(self, obj):
         if obj.image:
-            return format_html('<img src="{}" style="height:160px;border-radius:10px;" />', obj.image.url)
+            return format_html('<img src="{}" style="height:160px;border-radius:10px;" />', preview_url(obj.image, 640))
         return "-"
 
     image_preview.short_description = "Image"
 
+    def get_urls(self):
+        return [
+            path("import/", self.admin_site.admin_view(self.import_view), name="reservations_hostel_import"),
+        ] + super().get_urls()
+
+    def import_view(self, request):
+        if not (self.has_add_permission(request) and self.has_change_permission(request)):
+            raise PermissionDenied
+
+        form = CatalogImportForm(request.POST or None, request.FILES or None)
+        if request.method == "POST" and form.is_valid():
+            kind = form.cleaned_data["kind"]
+            upload = form.cleaned_data["file"]
+            importer = bulk.import_rooms if kind == "rooms" else bulk.import_hostels
+            try:
+                records = bulk.read_records(bulk.text_stream(upload.file), bulk.detect_format(upload.name))
+                result = importer(records)
+            except ValueError as exc:
+                form.add_error("file", str(exc))
+            else:
+                self.message_user(request, f"Imported {kind}: {result}.", messages.SUCCESS)
+                for line_number, message in result.errors[:20]:
+                    self.message_user(request, f"Line {line_number}: {message}", messages.WARNING)
+                return redirect("admin:reservations_hostel_changelist")
+
+        context = {
+            **self.admin_site.each_context(request),
+            "opts": self.model._meta,
+            "title": "Import hostels and rooms",
+            "form": form,
+            "hostel_columns": bulk.HOSTEL_FIELDS,
+            "room_columns": bulk.ROOM_FIELDS,
+        }
+        return TemplateResponse(request, "admin/reservations/hostel/import.html", context)
+
 
 @admin.register(Room)
 class RoomAdmin(admin.ModelAdmin):
@@ -42,14 +106,105 @@ class RoomAdmin(admin.ModelAdmin):
 
     def image_preview(self, obj):
         if obj.image:
-            return format_html('<img src="{}" style="height:60px;border-radius:8px;" />', obj.image.url)
+            return format_html('<img src="{}" style="height:60px;border-radius:8px;" />', preview_url(obj.image, 160))
         return "-"
 
     image_preview.short_description = "Image"
 
 
 @admin.register(Booking)
-class BookingAdmin(admin.ModelAdmin):
-    list_display = ["guest_name", "user", "hostel", "room", "check_in", "check_out", "created_at"]
-    list_filter = ["hostel", "room", "created_at"]
-    search_fields = ["guest_name", "guest_email", "user__username", "user__email"]
+class BookingAdmin(IndexedSearchMixin, admin.ModelAdmin):
+    list_display = ["guest_name", "user", "hostel", "room", "check_in", "check_out", "nights", "total_price", "created_at"]
+    list_filter = ["is_paid", "hostel"]
+    list_select_related = ["user", "hostel", "room__hostel"]
+    search_fields = ["guest_name", "guest_email", "id", "user__username", "user__email"]
+    search_kind = search.BOOKING
+    date_hierarchy = "created_at"
+    ordering = ["-created_at", "-id"]
+    raw_id_fields = ["user", "hostel", "room"]
+    list_per_page = 50
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ["export_csv", "export_jsonl", "export_payments_csv", "export_payments_xlsx"]
+
+    def get_queryset(self, request):
+        # Booking.__str__ reads the hostel, e.g. on the delete confirmation
+        # page. A select_related() call here replaces list_select_related on
+        # the changelist, so it names the same relations.
+        queryset = super().get_queryset(request).select_related(*self.list_select_related).with_totals()
+        return IndexedDatesQuerySet(model=queryset.model, query=queryset.query, using=queryset._db)
+
+    def nights(self, obj):
+        return obj.nights
+
+    nights.admin_order_field = "nights"
+
+    def total_price(self, obj):
+        return obj.total_price
+
+    total_price.admin_order_field = "total_price"
+    total_price.short_description = "Total (TZS)"
+
+    def export_csv(self, request, queryset):
+        return bulk.export_response(request, queryset, "csv")
+
+    export_csv.short_description = "Export selected bookings (CSV)"
+
+    def export_jsonl(self, request, queryset):
+        return bulk.export_response(request, queryset, "jsonl")
+
+    export_jsonl.short_description = "Export selected bookings (JSONL)"
+
+    def export_payments_csv(self, request, queryset):
+        return bulk.export_response(request, bulk.payments(queryset), "csv", "payments", bulk.PAYMENTS)
+
+    export_payments_csv.short_description = "Export payments of selected bookings (CSV)"
+
+    def export_payments_xlsx(self, request, queryset):
+        return bulk.export_response(request, bulk.payments(queryset), "xlsx", "payments", bulk.PAYMENTS)
+
+    export_payments_xlsx.short_description = "Export payments of selected bookings (XLSX)"
+
+
+@admin.register(ArchivedBooking)
+class ArchivedBookingAdmin(admin.ModelAdmin):
+    """Past stays moved out by ``manage_booking_partitions``; they are kept as they were."""
+
+    list_display = ["id", "guest_name", "user", "hostel", "room", "check_in", "check_out", "is_paid", "amount_paid"]
+    list_filter = ["is_paid", "hostel"]
+    list_select_related = ["user", "hostel", "room"]
+    # Archived bookings have no search documents, so these are exact lookups.
+    search_fields = ["=id", "=receipt_number", "=guest_email"]
+    date_hierarchy = "check_in"
+    ordering = ["-check_in", "-id"]
+    list_per_page = 50
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ["export_payments_csv"]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def export_payments_csv(self, request, queryset):
+        return bulk.export_response(request, bulk.payments(queryset), "csv", "archived-payments", bulk.PAYMENTS)
+
+    export_payments_csv.short_description = "Export payments of selected bookings (CSV)"
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ["task", "key", "status", "attempts", "max_attempts", "run_after", "finished_at"]
+    list_filter = ["status", "task"]
+    search_fields = ["key"]
+    ordering = ["-id"]
+    readonly_fields = ["locked_by", "locked_until", "last_error", "created_at", "finished_at"]
+    actions = ["retry"]
+
+    def retry(self, request, queryset):
+        count = jobs.retry(queryset)
+        self.message_user(request, f"Queued {count} failed job(s) again.", messages.SUCCESS)
+
+    retry.short_description = "Retry selected failed jobs"
@@ -0,0 +1,590 @@
+"""Bed allocation for a whole cohort of students, e.g. a term's intake.
+
+Each record names a student and their stay. It may also list preferred
+hostels (``;``-separated in CSV, a list in JSONL, first choice first), a
+city, a room type (``private`` or ``shared``) and a budget per night.
+Every student gets one bed. City and budget are hard limits. Hostel choice
+and room type are preferences, in that order, and the cheaper room wins a
+tie.
+
+Students with the same stay and preferences are interchangeable, so they
+are placed together as a group. Free beds per room and night start from
+the existing bookings as a NumPy array. Lapsed holds count as free, as in
+``reservations.availability``. Groups competing for the same beds (same
+stay, city and budget) go in file order, and those with the fewest free
+beds per waiting student go first. Within a group, students take beds in
+file order, best room first. A repair pass then tries to place whoever is
+left by moving a placed student of another group to another room that
+suits them.
+
+Placements are written in one transaction with ``bulk_create``. The
+candidate rooms are locked first, as ``reserve`` locks a room. The
+occupancy and dashboard counters and the search index are updated once
+for the lot, since ``bulk_create`` skips the signals. The bookings are
+unpaid without a hold, like bookings entered by staff. A student who
+already has a booking overlapping their stay is reported rather than
+placed again, so a corrected file can be run again.
+"""
+
+import time
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from decimal import Decimal, InvalidOperation
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+
+from . import occupancy, search, stats
+from .availability import overlapping_bookings
+from .holds import lapsed
+from .models import Booking, Hostel, Room
+from .parallel import chunked
+
+COHORT_FIELDS = ["student", "email", "check_in", "check_out", "city", "hostels", "room_type", "budget"]
+REPORT_COLUMNS = [
+    "line",
+    "student",
+    "email",
+    "check_in",
+    "check_out",
+    "status",
+    "reference",
+    "hostel",
+    "room",
+    "room_type",
+    "price_per_night",
+    "choice",
+    "detail",
+]
+ROOM_TYPES = {"": None, "any": None, "private": True, "shared": False}
+# Keeps IN (...) lists within SQLite's parameter limit.
+LOOKUP_BATCH = 2000
+# Rooms checked at once before looking further down a group's list; doubles each time.
+SCAN_ROOMS = 32
+
+PLACED = "placed"
+ALREADY_BOOKED = "already_booked"
+NO_MATCH = "no_matching_room"
+NO_BED = "no_free_bed"
+DUPLICATE = "duplicate_in_file"
+INVALID = "invalid_row"
+
+
+class Student:
+    __slots__ = (
+        "line", "name", "email", "check_in", "check_out", "city", "hostel_ids", "private", "budget",
+        "room", "moved", "status", "detail", "booking",
+    )
+
+    def __init__(self, line, name, email, check_in, check_out, city, hostel_ids, private, budget):
+        self.line = line
+        self.name = name
+        self.email = email
+        self.check_in = check_in
+        self.check_out = check_out
+        self.city = city
+        self.hostel_ids = hostel_ids
+        self.private = private
+        self.budget = budget
+        # Position in ``Rooms`` once placed.
+        self.room = None
+        self.moved = False
+        self.status = None
+        self.detail = ""
+        self.booking = None
+
+    @property
+    def preferences(self):
+        return (self.check_in, self.check_out, self.city.casefold(), self.hostel_ids, self.private, self.budget)
+
+
+class AllocationResult:
+    def __init__(self):
+        self.rows = []
+        self.statuses = Counter()
+        self.choices = Counter()
+        self.moved = 0
+        self.timings = {}
+
+    def reject(self, line, record, reason, detail=""):
+        self.statuses[reason] += 1
+        self.rows.append(
+            {
+                "line": line,
+                "student": _text(record, "student"),
+                "email": _text(record, "email"),
+                "check_in": _text(record, "check_in"),
+                "check_out": _text(record, "check_out"),
+                "status": reason,
+                "detail": detail,
+            }
+        )
+
+    def __str__(self):
+        total = sum(self.statuses.values())
+        return f"{self.statuses[PLACED]} of {total} placed, {self.moved} moved to make room"
+
+
+def _text(record, key):
+    value = record.get(key)
+    return "" if value is None else str(value).strip()
+
+
+def _date(record, key):
+    value = _text(record, key)
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"invalid {key} {value!r}")
+
+
+def _names(value):
+    names = value if isinstance(value, list) else str(value or "").split(";")
+    return [str(name).strip() for name in names if str(name).strip()]
+
+
+class HostelNames:
+    """Hostel name -> id, preferring the hostel in the student's city when names repeat."""
+
+    def __init__(self):
+        self.by_key = {}
+        self.by_name = defaultdict(list)
+        for pk, name, city in Hostel.objects.values_list("id", "name", "city"):
+            self.by_key[name.casefold(), city.casefold()] = pk
+            self.by_name[name.casefold()].append(pk)
+
+    def resolve(self, names, city):
+        ids = []
+        for name in names:
+            pk = self.by_key.get((name.casefold(), city.casefold()))
+            if pk is None:
+                matches = self.by_name.get(name.casefold(), [])
+                if len(matches) != 1:
+                    raise ValueError(f"{'ambiguous' if matches else 'unknown'} hostel {name!r}")
+                pk = matches[0]
+            if pk not in ids:
+                ids.append(pk)
+        return tuple(ids)
+
+
+def _students(records, hostels, result):
+    seen = set()
+    for line, record in records:
+        name, email = _text(record, "student"), _text(record, "email").lower()
+        try:
+            if not name:
+                raise ValueError("missing student")
+            try:
+                validate_email(email)
+            except ValidationError:
+                raise ValueError(f"invalid email {email!r}")
+            check_in, check_out = _date(record, "check_in"), _date(record, "check_out")
+            nights = (check_out - check_in).days
+            if nights < 1:
+                raise ValueError("check_out must be after check_in")
+            if nights > settings.BOOKING_MAX_NIGHTS:
+                raise ValueError(f"stays are limited to {settings.BOOKING_MAX_NIGHTS} nights")
+            room_type = _text(record, "room_type").lower()
+            if room_type not in ROOM_TYPES:
+                raise ValueError(f"invalid room_type {room_type!r}")
+            budget = _text(record, "budget").replace(",", "")
+            try:
+                budget = Decimal(budget) if budget else None
+            except InvalidOperation:
+                raise ValueError(f"invalid budget {budget!r}")
+            city = _text(record, "city")
+            hostel_ids = hostels.resolve(_names(record.get("hostels")), city)
+        except ValueError as exc:
+            result.reject(line, record, INVALID, str(exc))
+            continue
+        if email in seen:
+            result.reject(line, record, DUPLICATE, email)
+            continue
+        seen.add(email)
+        yield Student(line, name, email, check_in, check_out, city, hostel_ids, ROOM_TYPES[room_type], budget)
+
+
+class Rooms:
+    """Every room as parallel arrays; students refer to rooms by position."""
+
+    def __init__(self, rooms):
+        self.rooms = list(rooms)
+        self.ids = np.array([room.id for room in self.rooms], dtype=np.int64)
+        self.hostel_ids = np.array([room.hostel_id for room in self.rooms], dtype=np.int64)
+        self.cities = np.array([room.hostel.city.casefold() for room in self.rooms], dtype=str)
+        self.prices = np.array([room.price_per_night for room in self.rooms], dtype=float)
+        self.private = np.array([room.is_private for room in self.rooms], dtype=bool)
+        self.beds = np.array([room.beds for room in self.rooms], dtype=np.int64)
+
+    def __len__(self):
+        return len(self.rooms)
+
+
+class Group:
+    """Students with the same stay and preferences.
+
+    ``pool`` holds every room they may use, cheapest of the asked-for room
+    type first, and is shared with other groups. ``listed`` holds the pool's
+    rooms in their listed hostels, in order of choice. ``first`` and
+    ``last`` are their nights as offsets into the free-bed array. Groups
+    with the same ``demand`` compete for the same beds.
+    """
+
+    __slots__ = ("students", "first", "last", "listed", "pool", "demand")
+
+    def __init__(self, students, first, last, listed, pool, demand):
+        self.students = students
+        self.first = first
+        self.last = last
+        self.listed = listed
+        self.pool = pool
+        self.demand = demand
+
+    def pending(self):
+        return [student for student in self.students if student.status is None and student.room is None]
+
+    def chunks(self):
+        """The rooms, best first, a slice at a time; listed rooms come round again in the pool."""
+        yield self.listed
+        start, size = 0, SCAN_ROOMS
+        while start < len(self.pool):
+            yield self.pool[start:start + size]
+            start += size
+            size *= 2
+
+    def take(self, free, count):
+        """Take up to ``count`` beds, best room first; return one room per bed taken."""
+        taken = []
+        for rooms in self.chunks():
+            wanted = count - len(taken)
+            capacity = np.clip(free[rooms, self.first:self.last].min(axis=1), 0, wanted)
+            slots = np.repeat(rooms, capacity)[:wanted]
+            if len(slots):
+                used, counts = np.unique(slots, return_counts=True)
+                free[used, self.first:self.last] -= counts[:, None]
+                taken.extend(slots.tolist())
+            if len(taken) == count:
+                break
+        return taken
+
+    def best_room(self, free):
+        for rooms in self.chunks():
+            free_rooms = np.flatnonzero(free[rooms, self.first:self.last].min(axis=1) > 0)
+            if len(free_rooms):
+                return int(rooms[free_rooms[0]])
+        return None
+
+    def order(self):
+        """Every room of the pool once, best first."""
+        return np.concatenate([self.listed, self.pool[~np.isin(self.pool, self.listed)]])
+
+
+def _groups(students, rooms, start):
+    by_preferences = defaultdict(list)
+    for student in students:
+        by_preferences[student.preferences].append(student)
+
+    pools = {}
+    groups = []
+    for (check_in, check_out, city, hostel_ids, private, budget), members in by_preferences.items():
+        if (city, budget, private) not in pools:
+            usable = np.ones(len(rooms), dtype=bool)
+            if city:
+                usable &= rooms.cities == city
+            if budget is not None:
+                usable &= rooms.prices <= float(budget)
+            mismatch = np.zeros(len(rooms), dtype=bool) if private is None else rooms.private != private
+            # lexsort sorts by its last key first.
+            order = np.lexsort((rooms.ids, rooms.prices, mismatch))
+            pools[city, budget, private] = order[usable[order]]
+        pool = pools[city, budget, private]
+        listed = np.concatenate(
+            [pool[rooms.hostel_ids[pool] == hostel_id] for hostel_id in hostel_ids] or [np.empty(0, dtype=np.int64)]
+        )
+        groups.append(
+            Group(
+                members,
+                (check_in - start).days,
+                (check_out - start).days,
+                listed,
+                pool,
+                (check_in, check_out, city, budget),
+            )
+        )
+    return groups
+
+
+def _lock(rooms, groups):
+    """Lock the rooms any student could take, in id order like ``reserve``."""
+    pools = {id(group.pool): group.pool for group in groups}
+    usable = np.unique(np.concatenate(list(pools.values())))
+    for ids in chunked(sorted(rooms.ids[usable].tolist()), LOOKUP_BATCH):
+        list(Room.objects.select_for_update().filter(id__in=ids).order_by("id").values_list("id", flat=True))
+
+
+def _already_booked(students, start, end):
+    """Mark students who already have a booking overlapping their stay."""
+    by_email = {student.email: student for student in students}
+    for emails in chunked(list(by_email), LOOKUP_BATCH):
+        rows = (
+            Booking.objects.staying(start, end)
+            .filter(guest_email__in=emails)
+            .exclude(lapsed())
+            .values_list("id", "guest_email", "check_in", "check_out")
+        )
+        for pk, email, check_in, check_out in rows:
+            student = by_email[email]
+            if check_in < student.check_out and student.check_in < check_out:
+                student.status = ALREADY_BOOKED
+                student.detail = f"BK-{pk:06d}"
+
+
+def _free_beds(rooms, start, days):
+    """Beds free per room and night from ``start``, shape ``(rooms, days)``."""
+    index = {room_id: position for position, room_id in enumerate(rooms.ids.tolist())}
+    stays = [
+        (index[room_id], max((check_in - start).days, 0), min((check_out - start).days, days), guests)
+        for room_id, check_in, check_out, guests in overlapping_bookings(
+            list(index), start, start + timedelta(days=days)
+        ).values_list("room_id", "check_in", "check_out", "guests")
+    ]
+    stays = np.array(stays, dtype=np.int64).reshape(-1, 4)
+    # Each stay adds its guests on its first night and removes them after its last.
+    width = days + 1
+    size = len(rooms) * width
+    diff = np.bincount(stays[:, 0] * width + stays[:, 1], weights=stays[:, 3], minlength=size)
+    diff -= np.bincount(stays[:, 0] * width + stays[:, 2], weights=stays[:, 3], minlength=size)
+    used = diff.reshape(len(rooms), width)[:, :days].cumsum(axis=1).astype(np.int64)
+    return rooms.beds[:, None] - used
+
+
+def _place(groups, free):
+    """Fill beds group by group, most constrained first; return the demands left without a bed.
+
+    Groups competing for the same beds go in file order. Across those, the
+    fewer free beds per waiting student, the earlier they go.
+    """
+    waiting = Counter()
+    beds = {}
+    for group in groups:
+        waiting[group.demand] += len(group.pending())
+        if group.demand not in beds:
+            beds[group.demand] = np.maximum(free[group.pool, group.first:group.last].min(axis=1), 0).sum()
+
+    def priority(group):
+        students = waiting[group.demand]
+        return (beds[group.demand] / students if students else np.inf, group.students[0].line)
+
+    full = set()
+    for group in sorted(groups, key=priority):
+        pending = group.pending()
+        if not pending or group.demand in full:
+            continue
+        taken = group.take(free, len(pending))
+        for student, room in zip(pending, taken):
+            student.room = room
+        if len(taken) < len(pending):
+            # The pool has no bed left for these dates, whatever the preferences.
+            full.add(group.demand)
+    return full
+
+
+def _make_room(group, order, free, occupants, full):
+    """Move a placed student out of one of the rooms in ``order`` to free a bed; return that room.
+
+    Only a student whose stay covers every full night the group needs in
+    the room can make space, and only if their own group has a bed free in
+    another room. The student who came last in the file is moved first.
+    ``full`` holds the demands known to have no bed left; it grows as more
+    are found.
+    """
+    alternatives = {}
+    nights = free[order, group.first:group.last]
+    # Rooms full on some nights but never overbooked.
+    candidates = np.flatnonzero(nights.min(axis=1) == 0)
+    for position in candidates.tolist():
+        room = int(order[position])
+        if not occupants[room]:
+            continue
+        blocked = np.flatnonzero(nights[position] == 0)
+        blocked_first, blocked_last = group.first + blocked[0], group.first + blocked[-1] + 1
+        tried = set()
+        for other, student in reversed(occupants[room]):
+            if other is group or other in tried or other.first > blocked_first or other.last < blocked_last:
+                continue
+            tried.add(other)
+            if other.demand in full:
+                continue
+            if other not in alternatives:
+                alternatives[other] = other.best_room(free)
+            target = alternatives[other]
+            if target is None:
+                full.add(other.demand)
+                continue
+            occupants[room].remove((other, student))
+            occupants[target].append((other, student))
+            student.room = target
+            student.moved = True
+            free[room, other.first:other.last] += 1
+            free[target, other.first:other.last] -= 1
+            return room
+    return None
+
+
+def _repair(groups, free, full):
+    """Place the students left over where moving someone else frees a bed; return how many moved."""
+    occupants = defaultdict(list)
+    for group in groups:
+        for student in group.students:
+            if student.room is not None:
+                occupants[student.room].append((group, student))
+
+    moved = 0
+    failed = set()
+    for group in groups:
+        if not len(group.pool) or group.demand in failed:
+            continue
+        order = None
+        for student in group.pending():
+            room = None if group.demand in full else group.best_room(free)
+            if room is None:
+                full.add(group.demand)
+                order = group.order() if order is None else order
+                room = _make_room(group, order, free, occupants, full)
+                if room is None:
+                    # Every group wanting these beds would fail the same way.
+                    failed.add(group.demand)
+                    break
+                moved += 1
+            student.room = room
+            occupants[room].append((group, student))
+            free[room, group.first:group.last] -= 1
+    return moved
+
+
+def _accounts(emails):
+    """User id per email, for emails that belong to exactly one account."""
+    found = defaultdict(list)
+    for batch in chunked(emails, LOOKUP_BATCH):
+        for pk, email in get_user_model().objects.filter(email__in=batch).values_list("id", "email"):
+            found[email.lower()].append(pk)
+    return {email: ids[0] for email, ids in found.items() if len(ids) == 1}
+
+
+def _write(placed, rooms, batch_size):
+    users = _accounts([student.email for student in placed])
+    bookings = []
+    for student in placed:
+        room = rooms.rooms[student.room]
+        student.booking = Booking(
+            user_id=users.get(student.email),
+            hostel_id=room.hostel_id,
+            room=room,
+            guest_name=student.name,
+            guest_email=student.email,
+            check_in=student.check_in,
+            check_out=student.check_out,
+            guests=1,
+        )
+        bookings.append(student.booking)
+    Booking.objects.bulk_create(bookings, batch_size=batch_size)
+
+    # bulk_create skips the signals that keep the counters and the search index current.
+    stays = Counter((booking.room_id, booking.check_in, booking.check_out) for booking in bookings)
+    occupancy.apply([(room_id, check_in, check_out, count) for (room_id, check_in, check_out), count in stays.items()])
+    stats.record_bookings([stats.snapshot(booking) for booking in bookings])
+    for ids in chunked([booking.id for booking in bookings], LOOKUP_BATCH):
+        search.index_bookings(ids)
+
+
+def _report_row(student, rooms, result):
+    row = {
+        "line": student.line,
+        "student": student.name,
+        "email": student.email,
+        "check_in": student.check_in.isoformat(),
+        "check_out": student.check_out.isoformat(),
+        "status": student.status,
+        "detail": student.detail,
+    }
+    if student.room is None:
+        return row
+    room = rooms.rooms[student.room]
+    rank = student.hostel_ids.index(room.hostel_id) + 1 if room.hostel_id in student.hostel_ids else None
+    if not student.hostel_ids:
+        result.choices["no hostel listed"] += 1
+    elif rank == 1:
+        result.choices["first choice hostel"] += 1
+    elif rank:
+        result.choices["later choice hostel"] += 1
+    else:
+        result.choices["hostel not listed"] += 1
+    if student.private is not None:
+        result.choices["room type as asked" if room.is_private == student.private else "other room type"] += 1
+    row.update(
+        {
+            "reference": student.booking.reference if student.booking else "",
+            "hostel": room.hostel.name,
+            "room": room.name,
+            "room_type": "private" if room.is_private else "shared",
+            "price_per_night": room.price_per_night,
+            "choice": rank or "",
+        }
+    )
+    if student.moved:
+        row["detail"] = "moved to make room"
+    return row
+
+
+def allocate(records, dry_run=False, batch_size=1000):
+    """Place the students in ``(line_number, record)`` pairs with the columns in ``COHORT_FIELDS``.
+
+    Returns an ``AllocationResult`` with one report row per record. With
+    ``dry_run`` nothing is locked or written and the report shows where
+    each student would go.
+    """
+    result = AllocationResult()
+    started = time.perf_counter()
+    students = list(_students(records, HostelNames(), result))
+    rooms = Rooms(Room.objects.select_related("hostel").order_by("id"))
+    result.timings["read"] = time.perf_counter() - started
+
+    groups = []
+    if students:
+        start = min(student.check_in for student in students)
+        end = max(student.check_out for student in students)
+        with transaction.atomic():
+            started = time.perf_counter()
+            groups = _groups(students, rooms, start)
+            if not dry_run:
+                _lock(rooms, groups)
+            _already_booked(students, start, end)
+            free = _free_beds(rooms, start, (end - start).days)
+            full = _place(groups, free)
+            result.moved = _repair(groups, free, full)
+            result.timings["place"] = time.perf_counter() - started
+
+            placed = [student for student in students if student.room is not None]
+            if not dry_run and placed:
+                started = time.perf_counter()
+                _write(placed, rooms, batch_size)
+                result.timings["write"] = time.perf_counter() - started
+
+    for group in groups:
+        for student in group.students:
+            if student.status is None:
+                if student.room is not None:
+                    student.status = PLACED
+                elif len(group.pool):
+                    student.status = NO_BED
+                else:
+                    student.status = NO_MATCH
+                    student.detail = "no room in that city and budget"
+            result.statuses[student.status] += 1
+            result.rows.append(_report_row(student, rooms, result))
+    result.rows.sort(key=lambda row: row["line"])
+    return result
@@ -4,3 +4,13 @@ from django.apps import AppConfig
 class ReservationsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "reservations"
+
+    def ready(self):
+        from django.conf import settings
+
+        from . import auth, signals, tasks  # noqa: F401
+
+        if settings.PROFILING:
+            from . import profiling
+
+            profiling.install()
@@ -0,0 +1,194 @@
+"""Yearly booking partitions and the archive of past stays.
+
+On PostgreSQL ``reservations_booking`` is partitioned by check-in year
+(see migration 0016). Each year has its own partition, and a default
+partition catches dates outside them. Queries that bound ``check_in``
+only read the partitions they need. The availability check bounds it by
+``BOOKING_MAX_NIGHTS`` (see ``reservations.availability``).
+:func:`ensure_partitions` adds the coming years. If bookings for a new
+year already landed in the default partition, they are moved into its
+partition.
+
+:func:`archive_year` moves one year of bookings into ``ArchivedBooking``.
+On PostgreSQL the year's partition is detached, copied and dropped, so
+the live table never runs a large DELETE. Other databases move the rows
+with ``INSERT ... SELECT`` and ``DELETE``. Either way the year is also
+written to ``bookings-<year>.jsonl.gz`` in ``BOOKING_ARCHIVE_DIR``, one
+JSON object per booking with every column, for restores and audits.
+
+Archived bookings keep their ids, so references and receipt links stay
+valid. They leave the booking search index. The dashboard counters do not
+change: those days already happened.
+"""
+
+import gzip
+import os
+import re
+from datetime import date
+
+from django.conf import settings
+from django.db import connections, router, transaction
+
+from . import bulk, search
+from .models import ArchivedBooking, Booking, SearchDocument
+
+TABLE = Booking._meta.db_table
+ARCHIVE_TABLE = ArchivedBooking._meta.db_table
+DEFAULT_PARTITION = f"{TABLE}_default"
+YEAR_PARTITION = re.compile(rf"^{TABLE}_y(\d{{4}})$")
+BOOKING_COLUMNS = ", ".join(field.column for field in Booking._meta.concrete_fields)
+# Holds do not outlive a stay, so the archive has no hold_expires_at.
+ARCHIVED_COLUMNS = ", ".join(
+    field.column for field in Booking._meta.concrete_fields if field.column != "hold_expires_at"
+)
+ARCHIVE_EXPORT = bulk.Export(
+    "Archived bookings",
+    [(field.column, field.attname) for field in ArchivedBooking._meta.concrete_fields],
+    ["id"],
+)
+
+
+def _connection():
+    return connections[router.db_for_write(Booking)]
+
+
+def _year_range(year):
+    return date(year, 1, 1), date(year + 1, 1, 1)
+
+
+def partitioned():
+    """Whether the bookings table is partitioned, which only happens on PostgreSQL."""
+    connection = _connection()
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [TABLE])
+        return cursor.fetchone() is not None
+
+
+def partition_years():
+    """The years that have a partition of their own."""
+    with _connection().cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = %s::regclass",
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    return sorted(int(match[1]) for name in names if (match := YEAR_PARTITION.match(name)))
+
+
+def ensure_partitions(ahead=None, today=None):
+    """Create the partitions up to ``ahead`` years after this one; return the years created."""
+    if not partitioned():
+        return []
+    ahead = settings.BOOKING_PARTITION_YEARS_AHEAD if ahead is None else ahead
+    this_year = (today or date.today()).year
+    existing = partition_years()
+    first = existing[0] if existing else this_year
+    created = [year for year in range(first, this_year + ahead + 1) if year not in existing]
+
+    connection = _connection()
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        for year in created:
+            start, end = _year_range(year)
+            name = f"{TABLE}_y{year}"
+            # Attaching a partition checks that the default partition has no
+            # rows for it, so those are moved over first.
+            cursor.execute(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+            cursor.execute(
+                f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE check_in >= %s AND check_in < %s "
+                f"RETURNING {BOOKING_COLUMNS}) INSERT INTO {name} ({BOOKING_COLUMNS}) "
+                f"SELECT {BOOKING_COLUMNS} FROM moved",
+                [start, end],
+            )
+            cursor.execute(
+                f"ALTER TABLE {TABLE} ATTACH PARTITION {name} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            )
+    return created
+
+
+def years_to_archive(before):
+    """Years before ``before`` that still have live bookings."""
+    years = {day.year for day in Booking.objects.filter(check_in__lt=date(before, 1, 1)).dates("check_in", "year")}
+    if partitioned():
+        years.update(year for year in partition_years() if year < before)
+    return sorted(years)
+
+
+def _move_rows(cursor, vendor, start, end):
+    """Move the bookings checking in from ``start`` to ``end`` into the archive table."""
+    if vendor == "postgresql":
+        # One statement, so a booking committed in between cannot be deleted unarchived.
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {TABLE} WHERE check_in >= %s AND check_in < %s "
+            f"RETURNING {ARCHIVED_COLUMNS}) INSERT INTO {ARCHIVE_TABLE} ({ARCHIVED_COLUMNS}) "
+            f"SELECT {ARCHIVED_COLUMNS} FROM moved",
+            [start, end],
+        )
+        return cursor.rowcount
+    # SQLite holds the write lock from the INSERT until commit.
+    cursor.execute(
+        f"INSERT INTO {ARCHIVE_TABLE} ({ARCHIVED_COLUMNS}) SELECT {ARCHIVED_COLUMNS} FROM {TABLE} "
+        "WHERE check_in >= %s AND check_in < %s",
+        [start, end],
+    )
+    moved = cursor.rowcount
+    cursor.execute(f"DELETE FROM {TABLE} WHERE check_in >= %s AND check_in < %s", [start, end])
+    return moved
+
+
+def _archive_partition(cursor, year):
+    name = f"{TABLE}_y{year}"
+    cursor.execute(f"ALTER TABLE {TABLE} DETACH PARTITION {name}")
+    cursor.execute(f"INSERT INTO {ARCHIVE_TABLE} ({ARCHIVED_COLUMNS}) SELECT {ARCHIVED_COLUMNS} FROM {name}")
+    moved = cursor.rowcount
+    cursor.execute(f"DROP TABLE {name}")
+    return moved
+
+
+def dump_path(year, output_dir=None):
+    return os.path.join(output_dir or settings.BOOKING_ARCHIVE_DIR, f"bookings-{year}.jsonl.gz")
+
+
+def dump_year(year, path):
+    """Write every archived booking of ``year`` to ``path`` as gzipped JSONL."""
+    start, end = _year_range(year)
+    queryset = ArchivedBooking.objects.filter(check_in__gte=start, check_in__lt=end)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with gzip.open(path, "wt", encoding="utf-8") as target:
+        for piece in bulk.export_bookings(queryset, "jsonl", export=ARCHIVE_EXPORT):
+            target.write(piece)
+
+
+def archive_year(year, output_dir=None):
+    """Move the bookings checking in during ``year`` into the archive; return how many moved.
+
+    The dump is written inside the transaction and only renamed into place
+    once it commits, so a failed run leaves neither a partial file nor a
+    half-moved year.
+    """
+    start, end = _year_range(year)
+    connection = _connection()
+    path = dump_path(year, output_dir)
+    pending = f"{path}.tmp"
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                moved = 0
+                if partitioned() and year in partition_years():
+                    moved += _archive_partition(cursor, year)
+                # The default partition, or the whole table elsewhere.
+                moved += _move_rows(cursor, connection.vendor, start, end)
+            SearchDocument.objects.filter(
+                kind=search.BOOKING,
+                object_id__in=ArchivedBooking.objects.filter(check_in__gte=start, check_in__lt=end).values("id"),
+            ).delete()
+            dump_year(year, pending)
+            transaction.on_commit(lambda: os.replace(pending, path), using=connection.alias)
+    except BaseException:
+        if os.path.exists(pending):
+            os.remove(pending)
+        raise
+    return moved
@@ -0,0 +1,98 @@
+"""Authentication fast path: cached users and a tunable password hasher.
+
+With ``AUTH_USER_CACHE=1``, ``CachedModelBackend`` loads ``request.user``
+from the cache, so a request no longer queries ``auth_user``. The cached
+copy is dropped whenever the user is saved or deleted, which includes a
+password change. A change to the user's groups or permissions drops it
+too, so old sessions still end and permission changes apply straight away.
+Use a cache that every process shares (``CACHE_BACKEND=file``). With
+per-process memory, another worker can keep a stale copy for
+``AUTH_USER_CACHE_TIMEOUT``.
+"""
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.contrib.auth.models import Group
+from django.core.cache import cache
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+GENERATION_KEY = "auth:users:generation"
+
+User = get_user_model()
+
+
+def _generation():
+    return cache.get_or_set(GENERATION_KEY, 0, timeout=None)
+
+
+def _user_key(user_id, generation):
+    return f"auth:user:{user_id}:{generation}"
+
+
+def forget_user(user_id):
+    cache.delete(_user_key(user_id, _generation()))
+
+
+def forget_all_users():
+    """Drop every cached user, e.g. after a group's permissions change."""
+    cache.add(GENERATION_KEY, 0, timeout=None)
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, timeout=None)
+
+
+class CachedModelBackend(ModelBackend):
+    def get_user(self, user_id):
+        key = _user_key(user_id, _generation())
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache.set(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+        return user
+
+    async def aget_user(self, user_id):
+        generation = await cache.aget_or_set(GENERATION_KEY, 0, timeout=None)
+        key = _user_key(user_id, generation)
+        user = await cache.aget(key)
+        if user is None:
+            user = await super().aget_user(user_id)
+            if user is not None:
+                await cache.aset(key, user, settings.AUTH_USER_CACHE_TIMEOUT)
+        return user
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_changed_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def forget_changed_permissions(sender, instance, action, reverse, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if isinstance(instance, User) and not reverse:
+        forget_user(instance.pk)
+    else:
+        # group.user_set or group.permissions changed: any user may be affected.
+        forget_all_users()
+
+
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 at ``PASSWORD_HASH_ITERATIONS`` rounds.
+
+    It keeps Django's algorithm name, so existing hashes still verify. A
+    hash stored with a different round count is re-encoded at the user's
+    next login.
+    """
+
+    @property
+    def iterations(self):
+        return settings.PASSWORD_HASH_ITERATIONS
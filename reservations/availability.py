@@ -0,0 +1,83 @@
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .holds import hold_expiry, lapsed
+from .models import Booking, Room
+
+
+def overlapping_bookings(room_ids, check_in, check_out):
+    """Bookings in the given rooms that share at least one night with the range.
+
+    Lapsed holds are left out: their beds are free even before the sweeper
+    deletes them.
+    """
+    return Booking.objects.staying(check_in, check_out).filter(room_id__in=room_ids).exclude(lapsed())
+
+
+def peak_occupancy(intervals, check_in, check_out):
+    """Highest number of guests staying on any single night of the range.
+
+    ``intervals`` is an iterable of ``(check_in, check_out, guests)`` tuples.
+    Departures are processed before arrivals on the same date, so back-to-back
+    stays never count against each other.
+    """
+    events = []
+    for start, end, guests in intervals:
+        events.append((max(start, check_in), guests))
+        events.append((min(end, check_out), -guests))
+    events.sort()
+
+    peak = current = 0
+    for _, delta in events:
+        current += delta
+        peak = max(peak, current)
+    return peak
+
+
+def remaining_beds(rooms, check_in, check_out):
+    """Map room id -> beds still free on every night between check_in and check_out.
+
+    All rooms are checked with a single overlap query backed by the
+    ``(room, check_in, check_out)`` index.
+    """
+    rooms = list(rooms)
+    intervals = defaultdict(list)
+    rows = overlapping_bookings([room.id for room in rooms], check_in, check_out).values_list(
+        "room_id", "check_in", "check_out", "guests"
+    )
+    for room_id, start, end, guests in rows:
+        intervals[room_id].append((start, end, guests))
+
+    return {
+        room.id: max(room.beds - peak_occupancy(intervals[room.id], check_in, check_out), 0)
+        for room in rooms
+    }
+
+
+def check_capacity(room, check_in, check_out, guests):
+    available = remaining_beds([room], check_in, check_out)[room.id]
+    if guests > available:
+        if available:
+            raise ValidationError(
+                f"Only {available} bed(s) left in {room.name} for those dates."
+            )
+        raise ValidationError(f"{room.name} is fully booked for those dates.")
+
+
+@transaction.atomic
+def reserve(booking):
+    """Save a new booking if its room still has enough beds.
+
+    Unpaid bookings are saved with a hold that lapses after
+    ``BOOKING_HOLD_HOURS``. The room row is locked for the duration of the check so concurrent
+    bookings for the same room queue up, while bookings for other rooms
+    proceed in parallel.
+    """
+    room = Room.objects.select_for_update().get(pk=booking.room_id)
+    check_capacity(room, booking.check_in, booking.check_out, booking.guests)
+    if not booking.is_paid and booking.hold_expires_at is None:
+        booking.hold_expires_at = hold_expiry()
+    booking.save()
+    return booking
@@ -0,0 +1,362 @@
+import http.client
+import random
+import statistics
+import subprocess
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection, connections, router, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import search
+from .models import Amenity, Booking, Hostel, Room
+
+CITIES = ["Dar es Salaam", "Dodoma", "Arusha", "Mwanza", "Morogoro", "Mbeya", "Zanzibar", "Tanga"]
+AMENITIES = ["WiFi", "Laundry", "Study room", "Security", "Water heater", "Kitchen", "Parking", "Generator"]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def client_host():
+    """A host name the test client can use without tripping ALLOWED_HOSTS."""
+    for host in settings.ALLOWED_HOSTS:
+        if host != "*":
+            return host.lstrip(".")
+    return "localhost"
+
+
+def create_bookings(bookings):
+    """``bulk_create`` bookings, keeping their generated ``created_at``.
+
+    ``auto_now_add`` stamps every row with the current time, so the
+    generated values are written back afterwards by one prepared UPDATE
+    run with ``executemany``; ``bulk_update`` builds a CASE per batch and
+    doubles the seeding time. The check-in date lets PostgreSQL go
+    straight to the booking's partition.
+    """
+    created_at = [booking.created_at for booking in bookings]
+    Booking.objects.bulk_create(bookings)
+    for booking, value in zip(bookings, created_at):
+        booking.created_at = value
+
+    connection = connections[router.db_for_write(Booking)]
+    quote = connection.ops.quote_name
+    opts = Booking._meta
+    sql = (
+        f"UPDATE {quote(opts.db_table)} SET {quote(opts.get_field('created_at').column)} = %s "
+        f"WHERE {quote(opts.pk.column)} = %s AND {quote(opts.get_field('check_in').column)} = %s"
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            sql,
+            [
+                (
+                    connection.ops.adapt_datetimefield_value(booking.created_at),
+                    booking.pk,
+                    connection.ops.adapt_datefield_value(booking.check_in),
+                )
+                for booking in bookings
+            ],
+        )
+
+
+def seed_catalog(hostels, rooms_per_hostel, users, rng):
+    amenities = [Amenity.objects.get_or_create(name=name)[0] for name in AMENITIES]
+
+    created = Hostel.objects.bulk_create(
+        [
+            Hostel(
+                name=f"Benchmark Hostel {n:04d}",
+                city=rng.choice(CITIES),
+                address=f"{rng.randint(1, 400)} Campus Road",
+                description="Generated for benchmarking.",
+            )
+            for n in range(hostels)
+        ]
+    )
+    Hostel.amenities.through.objects.bulk_create(
+        [
+            Hostel.amenities.through(hostel_id=hostel.id, amenity_id=amenity.id)
+            for hostel in created
+            for amenity in rng.sample(amenities, rng.randint(2, len(amenities)))
+        ],
+        ignore_conflicts=True,
+    )
+    # bulk_create skips the signal that keeps the search index current.
+    search.index_hostels([hostel.id for hostel in created])
+
+    rooms = []
+    for hostel in created:
+        for n in range(rooms_per_hostel):
+            private = rng.random() < 0.25
+            rooms.append(
+                Room(
+                    hostel=hostel,
+                    name=f"Room {n + 1}",
+                    beds=rng.randint(1, 2) if private else rng.randint(2, 8),
+                    price_per_night=Decimal(rng.randrange(3000, 8000, 250)),
+                    is_private=private,
+                )
+            )
+    rooms = Room.objects.bulk_create(rooms, batch_size=1000)
+
+    User = get_user_model()
+    first = User.objects.count()
+    User.objects.bulk_create(
+        [
+            User(username=f"student{first + n:07d}", email=f"student{first + n:07d}@example.com", password="!")
+            for n in range(users)
+        ],
+        batch_size=2000,
+    )
+    user_ids = list(User.objects.filter(username__startswith="student").values_list("id", flat=True))
+    return rooms, user_ids
+
+
+# Student hostels fill up around semester intakes.
+INTAKE_MONTHS = {1, 2, 9, 10}
+
+
+def generate_bookings(rooms, user_ids, count, rng, start=None, paid_share=0.7):
+    """Yield non-overlapping bookings spread over each room's beds.
+
+    Stays are mostly short visits with a share of term-length stays. Beds
+    sit empty for shorter gaps in intake months. Bookings are usually made
+    one to three weeks before arrival, with a long tail of early planners.
+    """
+    start = start or timezone.localdate() - timedelta(days=730)
+    beds = [(room, start + timedelta(days=rng.randint(0, 60))) for room in rooms for _ in range(room.beds)]
+    tz = timezone.get_current_timezone()
+
+    for n in range(count):
+        slot = n % len(beds)
+        room, cursor = beds[slot]
+        mean_gap = 1.5 if cursor.month in INTAKE_MONTHS else 5
+        check_in = cursor + timedelta(days=int(rng.expovariate(1 / mean_gap)))
+        nights = rng.randint(90, 120) if rng.random() < 0.15 else rng.randint(1, 14)
+        check_out = check_in + timedelta(days=nights)
+        beds[slot] = (room, check_out)
+
+        lead_days = min(int(rng.lognormvariate(2.5, 0.8)), 180)
+        lead = timedelta(days=lead_days, minutes=rng.randint(0, 1440))
+        created_at = datetime.combine(check_in, datetime.min.time(), tz) - lead
+        paid = rng.random() < paid_share
+        user_id = rng.choice(user_ids) if user_ids else None
+        yield Booking(
+            user_id=user_id,
+            hostel_id=room.hostel_id,
+            room=room,
+            guest_name=f"Guest {user_id or n}",
+            guest_email=f"guest{user_id or n}@example.com",
+            check_in=check_in,
+            check_out=check_out,
+            guests=1,
+            created_at=created_at,
+            is_paid=paid,
+            paid_at=created_at + timedelta(hours=rng.randint(1, 72)) if paid else None,
+            amount_paid=nights * room.price_per_night if paid else None,
+        )
+
+
+def generate_cohort(count, rng, check_in=None, nights=120):
+    """Yield ``(line, record)`` pairs for a term's intake, as read by ``allocation.allocate``.
+
+    Students mostly arrive within the first week of term and list one to
+    three hostels in one city; some ask for a room type or give a budget.
+    """
+    check_in = check_in or timezone.localdate() + timedelta(days=400)
+    hostels = defaultdict(list)
+    for name, city in Hostel.objects.values_list("name", "city"):
+        hostels[city].append(name)
+    cities = sorted(hostels)
+    for n in range(count):
+        city = rng.choice(cities)
+        arrival = check_in + timedelta(days=rng.choice([0, 0, 0, 1, 2, 7]))
+        yield n + 2, {
+            "student": f"Student {n:06d}",
+            "email": f"cohort{n:06d}@example.com",
+            "check_in": arrival.isoformat(),
+            "check_out": (arrival + timedelta(days=nights)).isoformat(),
+            "city": city,
+            "hostels": ";".join(rng.sample(hostels[city], min(len(hostels[city]), rng.randint(1, 3)))),
+            "room_type": rng.choice(["", "", "shared", "private"]),
+            "budget": rng.choice(["", "6000", "7000"]),
+        }
+
+
+def seed(
+    hostels=50,
+    rooms_per_hostel=10,
+    users=500,
+    bookings=10_000,
+    batch_size=5000,
+    seed=1,
+    start=None,
+    paid_share=0.7,
+    stdout=None,
+):
+    """Create a reproducible data set and return the number of bookings written."""
+    rng = random.Random(seed)
+    rooms, user_ids = seed_catalog(hostels, rooms_per_hostel, users, rng)
+
+    written = 0
+    batch = []
+    for booking in generate_bookings(rooms, user_ids, bookings, rng, start, paid_share):
+        batch.append(booking)
+        if len(batch) >= batch_size:
+            with transaction.atomic():
+                create_bookings(batch)
+            written += len(batch)
+            batch = []
+            if stdout:
+                stdout.write(f"  {written} bookings")
+    if batch:
+        with transaction.atomic():
+            create_bookings(batch)
+        written += len(batch)
+    return written
+
+
+def time_request(client, url, runs=5):
+    """Median and worst latency in ms plus query count for a GET."""
+    timings = []
+    status = None
+    queries = 0
+    for _ in range(runs):
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+        status = response.status_code
+        queries = len(captured)
+    return {
+        "url": url,
+        "status": status,
+        "median_ms": statistics.median(timings),
+        "max_ms": max(timings),
+        "queries": queries,
+    }
+
+
+def benchmark_user(username="bench-user", password="bench-password"):
+    """A user with a known password, for timing the real login form."""
+    User = get_user_model()
+    user, created = User.objects.get_or_create(username=username, defaults={"email": f"{username}@example.com"})
+    if created or not user.check_password(password):
+        user.set_password(password)
+        user.save(update_fields=["password"])
+    return user
+
+
+def measure(request, runs=20, warmup=2, prepare=None):
+    """Latency, queries and peak traced memory for ``request(prepare())``.
+
+    ``prepare`` runs outside the timed section, e.g. to create the booking
+    a payment request will pay. Memory is traced in one extra run so that
+    tracemalloc does not skew the timings.
+    """
+    prepare = prepare or (lambda: None)
+    for _ in range(warmup):
+        request(prepare())
+
+    timings = []
+    queries = []
+    statuses = set()
+    for _ in range(runs):
+        argument = prepare()
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            response = request(argument)
+            timings.append((time.perf_counter() - started) * 1000)
+        queries.append(len(captured))
+        statuses.add(response.status_code)
+
+    argument = prepare()
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        request(argument)
+        peak = tracemalloc.get_traced_memory()[1] - baseline
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "runs": runs,
+        "statuses": sorted(statuses),
+        "median_ms": statistics.median(timings),
+        "p95_ms": percentile(timings, 95),
+        "max_ms": max(timings),
+        "queries": statistics.median(queries),
+        "peak_kib": peak / 1024,
+    }
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def http_load(host, port, paths, requests=1000, concurrency=16, headers=None):
+    """Fire ``requests`` GETs over ``concurrency`` keep-alive connections.
+
+    Paths are requested round-robin. Returns requests/sec, p50/p99 latency
+    in ms and the number of non-2xx/3xx or failed requests.
+    """
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker():
+        nonlocal errors
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        local, failed = [], 0
+        for n in counter:
+            started = time.perf_counter()
+            try:
+                conn.request("GET", paths[n % len(paths)], headers=headers or {})
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 400:
+                    failed += 1
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=30)
+            local.append((time.perf_counter() - started) * 1000)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+            errors += failed
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "requests_per_sec": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+    }
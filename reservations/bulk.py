@@ -0,0 +1,405 @@
+"""Streaming CSV/JSONL import of hostels and rooms, and export of bookings.
+
+Imports read one record at a time and write in batches with
+``bulk_create``/``bulk_update``. Existing hostels are matched on
+``(name, city)`` and rooms on ``(hostel, name)``. Exports iterate the
+database in chunks, so memory use does not grow with the number of bookings,
+and can also be written as XLSX (see ``reservations.xlsx``). ``PAYMENTS`` is
+the accounting export: paid bookings in the order they were paid.
+"""
+
+import csv
+import heapq
+import io
+import json
+from datetime import datetime, time
+from decimal import Decimal
+from operator import itemgetter
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+from . import conditional, search, xlsx
+from .models import Amenity, Hostel, Room
+from .parallel import chunked
+
+FORMATS = ("csv", "jsonl")
+EXPORT_FORMATS = FORMATS + ("xlsx",)
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+HOSTEL_FIELDS = ["name", "city", "address", "description", "amenities"]
+ROOM_FIELDS = ["hostel", "city", "name", "beds", "price_per_night", "is_private"]
+TRUE_VALUES = {"1", "true", "yes", "y", "private"}
+
+EXPORT_COLUMNS = [
+    ("id", "id"),
+    ("created_at", "created_at"),
+    ("hostel", "hostel__name"),
+    ("room", "room__name"),
+    ("guest_name", "guest_name"),
+    ("guest_email", "guest_email"),
+    ("check_in", "check_in"),
+    ("check_out", "check_out"),
+    ("guests", "guests"),
+    ("is_paid", "is_paid"),
+    ("paid_at", "paid_at"),
+    ("amount_paid", "amount_paid"),
+    ("receipt_number", "receipt_number"),
+]
+
+
+def detect_format(filename, default="csv"):
+    suffix = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    if suffix in ("jsonl", "ndjson"):
+        return "jsonl"
+    if suffix == "csv":
+        return "csv"
+    return default
+
+
+def read_records(stream, fmt):
+    """Yield ``(line_number, record)`` from a text stream without loading it whole."""
+    if fmt == "jsonl":
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError as exc:
+                raise ValueError(f"Line {line_number}: invalid JSON ({exc.msg}).")
+    else:
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+
+
+def text_stream(binary):
+    """Wrap an uploaded or opened binary file for :func:`read_records`."""
+    return io.TextIOWrapper(binary, encoding="utf-8-sig", newline="")
+
+
+def _text(record, key):
+    value = record.get(key)
+    return "" if value is None else str(value).strip()
+
+
+def _boolean(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def _amenity_names(value):
+    if isinstance(value, list):
+        names = value
+    else:
+        names = (value or "").split(";")
+    return {str(name).strip() for name in names if str(name).strip()}
+
+
+def _describe(exc):
+    return "; ".join(f"{field}: {' '.join(messages)}" for field, messages in exc.message_dict.items())
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+
+    def error(self, line_number, message):
+        self.errors.append((line_number, message))
+
+    def __str__(self):
+        return f"{self.created} created, {self.updated} updated, {len(self.errors)} rejected"
+
+
+class AmenityMap:
+    """Amenity name -> id, loaded once and extended in bulk as new names appear."""
+
+    def __init__(self):
+        self.ids = dict(Amenity.objects.values_list("name", "id"))
+
+    def resolve(self, names):
+        missing = names - self.ids.keys()
+        if missing:
+            Amenity.objects.bulk_create([Amenity(name=name) for name in missing], ignore_conflicts=True)
+            self.ids.update(Amenity.objects.filter(name__in=missing).values_list("name", "id"))
+        return {self.ids[name] for name in names}
+
+
+def import_hostels(records, batch_size=500):
+    """Create or update hostels from records with the columns in ``HOSTEL_FIELDS``.
+
+    ``amenities`` is a ``;``-separated list in CSV or a list in JSONL; when
+    present it replaces the hostel's amenities.
+    """
+    result = ImportResult()
+    amenities = AmenityMap()
+    existing = {(name, city): pk for pk, name, city in Hostel.objects.values_list("id", "name", "city")}
+
+    for batch in chunked(records, batch_size):
+        pending = []
+        seen = set()
+        for line_number, record in batch:
+            hostel = Hostel(
+                name=_text(record, "name"),
+                city=_text(record, "city"),
+                address=_text(record, "address"),
+                description=_text(record, "description"),
+            )
+            key = (hostel.name, hostel.city)
+            if key in seen:
+                result.error(line_number, f"Hostel {hostel.name!r} in {hostel.city!r} appears twice in this batch.")
+                continue
+            seen.add(key)
+            hostel.id = existing.get(key)
+            try:
+                hostel.full_clean(exclude=["image"], validate_unique=False)
+            except ValidationError as exc:
+                result.error(line_number, _describe(exc))
+                continue
+            names = _amenity_names(record["amenities"]) if "amenities" in record else None
+            pending.append((hostel, names))
+
+        with transaction.atomic():
+            new = [hostel for hostel, _ in pending if hostel.id is None]
+            old = [hostel for hostel, _ in pending if hostel.id is not None]
+            Hostel.objects.bulk_create(new)
+            # bulk_update does not apply auto_now.
+            now = timezone.now()
+            for hostel in old:
+                hostel.updated_at = now
+            Hostel.objects.bulk_update(old, ["address", "description", "updated_at"])
+            for hostel in new:
+                existing[(hostel.name, hostel.city)] = hostel.id
+
+            linked = [(hostel.id, names) for hostel, names in pending if names is not None]
+            Through = Hostel.amenities.through
+            Through.objects.filter(hostel_id__in=[hostel_id for hostel_id, _ in linked]).delete()
+            Through.objects.bulk_create(
+                [
+                    Through(hostel_id=hostel_id, amenity_id=amenity_id)
+                    for hostel_id, names in linked
+                    for amenity_id in amenities.resolve(names)
+                ],
+                ignore_conflicts=True,
+            )
+            # bulk_create and bulk_update skip the model signals.
+            hostel_ids = [hostel.id for hostel, _ in pending]
+            search.index_hostels(hostel_ids)
+
+        result.created += len(new)
+        result.updated += len(old)
+    return result
+
+
+def import_rooms(records, batch_size=500):
+    """Create or update rooms from records with the columns in ``ROOM_FIELDS``.
+
+    ``hostel`` is the hostel's name; ``city`` is only needed when several
+    hostels share that name.
+    """
+    result = ImportResult()
+    by_key = {}
+    by_name = {}
+    for pk, name, city in Hostel.objects.values_list("id", "name", "city"):
+        by_key[(name, city)] = pk
+        by_name.setdefault(name, []).append(pk)
+
+    for batch in chunked(records, batch_size):
+        pending = []
+        seen = set()
+        for line_number, record in batch:
+            hostel_name, city = _text(record, "hostel"), _text(record, "city")
+            hostel_id = by_key.get((hostel_name, city)) if city else None
+            if hostel_id is None and not city and len(by_name.get(hostel_name, ())) == 1:
+                hostel_id = by_name[hostel_name][0]
+            if hostel_id is None:
+                result.error(line_number, f"Unknown or ambiguous hostel {hostel_name!r}.")
+                continue
+            room = Room(
+                hostel_id=hostel_id,
+                name=_text(record, "name"),
+                beds=record.get("beds"),
+                price_per_night=record.get("price_per_night"),
+                is_private=_boolean(record.get("is_private", False)),
+            )
+            try:
+                room.full_clean(exclude=["hostel", "image"], validate_unique=False)
+            except ValidationError as exc:
+                result.error(line_number, _describe(exc))
+                continue
+            if (hostel_id, room.name) in seen:
+                result.error(line_number, f"Room {room.name!r} of {hostel_name!r} appears twice in this batch.")
+                continue
+            seen.add((hostel_id, room.name))
+            pending.append(room)
+
+        existing = {
+            (hostel_id, name): pk
+            for pk, hostel_id, name in Room.objects.filter(
+                hostel_id__in={room.hostel_id for room in pending}
+            ).values_list("id", "hostel_id", "name")
+        }
+        for room in pending:
+            room.id = existing.get((room.hostel_id, room.name))
+
+        with transaction.atomic():
+            new = [room for room in pending if room.id is None]
+            old = [room for room in pending if room.id is not None]
+            Room.objects.bulk_create(new)
+            now = timezone.now()
+            for room in old:
+                room.updated_at = now
+            Room.objects.bulk_update(old, ["beds", "price_per_night", "is_private", "updated_at"])
+            hostel_ids = {room.hostel_id for room in pending}
+            conditional.touch(hostel_ids)
+
+        result.created += len(new)
+        result.updated += len(old)
+    return result
+
+
+class Export:
+    """The columns and row order of a streamed export.
+
+    ``columns`` are ``(header, lookup)`` pairs for ``values_list``;
+    ``convert`` maps each fetched row before it is written. ``ordering``
+    names ascending fields among the lookups. :meth:`rows` also takes a list
+    of querysets, e.g. live and archived bookings, and merges them in that
+    order.
+    """
+
+    def __init__(self, title, columns, ordering, convert=None):
+        self.title = title
+        self.columns = columns
+        self.ordering = ordering
+        self.convert = convert
+
+    @property
+    def header(self):
+        return [name for name, _ in self.columns]
+
+    def rows(self, queryset, chunk_size=2000):
+        lookups = [lookup for _, lookup in self.columns]
+        querysets = queryset if isinstance(queryset, (list, tuple)) else [queryset]
+        streams = [
+            each.order_by(*self.ordering).values_list(*lookups).iterator(chunk_size=chunk_size) for each in querysets
+        ]
+        if len(streams) == 1:
+            rows = streams[0]
+        else:
+            rows = heapq.merge(*streams, key=itemgetter(*(lookups.index(field) for field in self.ordering)))
+        return rows if self.convert is None else map(self.convert, rows)
+
+
+def _payment_row(row):
+    receipt_number, pk, *rest = row
+    return (receipt_number, f"BK-{pk:06d}", *rest)
+
+
+BOOKINGS = Export("Bookings", EXPORT_COLUMNS, ["id"])
+# Ordered to match the booking_paid_at_idx index, so rows stream without a sort.
+PAYMENTS = Export(
+    "Payments",
+    [
+        ("receipt_number", "receipt_number"),
+        ("reference", "id"),
+        ("paid_at", "paid_at"),
+        ("amount_paid", "amount_paid"),
+        ("hostel", "hostel__name"),
+        ("room", "room__name"),
+        ("guest_name", "guest_name"),
+        ("guest_email", "guest_email"),
+    ],
+    ["paid_at", "id"],
+    convert=_payment_row,
+)
+
+
+def payments(queryset, since=None, until=None):
+    """Paid bookings of ``queryset`` paid from ``since`` up to, not including, ``until`` (local dates)."""
+    queryset = queryset.filter(is_paid=True, paid_at__isnull=False)
+    tz = timezone.get_current_timezone()
+    if since:
+        queryset = queryset.filter(paid_at__gte=datetime.combine(since, time(), tz))
+    if until:
+        queryset = queryset.filter(paid_at__lt=datetime.combine(until, time(), tz))
+    return queryset
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def _format_value(value):
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _row_formatter(fmt, names):
+    """Return ``(header, format_row)`` for a text export format."""
+    if fmt == "jsonl":
+        return "", lambda row: json.dumps(dict(zip(names, map(_format_value, row)))) + "\n"
+    writer = csv.writer(_Echo())
+    return writer.writerow(names), lambda row: writer.writerow([_format_value(value) for value in row])
+
+
+def export_bookings(queryset, fmt="csv", chunk_size=2000, export=BOOKINGS):
+    """Yield the export in pieces of ``chunk_size`` rows: text for CSV/JSONL, bytes for XLSX.
+
+    The first piece is yielded before the query runs, so a response starts
+    at once however long the database takes to produce the first rows.
+    """
+    rows = export.rows(queryset, chunk_size)
+    if fmt == "xlsx":
+        yield from xlsx.stream(export.header, rows, export.title, chunk_rows=chunk_size)
+        return
+    header, format_row = _row_formatter(fmt, export.header)
+    yield header
+    for batch in chunked(rows, chunk_size):
+        yield "".join(map(format_row, batch))
+
+
+async def aiterate(pieces):
+    """Iterate a sync generator from async code.
+
+    Each piece is fetched with ``sync_to_async`` on the same thread, so the
+    database cursor stays open between chunks.
+    """
+    while (piece := await sync_to_async(next)(pieces, None)) is not None:
+        yield piece
+
+
+def aexport_bookings(queryset, fmt="csv", chunk_size=2000, export=BOOKINGS):
+    """Async version of :func:`export_bookings` for ASGI responses."""
+    return aiterate(export_bookings(queryset, fmt, chunk_size, export))
+
+
+def export_response(request, queryset, fmt="csv", filename="bookings", export=BOOKINGS):
+    """Stream an export as CSV, JSONL or XLSX.
+
+    Under ASGI the rows come from an async iterator; Django would otherwise
+    buffer a sync iterator in full before sending it.
+    """
+    if isinstance(request, ASGIRequest):
+        content = aexport_bookings(queryset, fmt, export=export)
+    else:
+        content = export_bookings(queryset, fmt, export=export)
+    response = StreamingHttpResponse(content, content_type=CONTENT_TYPES[fmt])
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{fmt}"'
+    return response
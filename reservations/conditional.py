@@ -0,0 +1,96 @@
+"""Conditional GET for the hostel pages.
+
+``Hostel.updated_at`` moves whenever anything shown about a hostel
+changes. Its own fields set it on save. Room and amenity changes touch it
+through ``reservations.signals``, and the bulk importers touch it
+themselves. A page's validators therefore come from one small query. An
+unchanged page is answered with 304 before the page's querysets are
+built or its template rendered. The validators are read from the primary
+database, like the fragment versions, so every process and every replica
+state agrees on them.
+
+The pages are personal. They show the username, carry a CSRF token in the
+logout form and may show flash messages. So the ETag includes the viewer
+and the CSRF secret, and pages with pending messages are always rendered.
+``Last-Modified`` is never earlier than the viewer's last login. Responses
+are ``private, no-cache`` with ``Vary: Cookie``: shared caches do not
+store them, and browsers revalidate on every visit. Images and other
+media are public and cached separately (see ``reservations.media``).
+"""
+
+import hashlib
+
+from django.contrib.messages import get_messages
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .models import Hostel
+
+
+def touch(hostel_ids):
+    """Mark these hostels' pages as changed."""
+    hostel_ids = {hostel_id for hostel_id in hostel_ids if hostel_id is not None}
+    if hostel_ids:
+        Hostel.objects.filter(id__in=hostel_ids).update(updated_at=timezone.now())
+
+
+async def ahostel_updated_at(hostel_id):
+    """When this hostel's page last changed, or None if there is no such hostel."""
+    hostels = Hostel.objects.using(DEFAULT_DB_ALIAS)
+    return await hostels.filter(id=hostel_id).values_list("updated_at", flat=True).afirst()
+
+
+async def alisting_state():
+    """``(latest updated_at, count)`` over all hostels; the count catches deletions."""
+    state = await Hostel.objects.using(DEFAULT_DB_ALIAS).aaggregate(updated_at=Max("updated_at"), count=Count("id"))
+    return state["updated_at"], state["count"]
+
+
+class Validators:
+    def __init__(self, etag, last_modified=None):
+        self.etag = etag
+        self.last_modified = last_modified
+
+
+def _viewer(request):
+    """What else the page depends on, or None when it has to be rendered anyway."""
+    secret = request.META.get("CSRF_COOKIE")
+    if not secret or len(get_messages(request)):
+        return None
+    user = request.user
+    return (user.pk, user.get_username(), user.is_staff, secret)
+
+
+def validators(request, *parts, updated_at=None):
+    """The ETag (and Last-Modified, given ``updated_at``) of a page built from ``parts``."""
+    viewer = _viewer(request)
+    if viewer is None:
+        return None
+    digest = hashlib.blake2b(repr((viewer, updated_at, parts)).encode(), digest_size=16).hexdigest()
+    last_modified = None
+    if updated_at is not None:
+        last_login = request.user.last_login
+        last_modified = int(max(updated_at, last_login).timestamp() if last_login else updated_at.timestamp())
+    return Validators(f'"{digest}"', last_modified)
+
+
+def not_modified(request, page):
+    """A 304 response when the client's copy of the page is current, else None."""
+    if page is None:
+        return None
+    response = get_conditional_response(request, etag=page.etag, last_modified=page.last_modified)
+    return finish(response, page) if response is not None else None
+
+
+def finish(response, page):
+    """Add the validators and caching headers to a page response."""
+    if page is not None:
+        response["ETag"] = page.etag
+        if page.last_modified is not None:
+            response["Last-Modified"] = http_date(page.last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ["Cookie"])
+    return response
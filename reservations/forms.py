@@ -2,7 +2,8 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
-from .models import Booking, Room
+from .availability import check_capacity
+from .models import Amenity, Booking, Hostel, Room
 
 
 class BookingForm(forms.ModelForm):
@@ -25,6 +26,13 @@ class BookingForm(forms.ModelForm):
         check_out = cleaned.get("check_out")
         if check_in and check_out and check_out <= check_in:
             raise ValidationError("Check-out must be after check-in.")
+
+        room = cleaned.get("room")
+        guests = cleaned.get("guests")
+        if room and guests and guests > room.beds:
+            raise ValidationError(f"{room.name} only has {room.beds} bed(s).")
+        if room and guests and check_in and check_out:
+            check_capacity(room, check_in, check_out, guests)
         return cleaned
 
 
@@ -51,3 +59,55 @@ class PaymentForm(forms.Form):
     ]
     method = forms.ChoiceField(choices=METHOD_CHOICES)
     confirm = forms.BooleanField(label="I confirm the payment amount.")
+
+
+class AvailabilitySearchForm(forms.Form):
+    check_in = forms.DateField()
+    check_out = forms.DateField()
+    guests = forms.IntegerField(min_value=1, required=False)
+    city = forms.CharField(max_length=100, required=False)
+    max_price = forms.DecimalField(max_digits=8, decimal_places=2, min_value=0, required=False)
+    amenity = forms.ModelMultipleChoiceField(
+        queryset=Amenity.objects.all(), to_field_name="name", required=False
+    )
+
+    MAX_NIGHTS = 120
+
+    def clean(self):
+        cleaned = super().clean()
+        check_in = cleaned.get("check_in")
+        check_out = cleaned.get("check_out")
+        if check_in and check_out:
+            if check_out <= check_in:
+                raise ValidationError("Check-out must be after check-in.")
+            if (check_out - check_in).days > self.MAX_NIGHTS:
+                raise ValidationError(f"Searches are limited to {self.MAX_NIGHTS} nights.")
+        return cleaned
+
+
+class HostelSearchForm(forms.Form):
+    q = forms.CharField(max_length=200, required=False)
+    city = forms.CharField(max_length=100, required=False)
+    amenity = forms.ModelMultipleChoiceField(
+        queryset=Amenity.objects.all(), to_field_name="name", required=False
+    )
+
+
+class PaymentExportForm(forms.Form):
+    format = forms.ChoiceField(choices=[("xlsx", "XLSX"), ("csv", "CSV")], required=False)
+    hostel = forms.ModelChoiceField(queryset=Hostel.objects.all(), required=False)
+    since = forms.DateField(required=False)
+    until = forms.DateField(required=False)
+
+    def clean(self):
+        cleaned = super().clean()
+        since = cleaned.get("since")
+        until = cleaned.get("until")
+        if since and until and until <= since:
+            raise ValidationError("The end date must be after the start date.")
+        return cleaned
+
+
+class CatalogImportForm(forms.Form):
+    kind = forms.ChoiceField(choices=[("hostels", "Hostels"), ("rooms", "Rooms")])
+    file = forms.FileField(help_text="CSV with a header row, or JSONL with one object per line.")
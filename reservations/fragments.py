@@ -0,0 +1,160 @@
+"""Cached HTML fragments for hostel listings, keyed by each hostel's ``updated_at``.
+
+``Hostel.updated_at`` moves whenever anything a hostel's row or room grid
+shows changes (see ``reservations.conditional``), so it serves as the
+fragments' version stamp. The listing as a whole is keyed by a digest of
+every hostel's id and stamp, which also changes when a hostel is added or
+deleted. Stale fragments are never looked up again and simply age out.
+The stamps come from the database, so every process agrees on them even
+when each has its own cache. Works with any Django cache backend.
+
+Stamps are read and fragments rendered from the primary database. A
+lagging replica would otherwise store old rows under a fresh stamp.
+"""
+
+import hashlib
+
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DEFAULT_DB_ALIAS
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import Hostel
+
+HIT_KEY = "fragments:stats:hits"
+MISS_KEY = "fragments:stats:misses"
+FRAGMENT_TIMEOUT = 60 * 60 * 24
+
+
+def _stamp(updated_at):
+    return int(updated_at.timestamp() * 1_000_000)
+
+
+def hostel_versions(hostel_ids):
+    hostels = Hostel.objects.using(DEFAULT_DB_ALIAS).filter(id__in=hostel_ids)
+    return {hostel_id: _stamp(updated_at) for hostel_id, updated_at in hostels.values_list("id", "updated_at")}
+
+
+def _listing_version(stamps):
+    return hashlib.blake2b(repr(stamps).encode(), digest_size=16).hexdigest()
+
+
+def _count(key, amount):
+    if amount:
+        cache.add(key, 0, timeout=None)
+        try:
+            cache.incr(key, amount)
+        except ValueError:
+            cache.set(key, amount, timeout=None)
+
+
+def get_many(keys):
+    """Fetch fragments and record hits and misses."""
+    found = cache.get_many(keys)
+    _count(HIT_KEY, len(found))
+    _count(MISS_KEY, len(keys) - len(found))
+    return found
+
+
+def set_many(fragments):
+    cache.set_many(fragments, timeout=FRAGMENT_TIMEOUT)
+
+
+def cached(key, render):
+    """Return the fragment stored under ``key``, rendering and storing it on a miss."""
+    found = get_many([key])
+    if key in found:
+        return found[key]
+    value = render()
+    set_many({key: value})
+    return value
+
+
+def listing_key(version):
+    return f"fragments:listing:{version}"
+
+
+def hostel_row_key(hostel_id, version):
+    return f"fragments:hostel:{hostel_id}:row:{version}"
+
+
+def hostel_room_grid_key(hostel_id, version):
+    return f"fragments:hostel:{hostel_id}:rooms:{version}"
+
+
+def _hostel_rows(hostel_ids, versions=None):
+    """The row fragments of these hostels in order, and those that had to be rendered."""
+    versions = versions if versions is not None else hostel_versions(hostel_ids)
+    hostel_ids = [hostel_id for hostel_id in hostel_ids if hostel_id in versions]
+    keys = {hostel_id: hostel_row_key(hostel_id, versions[hostel_id]) for hostel_id in hostel_ids}
+    rows = get_many(list(keys.values()))
+
+    missing = [hostel_id for hostel_id in hostel_ids if keys[hostel_id] not in rows]
+    rendered = {
+        keys[hostel.id]: render_to_string("reservations/_hostel_row.html", {"hostel": hostel})
+        for hostel in Hostel.objects.using(DEFAULT_DB_ALIAS).filter(id__in=missing)
+    }
+    rows.update(rendered)
+    return [rows[keys[hostel_id]] for hostel_id in hostel_ids if keys[hostel_id] in rows], rendered
+
+
+def rows_html(hostel_ids):
+    """The rows of these hostels, in the given order, e.g. for search results."""
+    rows, rendered = _hostel_rows(hostel_ids)
+    set_many(rendered)
+    return mark_safe("".join(rows))
+
+
+def listing_html():
+    """The hostel rows for the home page.
+
+    A listing hit costs one indexed read of the hostels' stamps and one
+    cache read. On a miss only the rows whose hostel changed are rendered
+    again; the rest come from the cache.
+    """
+    stamps = [
+        (hostel_id, _stamp(updated_at))
+        for hostel_id, updated_at in Hostel.objects.using(DEFAULT_DB_ALIAS)
+        .order_by("name", "id")
+        .values_list("id", "updated_at")
+    ]
+    key = listing_key(_listing_version(stamps))
+    found = get_many([key])
+    if key in found:
+        return found[key]
+
+    rows, rendered = _hostel_rows([hostel_id for hostel_id, _ in stamps], dict(stamps))
+    html = mark_safe("".join(rows))
+    rendered[key] = html
+    set_many(rendered)
+    return html
+
+
+def room_grid_html(hostel):
+    """The room cards on a hostel's detail page."""
+    version = hostel_versions([hostel.id]).get(hostel.id, _stamp(hostel.updated_at))
+    return cached(
+        hostel_room_grid_key(hostel.id, version),
+        lambda: render_to_string(
+            "reservations/_room_grid.html",
+            {"rooms": hostel.rooms.using(DEFAULT_DB_ALIAS).order_by("price_per_night")},
+        ),
+    )
+
+
+def shared_stats():
+    """Whether other processes see the counters; locmem and dummy caches are per process."""
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], (DummyCache, LocMemCache))
+
+
+def stats():
+    hits = cache.get(HIT_KEY, 0)
+    misses = cache.get(MISS_KEY, 0)
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_rate": hits / total if total else 0.0}
+
+
+def reset_stats():
+    cache.delete_many([HIT_KEY, MISS_KEY])
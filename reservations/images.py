@@ -0,0 +1,78 @@
+"""Resized WebP/JPEG variants of uploaded hostel and room photos.
+
+Variants live under ``derived/<key>/`` where the key is derived from the
+source file name. Uploaded names are unique, so a variant's URL never
+changes meaning and can be cached forever.
+"""
+
+import hashlib
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+WIDTHS = (160, 320, 640, 1280)
+FORMATS = {"webp": ("WEBP", {"quality": 80, "method": 4}), "jpg": ("JPEG", {"quality": 82, "progressive": True})}
+
+
+def variant_name(source_name, width, ext):
+    key = hashlib.sha1(source_name.encode()).hexdigest()[:16]
+    return f"derived/{key}/{width}.{ext}"
+
+
+# Source names known to have variants; uploads are never overwritten, so this only grows.
+_built = set()
+
+
+def has_variants(source_name):
+    """Whether the variants of ``source_name`` have been built, e.g. before pointing ``srcset`` at them."""
+    if source_name in _built:
+        return True
+    if default_storage.exists(variant_name(source_name, WIDTHS[-1], "jpg")):
+        _built.add(source_name)
+        return True
+    return False
+
+
+def build_variants(source_name, force=False):
+    """Write every width and format for ``source_name``; return how many files were written.
+
+    Images narrower than a width are stored at their own size, so once
+    :func:`has_variants` is true every width of both formats exists. The
+    largest JPEG is written last for that reason.
+    """
+    from PIL import Image, ImageOps
+
+    if not force and has_variants(source_name):
+        return 0
+
+    with default_storage.open(source_name) as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image = image.convert("RGB")
+
+    files = {}
+    # Largest first so each step downsamples an already reduced image.
+    for width in sorted(WIDTHS, reverse=True):
+        if image.width > width:
+            image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        for ext, (pil_format, params) in FORMATS.items():
+            buffer = BytesIO()
+            image.save(buffer, pil_format, **params)
+            files[variant_name(source_name, width, ext)] = buffer.getvalue()
+
+    marker = variant_name(source_name, WIDTHS[-1], "jpg")
+    written = 0
+    for name in sorted(files, key=lambda name: name == marker):
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        default_storage.save(name, ContentFile(files[name]))
+        written += 1
+    return written
+
+
+def srcset(source_name, ext):
+    return ", ".join(f"{default_storage.url(variant_name(source_name, width, ext))} {width}w" for width in WIDTHS)
+
+
+def variant_url(source_name, width, ext="jpg"):
+    return default_storage.url(variant_name(source_name, width, ext))
@@ -0,0 +1,190 @@
+"""Database-backed background jobs that need no broker.
+
+Views call :func:`enqueue`, which adds a ``Job`` row, and return straight
+away. ``run_workers`` claims the jobs that are due and runs them. On
+PostgreSQL the claim uses ``SELECT ... FOR UPDATE SKIP LOCKED``, so workers
+never wait for each other. On SQLite the claim transaction takes the write
+lock at BEGIN (see ``DATABASES``), so claims run one after another.
+
+While a worker holds a job, other workers cannot see it until the job's
+visibility timeout passes. If a worker dies mid-job, the job is only
+delayed: it is claimed again once the timeout runs out. A failed attempt is
+retried with exponential backoff until ``max_attempts`` is reached.
+"""
+
+import logging
+import os
+import signal
+import socket
+import threading
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+RETRY_BACKOFF = timedelta(seconds=30)
+
+_tasks = {}
+
+
+def task(name=None, max_attempts=3):
+    """Register a function as a task. It is called with the job's payload as keyword arguments."""
+
+    def register(func):
+        func.task_name = name or f"{func.__module__}.{func.__name__}"
+        func.max_attempts = max_attempts
+        _tasks[func.task_name] = func
+        return func
+
+    return register
+
+
+def enqueue(func, payload=None, key="", delay=None):
+    """Queue ``func(**payload)`` and return the job, or ``None`` if ``key`` is already queued or running.
+
+    The job is written in the caller's transaction, so workers only see it
+    once that transaction commits. With ``JOBS_EAGER`` the task runs right
+    after the commit in this process instead, which suits development
+    without a worker.
+    """
+    payload = payload or {}
+    if settings.JOBS_EAGER:
+        transaction.on_commit(lambda: func(**payload), robust=True)
+        return None
+
+    job = Job(task=func.task_name, payload=payload, key=key, max_attempts=func.max_attempts)
+    if delay:
+        job.run_after = timezone.now() + delay
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        if not key:
+            raise
+        return None
+    return job
+
+
+def _worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.current_thread().name}"
+
+
+def claim(limit=1, visibility=None):
+    """Lock up to ``limit`` due jobs for this worker and return them."""
+    now = timezone.now()
+    visibility = timedelta(seconds=visibility or settings.JOBS_VISIBILITY_TIMEOUT)
+    token = f"{_worker_name()}:{uuid.uuid4().hex[:8]}"
+    with transaction.atomic():
+        # A worker died during the last attempt; do not hand the job out again.
+        Job.objects.filter(status=Job.RUNNING, locked_until__lt=now, attempts__gte=F("max_attempts")).update(
+            status=Job.FAILED, finished_at=now, locked_until=None, last_error="Visibility timeout expired."
+        )
+        due = Q(status=Job.QUEUED, run_after__lte=now) | Q(status=Job.RUNNING, locked_until__lt=now)
+        jobs = list(Job.objects.select_for_update(skip_locked=True).filter(due).order_by("run_after", "id")[:limit])
+        if not jobs:
+            return []
+        Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+            status=Job.RUNNING, attempts=F("attempts") + 1, locked_by=token, locked_until=now + visibility
+        )
+    for job in jobs:
+        job.status = Job.RUNNING
+        job.attempts += 1
+        job.locked_by = token
+    return jobs
+
+
+def run(job):
+    """Run a claimed job and record the outcome; return whether it succeeded."""
+    func = _tasks.get(job.task)
+    try:
+        if func is None:
+            raise LookupError(f"Unknown task {job.task!r}.")
+        func(**job.payload)
+    except Exception:
+        logger.exception("Job %s (%s) failed on attempt %d", job.pk, job.task, job.attempts)
+        _record_failure(job, traceback.format_exc())
+        return False
+
+    # Filtering on the claim token leaves a job alone if its timeout ran
+    # out and another worker claimed it meanwhile.
+    Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+        status=Job.DONE, finished_at=timezone.now(), locked_until=None, last_error=""
+    )
+    return True
+
+
+def _record_failure(job, error):
+    now = timezone.now()
+    if job.attempts >= job.max_attempts:
+        changes = {"status": Job.FAILED, "finished_at": now}
+    else:
+        changes = {"status": Job.QUEUED, "run_after": now + RETRY_BACKOFF * 2 ** (job.attempts - 1)}
+    Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(locked_until=None, last_error=error, **changes)
+
+
+def cancel(funcs, field, values):
+    """Drop the queued jobs of ``funcs`` whose payload ``field`` is one of ``values``; return how many.
+
+    Jobs already running are left to finish.
+    """
+    deleted, _ = Job.objects.filter(
+        status=Job.QUEUED, task__in=[func.task_name for func in funcs], **{f"payload__{field}__in": list(values)}
+    ).delete()
+    return deleted
+
+
+def retry(queryset):
+    """Queue failed jobs again with a fresh set of attempts."""
+    return queryset.filter(status=Job.FAILED).update(
+        status=Job.QUEUED, attempts=0, run_after=timezone.now(), finished_at=None
+    )
+
+
+def work(threads=1, poll=1.0, visibility=None, burst=False, stop=None):
+    """Run jobs on ``threads`` threads until ``stop`` is set; return how many ran.
+
+    With ``burst`` each thread exits as soon as it finds no job due.
+    """
+    stop = stop or threading.Event()
+    counts = []
+
+    def loop():
+        ran = 0
+        try:
+            while not stop.is_set():
+                close_old_connections()
+                jobs = claim(visibility=visibility)
+                if not jobs:
+                    if burst:
+                        break
+                    stop.wait(poll)
+                    continue
+                for job in jobs:
+                    run(job)
+                    ran += 1
+        finally:
+            counts.append(ran)
+            connections.close_all()
+
+    pool = [threading.Thread(target=loop, name=f"jobs-{index}") for index in range(threads)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return sum(counts)
+
+
+def serve(threads=1, poll=1.0, visibility=None, burst=False):
+    """:func:`work` until SIGTERM or SIGINT; jobs already running are finished first."""
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *args: stop.set())
+    return work(threads, poll, visibility, burst, stop)
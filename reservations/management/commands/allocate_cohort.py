@@ -0,0 +1,42 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reservations import allocation, bulk
+
+
+class Command(BaseCommand):
+    help = "Place a cohort of students in free beds across all hostels from a CSV or JSONL file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help=f"File with columns: {', '.join(allocation.COHORT_FIELDS)}.")
+        parser.add_argument("--format", choices=bulk.FORMATS, help="Default: from the file extension, else csv.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--report", help="Write where each student went, or why not, to this CSV file.")
+        parser.add_argument("--dry-run", action="store_true", help="Allocate and report without writing anything.")
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or bulk.detect_format(options["path"])
+        started = time.perf_counter()
+        try:
+            with open(options["path"], "rb") as source:
+                records = bulk.read_records(bulk.text_stream(source), fmt)
+                result = allocation.allocate(records, options["dry_run"], options["batch_size"])
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - started
+
+        if options["report"]:
+            with open(options["report"], "w", newline="") as report:
+                writer = csv.DictWriter(report, fieldnames=allocation.REPORT_COLUMNS)
+                writer.writeheader()
+                writer.writerows(result.rows)
+
+        phases = ", ".join(f"{phase} {seconds:.1f}s" for phase, seconds in result.timings.items())
+        prefix = "Dry run" if options["dry_run"] else "Allocated"
+        self.stdout.write(f"{prefix}: {result} in {elapsed:.1f}s ({phases})")
+        for status, count in sorted(result.statuses.items()):
+            self.stdout.write(f"  {status}: {count}")
+        for choice, count in sorted(result.choices.items()):
+            self.stdout.write(f"  {choice}: {count}")
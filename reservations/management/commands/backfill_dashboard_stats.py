@@ -0,0 +1,35 @@
+from itertools import chain
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from reservations import stats
+from reservations.models import ArchivedBooking, Booking, DailyHostelStats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily per-hostel dashboard counters from existing bookings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        keys = ["hostel_id", "room_id", "check_in", "check_out", "guests", "created_at", "is_paid", "price_per_night"]
+        # Archived bookings still count on the days they were made and stayed.
+        rows = chain.from_iterable(
+            model.objects.values_list(*keys[:-1], "room__price_per_night").iterator(chunk_size=options["chunk_size"])
+            for model in (ArchivedBooking, Booking)
+        )
+        snapshots = (dict(zip(keys, row)) for row in rows)
+        deltas = stats.booking_deltas(snapshots)
+
+        rows = [
+            DailyHostelStats(hostel_id=hostel_id, day=day, **counters)
+            for (hostel_id, day), counters in deltas.items()
+        ]
+        with transaction.atomic():
+            DailyHostelStats.objects.all().delete()
+            DailyHostelStats.objects.bulk_create(rows, batch_size=1000)
+            stats.bump()
+
+        self.stdout.write(f"Wrote {len(rows)} daily counter row(s).")
@@ -0,0 +1,83 @@
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from reservations import benchmarking, occupancy
+from reservations.models import Booking, Hostel
+
+
+class Command(BaseCommand):
+    help = "Seed bookings up to a target volume and time the booking admin and bookings list."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--bookings", type=int, default=100_000, help="Seed until at least this many bookings exist.")
+        parser.add_argument("--hostels", type=int, default=200)
+        parser.add_argument("--rooms-per-hostel", type=int, default=10)
+        parser.add_argument("--users", type=int, default=5000)
+        parser.add_argument("--runs", type=int, default=5, help="Requests per page; the median is reported.")
+        parser.add_argument("--budget-ms", type=float, default=100.0)
+        parser.add_argument(
+            "--skip-aggregates",
+            action="store_true",
+            help="Do not rebuild occupancy counters and dashboard rollups after seeding.",
+        )
+
+    def handle(self, *args, **options):
+        missing = options["bookings"] - Booking.objects.count()
+        if missing > 0:
+            self.stdout.write(f"Seeding {missing} bookings...")
+            benchmarking.seed(
+                hostels=options["hostels"],
+                rooms_per_hostel=options["rooms_per_hostel"],
+                users=options["users"],
+                bookings=missing,
+                stdout=self.stdout,
+            )
+            if not options["skip_aggregates"]:
+                occupancy.rebuild()
+                call_command("backfill_dashboard_stats", stdout=self.stdout)
+
+        User = get_user_model()
+        admin_user, _ = User.objects.get_or_create(
+            username="benchmark-admin", defaults={"is_staff": True, "is_superuser": True}
+        )
+        client = Client(HTTP_HOST=benchmarking.client_host())
+        client.force_login(admin_user)
+
+        changelist = reverse("admin:reservations_booking_changelist")
+        year = timezone.localdate().year
+        hostel = Hostel.objects.order_by("id").first()
+        urls = [
+            changelist,
+            f"{changelist}?p=50",
+            f"{changelist}?created_at__year={year}",
+            f"{changelist}?created_at__year={year}&created_at__month=1",
+            f"{changelist}?is_paid__exact=0",
+        ]
+        if hostel:
+            urls.append(f"{changelist}?hostel__id__exact={hostel.id}")
+
+        sample = Booking.objects.filter(user__isnull=False).order_by("-created_at").values_list("user_id", flat=True).first()
+        if sample:
+            client_user = Client(HTTP_HOST=benchmarking.client_host())
+            client_user.force_login(User.objects.get(pk=sample))
+        else:
+            client_user = None
+
+        self.stdout.write(f"{Booking.objects.count()} bookings; budget {options['budget_ms']:.0f} ms")
+        results = [benchmarking.time_request(client, url, options["runs"]) for url in urls]
+        if client_user:
+            results.append(benchmarking.time_request(client_user, reverse("bookings_list"), options["runs"]))
+
+        for result in results:
+            within = result["median_ms"] <= options["budget_ms"] and result["status"] == 200
+            style = self.style.SUCCESS if within else self.style.ERROR
+            self.stdout.write(
+                style(
+                    f"{result['median_ms']:8.1f} ms  (max {result['max_ms']:.1f})  "
+                    f"{result['queries']:3d} queries  {result['status']}  {result['url']}"
+                )
+            )
@@ -0,0 +1,39 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from reservations import allocation, benchmarking
+from reservations.models import Room
+
+
+class Command(BaseCommand):
+    help = "Allocate a generated cohort against the current rooms and time it, then roll the bookings back."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--students", type=int, default=20_000)
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--budget-s", type=float, default=10.0, help="Flag a write run slower than this.")
+
+    def handle(self, *args, **options):
+        if not Room.objects.exists():
+            raise CommandError("No rooms; run seed_benchmark_data first.")
+        records = list(benchmarking.generate_cohort(options["students"], random.Random(options["seed"])))
+
+        for dry_run in (True, False):
+            started = time.perf_counter()
+            with transaction.atomic():
+                result = allocation.allocate(records, dry_run=dry_run)
+                elapsed = time.perf_counter() - started
+                transaction.set_rollback(True)
+            phases = ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in result.timings.items())
+            label = "dry run" if dry_run else "write"
+            line = f"{label:8s} {elapsed:6.2f}s  ({phases})  {result}"
+            over = not dry_run and elapsed > options["budget_s"]
+            self.stdout.write(self.style.ERROR(line) if over else line)
+
+        for status, count in sorted(result.statuses.items()):
+            self.stdout.write(f"  {status}: {count}")
+        for choice, count in sorted(result.choices.items()):
+            self.stdout.write(f"  {choice}: {count}")
@@ -0,0 +1,83 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from reservations import benchmarking
+from reservations.models import Booking, Hostel
+
+# Gunicorn also reads ./gunicorn.conf.py, so both get the same preload and
+# warm-up; the worker class is given explicitly.
+SERVERS = {
+    "wsgi": ["hostels.wsgi:application", "--worker-class", "gthread"],
+    "asgi": ["hostels.asgi:application", "--worker-class", "uvicorn_worker.UvicornWorker"],
+}
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f"Server on port {port} did not start within {timeout}s.")
+
+
+class Command(BaseCommand):
+    help = "Compare requests/sec and p99 latency of the WSGI and ASGI deployments under gunicorn."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--mode", choices=sorted(SERVERS), action="append", dest="modes")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Gunicorn workers per server.")
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--concurrency", type=int, default=32)
+        parser.add_argument("--port", type=int, default=8701, help="First port to bind; each mode uses the next one.")
+
+    def handle(self, *args, **options):
+        hostel = Hostel.objects.order_by("id").first()
+        if hostel is None:
+            raise CommandError("No hostels to request; run benchmark_admin or seed some data first.")
+
+        # Sessions live in the shared database, so one login works for both servers.
+        sample = Booking.objects.filter(user__isnull=False).values_list("user_id", flat=True).first()
+        User = get_user_model()
+        user = User.objects.get(pk=sample) if sample else User.objects.get_or_create(username="benchmark-asgi")[0]
+        client = Client()
+        client.force_login(user)
+        cookie = client.cookies[settings.SESSION_COOKIE_NAME].value
+        headers = {"Host": benchmarking.client_host(), "Cookie": f"{settings.SESSION_COOKIE_NAME}={cookie}"}
+        paths = [reverse("home"), reverse("hostel_detail", args=[hostel.id]), reverse("bookings_list")]
+
+        for offset, mode in enumerate(options["modes"] or sorted(SERVERS, reverse=True)):
+            port = options["port"] + offset
+            command = [
+                sys.executable, "-m", "gunicorn", *SERVERS[mode],
+                "--workers", str(options["workers"]),
+                "--bind", f"127.0.0.1:{port}",
+                "--log-level", "warning",
+            ]
+            server = subprocess.Popen(command, cwd=settings.BASE_DIR)
+            try:
+                wait_for_port(port)
+                # Warm up caches and connections before measuring.
+                benchmarking.http_load("127.0.0.1", port, paths, len(paths) * options["workers"], 4, headers)
+                result = benchmarking.http_load(
+                    "127.0.0.1", port, paths, options["requests"], options["concurrency"], headers
+                )
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+            self.stdout.write(
+                f"{mode}: {result['requests_per_sec']:8.1f} req/s  p50 {result['p50_ms']:6.1f} ms  "
+                f"p99 {result['p99_ms']:6.1f} ms  errors {result['errors']}"
+            )
@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from reservations import benchmarking
+
+PASSWORD = "bench-password"
+SESSION_BACKENDS = ["db", "cached_db", "cache", "signed_cookies"]
+BACKENDS = {
+    False: "django.contrib.auth.backends.ModelBackend",
+    True: "reservations.auth.CachedModelBackend",
+}
+AUTH_TABLES = ("django_session", "auth_user")
+
+
+def auth_queries(captured):
+    return sum(1 for query in captured if any(table in query["sql"] for table in AUTH_TABLES))
+
+
+class Command(BaseCommand):
+    help = "Compare session backends, user caching and password hash cost for authenticated requests and logins."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=50, help="Requests per configuration.")
+        parser.add_argument("--login-runs", type=int, default=10, help="Logins per hash setting.")
+        parser.add_argument("--url", help="Authenticated page to request (default: the bookings list).")
+
+    def handle(self, *args, **options):
+        user = benchmarking.benchmark_user(password=PASSWORD)
+        host = benchmarking.client_host()
+        url = options["url"] or reverse("bookings_list")
+
+        self.stdout.write(f"Authenticated GET {url}, {options['runs']} runs each:")
+        for session_backend in SESSION_BACKENDS:
+            for cached in (False, True):
+                with override_settings(
+                    SESSION_ENGINE=f"django.contrib.sessions.backends.{session_backend}",
+                    AUTHENTICATION_BACKENDS=[BACKENDS[cached]],
+                ):
+                    client = Client(HTTP_HOST=host)
+                    client.force_login(user)
+                    client.get(url)
+                    with CaptureQueriesContext(connection) as captured:
+                        client.get(url)
+                    # Read now: every request resets the connection's query log.
+                    overhead, total = auth_queries(captured), len(captured)
+                    result = benchmarking.measure(lambda _: client.get(url), options["runs"])
+                label = f"{session_backend} sessions, {'cached' if cached else 'queried'} user"
+                self.stdout.write(
+                    f"  {label:<40} {result['median_ms']:7.2f} ms  "
+                    f"{overhead} session/user queries of {total}  {result['statuses']}"
+                )
+
+        self.stdout.write(f"Login POST, {options['login_runs']} runs each:")
+        login = reverse("login")
+        for iterations in sorted({settings.PASSWORD_HASH_ITERATIONS, PBKDF2PasswordHasher.iterations}):
+            with override_settings(PASSWORD_HASH_ITERATIONS=iterations):
+                result = benchmarking.measure(
+                    lambda _: Client(HTTP_HOST=host).post(login, {"username": user.username, "password": PASSWORD}),
+                    options["login_runs"],
+                )
+            self.stdout.write(
+                f"  {iterations:>9,} PBKDF2 rounds  {result['median_ms']:7.1f} ms  "
+                f"~{1000 / result['median_ms']:.1f} logins/s per core  {result['statuses']}"
+            )
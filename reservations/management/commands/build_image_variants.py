@@ -0,0 +1,33 @@
+from functools import partial
+
+from django.core.management.base import BaseCommand
+
+from reservations import images
+from reservations.models import Hostel, Room
+from reservations.parallel import process_pool
+
+
+class Command(BaseCommand):
+    help = "Generate resized WebP/JPEG variants for hostel and room images."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, help="Resizer processes (default: CPU count).")
+        parser.add_argument("--force", action="store_true", help="Rebuild variants that already exist.")
+
+    def handle(self, *args, **options):
+        names = set()
+        for model in (Hostel, Room):
+            names.update(model.objects.exclude(image="").exclude(image__isnull=True).values_list("image", flat=True))
+        if not options["force"]:
+            names = {name for name in names if not images.has_variants(name)}
+        if not names:
+            self.stdout.write("All images already have variants.")
+            return
+
+        self.stdout.write(f"Building variants for {len(names)} image(s)...")
+        build = partial(images.build_variants, force=options["force"])
+        written = 0
+        with process_pool(options["workers"]) as pool:
+            for count in pool.map(build, sorted(names)):
+                written += count
+        self.stdout.write(f"Wrote {written} variant file(s).")
@@ -0,0 +1,65 @@
+import os
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from reservations import conditional, media
+from reservations.models import Hostel, Room
+from reservations.storage import is_immutable, is_private
+
+
+class Command(BaseCommand):
+    help = "Rename uploads to content-hashed names, build image variants and precompress media for serving."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, help="Image resizer processes (default: CPU count).")
+        parser.add_argument("--skip-variants", action="store_true", help="Do not build image variants.")
+        parser.add_argument("--keep-originals", action="store_true", help="Keep uploads after renaming them.")
+
+    def handle(self, *args, **options):
+        renamed = self.hash_uploads(options["keep_originals"])
+        self.stdout.write(f"Renamed {renamed} upload(s) to content-hashed names.")
+
+        if not options["skip_variants"]:
+            call_command("build_image_variants", workers=options["workers"], stdout=self.stdout)
+
+        written = 0
+        for root, _, files in os.walk(settings.MEDIA_ROOT):
+            if is_private(os.path.relpath(root, settings.MEDIA_ROOT).replace(os.sep, "/") + "/"):
+                continue
+            for filename in files:
+                if not filename.endswith((".gz", ".br")):
+                    written += media.precompress(os.path.join(root, filename))
+        self.stdout.write(f"Wrote {written} precompressed file(s).")
+
+    def hash_uploads(self, keep_originals):
+        new_names = {}
+        hostel_ids = set()
+        sources = [
+            (Hostel, Hostel.objects.exclude(image="").exclude(image__isnull=True).values_list("id", "id", "image")),
+            (Room, Room.objects.exclude(image="").exclude(image__isnull=True).values_list("id", "hostel_id", "image")),
+        ]
+        for model, rows in sources:
+            for pk, hostel_id, name in rows:
+                if is_immutable(name):
+                    continue
+                if name not in new_names:
+                    if not default_storage.exists(name):
+                        self.stderr.write(f"Missing file for {model.__name__} {pk}: {name}")
+                        continue
+                    with default_storage.open(name) as source:
+                        new_names[name] = default_storage.save(name, File(source))
+                # update() skips the save signals; the hostels are touched below
+                # and variants are built afterwards.
+                model.objects.filter(pk=pk).update(image=new_names[name])
+                hostel_ids.add(hostel_id)
+
+        if not keep_originals:
+            for name in new_names:
+                default_storage.delete(name)
+        if hostel_ids:
+            conditional.touch(hostel_ids)
+        return len(new_names)
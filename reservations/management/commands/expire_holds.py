@@ -0,0 +1,38 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from reservations import holds
+
+
+class Command(BaseCommand):
+    help = "Delete unpaid bookings whose hold has expired and release their beds."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Bookings deleted per transaction.")
+        parser.add_argument("--limit", type=int, help="Stop after expiring this many bookings.")
+        parser.add_argument(
+            "--every", type=float, help="Keep running and sweep again after this many seconds, until stopped."
+        )
+
+    def handle(self, *args, **options):
+        on_batch = self.report_batch if options["verbosity"] > 1 else None
+
+        if options["every"] is None:
+            result = holds.expire(options["batch_size"], options["limit"], on_batch=on_batch)
+            self.stdout.write(f"Holds: {result}.")
+            return
+
+        stop = threading.Event()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *args: stop.set())
+        while not stop.is_set():
+            result = holds.expire(options["batch_size"], options["limit"], on_batch=on_batch)
+            if result.expired or options["verbosity"] > 1:
+                self.stdout.write(f"Holds: {result}.")
+            stop.wait(options["every"])
+        self.stdout.write("Stopped.")
+
+    def report_batch(self, count, seconds):
+        self.stdout.write(f"  {count} expired in {seconds * 1000:.0f} ms ({count / seconds:,.0f} rows/s)")
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from reservations import fragments
+
+
+class Command(BaseCommand):
+    help = "Show hit/miss counts for the cached hostel page fragments from a shared cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Zero the counters after printing them.")
+
+    def handle(self, *args, **options):
+        if not fragments.shared_stats():
+            raise CommandError(
+                "The counters live in each web process's own cache (CACHE_BACKEND=locmem). "
+                "Read hostels_fragment_cache_hits_total and hostels_fragment_cache_misses_total "
+                "from /metrics/ with PROFILING=1, or use CACHE_BACKEND=file."
+            )
+        counts = fragments.stats()
+        self.stdout.write(
+            f"hits={counts['hits']} misses={counts['misses']} hit_rate={counts['hit_rate']:.1%}"
+        )
+        if options["reset"]:
+            fragments.reset_stats()
+            self.stdout.write("Counters reset.")
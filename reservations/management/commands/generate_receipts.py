@@ -0,0 +1,93 @@
+import heapq
+import os
+import zipfile
+from datetime import date, datetime, time
+from operator import attrgetter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from reservations import receipts
+from reservations.parallel import chunked, process_pool
+from reservations.models import ArchivedBooking, Booking
+from reservations.storage import receipt_storage
+
+
+def parse_month(value):
+    try:
+        return datetime.strptime(value, "%Y-%m").date()
+    except ValueError:
+        raise CommandError(f"Invalid month {value!r}; expected YYYY-MM.")
+
+
+class Command(BaseCommand):
+    help = "Render missing PDF receipts in parallel and optionally zip a month of receipts, archived stays included."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--month", type=parse_month, help="Only bookings paid in this month (YYYY-MM).")
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Renderer processes.")
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument("--force", action="store_true", help="Re-render receipts that are already stored.")
+        parser.add_argument("--zip", dest="zip_path", help="Write the month's receipts to this zip file.")
+
+    def handle(self, *args, **options):
+        if options["zip_path"] and not options["month"]:
+            raise CommandError("--zip requires --month.")
+
+        querysets = [
+            model.objects.filter(is_paid=True, paid_at__isnull=False).select_related("hostel", "room").with_totals()
+            for model in (Booking, ArchivedBooking)
+        ]
+        if options["month"]:
+            tz = timezone.get_current_timezone()
+            first = options["month"]
+            following = date(first.year + first.month // 12, first.month % 12 + 1, 1)
+            querysets = [
+                bookings.filter(
+                    paid_at__gte=datetime.combine(first, time(), tz),
+                    paid_at__lt=datetime.combine(following, time(), tz),
+                )
+                for bookings in querysets
+            ]
+
+        pending = querysets if options["force"] else [bookings.filter(receipt_pdf="") for bookings in querysets]
+        rendered = self.render(pending, options["workers"], options["chunk_size"])
+        self.stdout.write(f"Rendered {rendered} receipt(s).")
+
+        if options["zip_path"]:
+            written = self.write_zip(querysets, options["zip_path"])
+            self.stdout.write(f"Wrote {written} receipt(s) to {options['zip_path']}.")
+
+    def render(self, querysets, workers, chunk_size):
+        # Workers only render and store files; the parent writes the names back.
+        rendered = 0
+        with process_pool(workers) as pool:
+            for bookings in querysets:
+                for chunk in chunked(bookings.iterator(chunk_size=chunk_size), chunk_size):
+                    data = [receipts.receipt_data(booking) for booking in chunk]
+                    stored = [
+                        bookings.model(id=booking_id, receipt_pdf=name)
+                        for booking_id, name in pool.map(receipts.render_and_store, data, chunksize=16)
+                    ]
+                    bookings.model.objects.bulk_update(stored, ["receipt_pdf"])
+                    rendered += len(stored)
+                    self.stdout.write(f"  {rendered} rendered")
+        return rendered
+
+    def write_zip(self, querysets, path):
+        # Live and archived bookings are merged by payment time.
+        bookings = heapq.merge(
+            *(queryset.order_by("paid_at", "id").iterator() for queryset in querysets), key=attrgetter("paid_at", "id")
+        )
+        storage = receipt_storage()
+        written = 0
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for booking in bookings:
+                name = booking.receipt_pdf.name
+                if name and not storage.exists(name):
+                    self.stderr.write(f"Receipt file {name} of booking {booking.id} is missing; rendering it again.")
+                name = receipts.ensure_receipt(booking)
+                with storage.open(name) as source:
+                    archive.writestr(f"{booking.receipt_number or booking.id}.pdf", source.read())
+                written += 1
+        return written
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from reservations import bulk
+
+
+class Command(BaseCommand):
+    help = "Create or update hostels (and their amenities) from a CSV or JSONL file."
+    importer = staticmethod(bulk.import_hostels)
+    columns = bulk.HOSTEL_FIELDS
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help=f"File with columns: {', '.join(self.columns)}.")
+        parser.add_argument("--format", choices=bulk.FORMATS, help="Default: from the file extension, else csv.")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or bulk.detect_format(options["path"])
+        try:
+            with open(options["path"], "rb") as source:
+                result = self.importer(bulk.read_records(bulk.text_stream(source), fmt), options["batch_size"])
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+
+        for line_number, message in result.errors:
+            self.stderr.write(f"line {line_number}: {message}")
+        self.stdout.write(str(result))
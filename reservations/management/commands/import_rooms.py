@@ -0,0 +1,9 @@
+from reservations import bulk
+
+from .import_hostels import Command as ImportHostelsCommand
+
+
+class Command(ImportHostelsCommand):
+    help = "Create or update rooms of existing hostels from a CSV or JSONL file."
+    importer = staticmethod(bulk.import_rooms)
+    columns = bulk.ROOM_FIELDS
@@ -0,0 +1,88 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from reservations.availability import peak_occupancy
+from reservations.benchmarking import client_host
+from reservations.models import Booking, Hostel, Room
+
+
+class Command(BaseCommand):
+    help = "Fire concurrent bookings at a single room and report throughput and oversells."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200, help="Total booking POSTs to send.")
+        parser.add_argument("--concurrency", type=int, default=50, help="Number of client threads.")
+        parser.add_argument("--beds", type=int, default=10, help="Beds in the load-test room.")
+        parser.add_argument("--nights", type=int, default=3, help="Length of each booked stay.")
+        parser.add_argument("--keep", action="store_true", help="Keep the generated hostel, room and bookings.")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        user, created = User.objects.get_or_create(username="loadtest", defaults={"email": "loadtest@example.com"})
+        hostel = Hostel.objects.create(name="Load test hostel", city="Benchmark", address="-")
+        room = Room.objects.create(hostel=hostel, name="Load test room", beds=options["beds"], price_per_night=10)
+
+        check_in = timezone.localdate() + timedelta(days=30)
+        check_out = check_in + timedelta(days=options["nights"])
+        url = reverse("book_hostel", args=[hostel.id])
+        payload = {
+            "guest_name": "Load Test",
+            "guest_email": "loadtest@example.com",
+            "check_in": check_in.isoformat(),
+            "check_out": check_out.isoformat(),
+            "guests": 1,
+            "room": room.id,
+        }
+
+        seed = Client(HTTP_HOST=client_host())
+        seed.force_login(user)
+        statuses = {}
+        lock = threading.Lock()
+        remaining = iter(range(options["requests"]))
+
+        def worker():
+            client = Client(HTTP_HOST=client_host(), raise_request_exception=False)
+            client.cookies = seed.cookies
+            try:
+                while True:
+                    with lock:
+                        if next(remaining, None) is None:
+                            return
+                    status = client.post(url, payload).status_code
+                    with lock:
+                        statuses[status] = statuses.get(status, 0) + 1
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(options["concurrency"])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        intervals = room.bookings.values_list("check_in", "check_out", "guests")
+        booked = Booking.objects.filter(room=room).count()
+        oversell = max(peak_occupancy(intervals, check_in, check_out) - room.beds, 0)
+
+        self.stdout.write(f"Requests:   {options['requests']} ({options['concurrency']} threads)")
+        self.stdout.write(f"Elapsed:    {elapsed:.2f}s")
+        self.stdout.write(f"Throughput: {options['requests'] / elapsed:.1f} req/s")
+        self.stdout.write(f"Statuses:   {dict(sorted(statuses.items()))}")
+        self.stdout.write(f"Booked:     {booked} of {room.beds} beds")
+        style = self.style.SUCCESS if oversell == 0 else self.style.ERROR
+        self.stdout.write(style(f"Oversold:   {oversell}"))
+
+        if not options["keep"]:
+            hostel.delete()
+            if created:
+                user.delete()
@@ -0,0 +1,61 @@
+import os
+import time
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from reservations import archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the coming years' booking partitions (PostgreSQL) and, with --keep-years, "
+        "move older years into the archive with a gzipped JSONL copy."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ahead",
+            type=int,
+            default=settings.BOOKING_PARTITION_YEARS_AHEAD,
+            help="Years after the current one that should have a partition.",
+        )
+        parser.add_argument(
+            "--keep-years",
+            type=int,
+            help="Keep the current year and this many before it; archive earlier check-ins. Archives nothing if unset.",
+        )
+        parser.add_argument("--output-dir", default=settings.BOOKING_ARCHIVE_DIR, help="Where the dumps go.")
+        parser.add_argument("--dry-run", action="store_true", help="List the years that would be archived.")
+
+    def handle(self, *args, **options):
+        created = archive.ensure_partitions(options["ahead"])
+        if created:
+            self.stdout.write(f"Created partitions for {', '.join(map(str, created))}.")
+        elif archive.partitioned():
+            self.stdout.write(f"Partitions exist for {', '.join(map(str, archive.partition_years()))}.")
+        else:
+            self.stdout.write("Bookings are not partitioned on this database; archiving moves rows instead.")
+
+        if options["keep_years"] is None:
+            return
+        if options["keep_years"] < 1:
+            raise CommandError("--keep-years must be at least 1, so stays in progress are never archived.")
+
+        before = date.today().year - options["keep_years"]
+        years = archive.years_to_archive(before)
+        if not years:
+            self.stdout.write(f"No bookings before {before} to archive.")
+            return
+        for year in years:
+            path = archive.dump_path(year, options["output_dir"])
+            if options["dry_run"]:
+                self.stdout.write(f"Would archive {year} to {path}.")
+                continue
+            started = time.perf_counter()
+            moved = archive.archive_year(year, options["output_dir"])
+            self.stdout.write(
+                f"Archived {year}: {moved:,} booking(s) to {path} "
+                f"({os.path.getsize(path) / 1e6:.1f} MB) in {time.perf_counter() - started:.1f} s."
+            )
@@ -0,0 +1,17 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+from reservations import occupancy
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-night room occupancy counters from bookings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--room", type=int, action="append", dest="rooms", help="Only rebuild this room id.")
+        parser.add_argument("--since", type=date.fromisoformat, help="First night to keep (default: today).")
+
+    def handle(self, *args, **options):
+        count = occupancy.rebuild(room_ids=options["rooms"], since=options["since"])
+        self.stdout.write(f"Rebuilt occupancy for {count} room(s).")
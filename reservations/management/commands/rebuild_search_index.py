@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from reservations import search
+from reservations.models import SearchDocument
+
+
+class Command(BaseCommand):
+    help = "Rewrite the full-text search documents of hostels and bookings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--kind", choices=[search.HOSTEL, search.BOOKING], help="Only rebuild this kind.")
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument(
+            "--if-empty", action="store_true", help="Do nothing when the index has documents (for deploy scripts)."
+        )
+
+    def handle(self, *args, **options):
+        if options["if_empty"] and SearchDocument.objects.exists():
+            self.stdout.write("Search index already built.")
+            return
+        count = search.rebuild(kind=options["kind"], batch_size=options["batch_size"])
+        self.stdout.write(f"Indexed {count} search document(s).")
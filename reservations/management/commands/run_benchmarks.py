@@ -0,0 +1,191 @@
+import json
+import sys
+from datetime import timedelta
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from reservations import benchmarking, receipts
+from reservations.models import Booking, Hostel, Room
+
+PASSWORD = "bench-password"
+
+
+class Command(BaseCommand):
+    help = (
+        "Time login, home, hostel_detail, book_hostel, payment and receipt against the current database "
+        "and write JSON results that can be compared between commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=20)
+        parser.add_argument("--warmup", type=int, default=2)
+        parser.add_argument("--output", help="Write the JSON results to this file (default: stdout).")
+        parser.add_argument("--compare", help="Earlier results file; report regressions against it.")
+        parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before flagging, as a fraction.")
+        parser.add_argument(
+            "--http",
+            metavar="HOST:PORT",
+            help="Also drive a running server (e.g. gunicorn) with the threaded load generator.",
+        )
+        parser.add_argument("--http-requests", type=int, default=1000)
+        parser.add_argument("--concurrency", type=int, default=16)
+
+    def handle(self, *args, **options):
+        hostel = Hostel.objects.filter(rooms__isnull=False).order_by("id").first()
+        if hostel is None:
+            raise CommandError("No hostels with rooms; run seed_benchmark_data first.")
+
+        user = benchmarking.benchmark_user(password=PASSWORD)
+        host = benchmarking.client_host()
+        client = Client(HTTP_HOST=host)
+        client.force_login(user)
+
+        results = {
+            "meta": {
+                "revision": benchmarking.git_revision(),
+                "timestamp": timezone.now().isoformat(),
+                "python": sys.version.split()[0],
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "bookings": Booking.objects.count(),
+                "hostels": Hostel.objects.count(),
+                "runs": options["runs"],
+            },
+            "scenarios": {},
+        }
+
+        # Bookings made by the run go to their own hostel and are removed afterwards.
+        scratch = Hostel.objects.create(name="Benchmark run", city="Benchmark", address="-")
+        room = Room.objects.create(hostel=scratch, name="Benchmark dorm", beds=5000, price_per_night=5000)
+        check_in = timezone.localdate() + timedelta(days=400)
+        booking_data = {
+            "guest_name": "Bench User",
+            "guest_email": user.email,
+            "check_in": check_in.isoformat(),
+            "check_out": (check_in + timedelta(days=3)).isoformat(),
+            "guests": 1,
+            "room": room.id,
+        }
+
+        def new_booking(paid=False):
+            booking = Booking.objects.create(
+                user=user, hostel=scratch, room=room, guest_name="Bench User", guest_email=user.email,
+                check_in=check_in, check_out=check_in + timedelta(days=3), guests=1,
+            )
+            if paid:
+                booking.mark_paid()
+            return booking
+
+        def login(_):
+            return Client(HTTP_HOST=host).post(reverse("login"), {"username": user.username, "password": PASSWORD})
+
+        def revalidate(url):
+            # Fetch the current ETag outside the timed section, then time the conditional GET.
+            return (
+                lambda etag: client.get(url, HTTP_IF_NONE_MATCH=etag),
+                lambda: client.get(url).get("ETag", ""),
+            )
+
+        # Downloads time serving a stored receipt, not rendering one.
+        receipt = new_booking(paid=True)
+        receipts.ensure_receipt(Booking.objects.select_related("hostel", "room").with_totals().get(pk=receipt.pk))
+        receipt_url = reverse("booking_receipt", args=[receipt.id])
+        response = client.get(receipt_url)
+        if response.status_code != 200 or response["Content-Type"] != "application/pdf":
+            raise CommandError(f"Receipt download returned {response.status_code} {response['Content-Type']}.")
+
+        scenarios = {
+            "login": (login, None),
+            "home": (lambda _: client.get(reverse("home")), None),
+            "home_304": revalidate(reverse("home")),
+            "hostel_detail": (lambda _: client.get(reverse("hostel_detail", args=[hostel.id])), None),
+            "hostel_detail_304": revalidate(reverse("hostel_detail", args=[hostel.id])),
+            "book_hostel": (lambda _: client.post(reverse("book_hostel", args=[scratch.id]), booking_data), None),
+            "payment": (
+                lambda booking: client.post(
+                    reverse("booking_payment", args=[booking.id]), {"method": "card", "confirm": "on"}
+                ),
+                new_booking,
+            ),
+            "receipt": (lambda _: client.get(receipt_url), None),
+        }
+
+        try:
+            for name, (request, prepare) in scenarios.items():
+                result = benchmarking.measure(request, options["runs"], options["warmup"], prepare)
+                results["scenarios"][name] = result
+                self.stderr.write(
+                    f"{name:18s} {result['median_ms']:8.1f} ms  p95 {result['p95_ms']:7.1f}  "
+                    f"{result['queries']:5.1f} queries  {result['peak_kib']:8.1f} KiB  {result['statuses']}"
+                )
+
+            if options["http"]:
+                results["http"] = self.drive_http(options, client, hostel, receipt)
+        finally:
+            # Deleting through the ORM keeps occupancy and dashboard counters in step.
+            for booking in Booking.objects.filter(hostel=scratch):
+                booking.delete()
+            scratch.delete()
+
+        payload = json.dumps(results, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                output.write(payload + "\n")
+        else:
+            self.stdout.write(payload)
+
+        if options["compare"]:
+            self.compare(options["compare"], results, options["tolerance"])
+
+    def drive_http(self, options, client, hostel, receipt):
+        address, _, port = options["http"].rpartition(":")
+        if not address or not port.isdigit():
+            raise CommandError("--http expects HOST:PORT.")
+        cookie = client.cookies[settings.SESSION_COOKIE_NAME].value
+        headers = {"Host": benchmarking.client_host(), "Cookie": f"{settings.SESSION_COOKIE_NAME}={cookie}"}
+        paths = [
+            reverse("home"),
+            reverse("hostel_detail", args=[hostel.id]),
+            reverse("bookings_list"),
+            reverse("booking_receipt", args=[receipt.id]),
+        ]
+        result = benchmarking.http_load(
+            address, int(port), paths, options["http_requests"], options["concurrency"], headers
+        )
+        self.stderr.write(
+            f"http           {result['requests_per_sec']:8.1f} req/s  p50 {result['p50_ms']:.1f} ms  "
+            f"p99 {result['p99_ms']:.1f} ms  errors {result['errors']}"
+        )
+        return result
+
+    def compare(self, path, results, tolerance):
+        with open(path) as source:
+            baseline = json.load(source)
+
+        regressions = []
+        for name, current in results["scenarios"].items():
+            before = baseline.get("scenarios", {}).get(name)
+            if not before:
+                continue
+            slower = current["median_ms"] > before["median_ms"] * (1 + tolerance)
+            more_queries = current["queries"] > before["queries"]
+            more_memory = current["peak_kib"] > before["peak_kib"] * (1 + tolerance)
+            line = (
+                f"{name:14s} {before['median_ms']:8.1f} -> {current['median_ms']:8.1f} ms  "
+                f"{before['queries']:5.1f} -> {current['queries']:5.1f} queries  "
+                f"{before['peak_kib']:8.1f} -> {current['peak_kib']:8.1f} KiB"
+            )
+            if slower or more_queries or more_memory:
+                regressions.append(name)
+                self.stderr.write(self.style.ERROR(line))
+            else:
+                self.stderr.write(self.style.SUCCESS(line))
+
+        if regressions:
+            raise CommandError(f"Regressed against {baseline['meta'].get('revision') or path}: {', '.join(regressions)}")
@@ -0,0 +1,44 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand
+
+from reservations import jobs
+from reservations.parallel import serve_jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (receipts, emails, image variants) until stopped."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=1, help="Worker processes.")
+        parser.add_argument("--threads", type=int, default=4, help="Threads per process.")
+        parser.add_argument("--poll", type=float, default=1.0, help="Seconds to wait when no job is due.")
+        parser.add_argument(
+            "--visibility", type=int, help="Seconds before a claimed job is handed out again (default: settings)."
+        )
+        parser.add_argument("--burst", action="store_true", help="Exit once no job is due.")
+
+    def handle(self, *args, **options):
+        args = (options["threads"], options["poll"], options["visibility"], options["burst"])
+        self.stdout.write(f"Running jobs on {options['processes']} process(es) x {options['threads']} thread(s).")
+        if options["processes"] <= 1:
+            ran = jobs.serve(*args)
+            self.stdout.write(f"Stopped after {ran} job(s).")
+            return
+
+        context = multiprocessing.get_context("spawn")
+        children = [context.Process(target=serve_jobs, args=args) for _ in range(options["processes"])]
+        for child in children:
+            child.start()
+
+        def forward(signum, frame):
+            for child in children:
+                if child.is_alive():
+                    child.terminate()
+
+        signal.signal(signal.SIGTERM, forward)
+        signal.signal(signal.SIGINT, forward)
+        for child in children:
+            child.join()
+        self.stdout.write("Stopped.")
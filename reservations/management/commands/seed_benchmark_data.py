@@ -0,0 +1,44 @@
+from datetime import date
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from reservations import benchmarking, occupancy
+
+
+class Command(BaseCommand):
+    help = "Generate a reproducible benchmark data set of hostels, rooms, amenities, users and bookings."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hostels", type=int, default=50)
+        parser.add_argument("--rooms-per-hostel", type=int, default=10)
+        parser.add_argument("--users", type=int, default=500)
+        parser.add_argument("--bookings", type=int, default=10_000)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=1, help="Random seed; the same seed gives the same data.")
+        parser.add_argument("--start", type=date.fromisoformat, help="Earliest arrival (default: two years ago).")
+        parser.add_argument("--paid-share", type=float, default=0.7, help="Fraction of bookings already paid.")
+        parser.add_argument(
+            "--skip-aggregates",
+            action="store_true",
+            help="Do not rebuild occupancy counters, dashboard rollups and the booking search index afterwards.",
+        )
+
+    def handle(self, *args, **options):
+        written = benchmarking.seed(
+            hostels=options["hostels"],
+            rooms_per_hostel=options["rooms_per_hostel"],
+            users=options["users"],
+            bookings=options["bookings"],
+            batch_size=options["batch_size"],
+            seed=options["seed"],
+            start=options["start"],
+            paid_share=options["paid_share"],
+            stdout=self.stdout,
+        )
+        self.stdout.write(f"Wrote {written} bookings.")
+        if not options["skip_aggregates"]:
+            rooms = occupancy.rebuild()
+            self.stdout.write(f"Rebuilt occupancy for {rooms} room(s).")
+            call_command("backfill_dashboard_stats", stdout=self.stdout)
+            call_command("rebuild_search_index", kind="booking", stdout=self.stdout)
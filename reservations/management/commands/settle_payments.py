@@ -0,0 +1,42 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reservations import bulk, settlement
+
+
+class Command(BaseCommand):
+    help = "Mark bookings paid from a file of bank transfers or cash deposits and report mismatches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSONL with reference, amount and optional paid_at columns.")
+        parser.add_argument("--format", choices=bulk.FORMATS, help="Default: from the file extension, else csv.")
+        parser.add_argument("--batch-size", type=int, default=2000)
+        parser.add_argument("--report", help="Write mismatched payments to this CSV file.")
+        parser.add_argument("--dry-run", action="store_true", help="Match and report without writing anything.")
+
+    def handle(self, *args, **options):
+        fmt = options["format"] or bulk.detect_format(options["path"])
+        started = time.perf_counter()
+        try:
+            with open(options["path"], "rb") as source:
+                records = bulk.read_records(bulk.text_stream(source), fmt)
+                result = settlement.settle(records, options["batch_size"], options["dry_run"])
+        except (OSError, ValueError) as exc:
+            raise CommandError(str(exc))
+        elapsed = time.perf_counter() - started
+
+        if options["report"]:
+            with open(options["report"], "w", newline="") as report:
+                writer = csv.DictWriter(report, fieldnames=settlement.REPORT_COLUMNS)
+                writer.writeheader()
+                writer.writerows(result.mismatches)
+
+        reasons = {}
+        for mismatch in result.mismatches:
+            reasons[mismatch["reason"]] = reasons.get(mismatch["reason"], 0) + 1
+        prefix = "Would settle" if options["dry_run"] else "Settled"
+        self.stdout.write(f"{prefix}: {result} in {elapsed:.1f}s")
+        for reason, count in sorted(reasons.items()):
+            self.stdout.write(f"  {reason}: {count}")
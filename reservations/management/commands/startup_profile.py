@@ -0,0 +1,178 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from reservations import benchmarking
+from reservations.models import Hostel
+
+MODES = {"cold": [], "warm": ["--warm-up"]}
+# Differences smaller than this are noise for a single cold start.
+NOISE_MS = 10.0
+
+
+def import_times(stderr):
+    """Self time in ms per top-level package, from ``python -X importtime`` output."""
+    totals = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        if own.strip().isdigit():
+            totals[name.strip().split(".")[0]] += int(own) / 1000
+    return totals
+
+
+def median_of(runs):
+    return {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+
+
+class Command(BaseCommand):
+    help = (
+        "Start fresh interpreters and time Django setup, warm-up and the first requests, without and with "
+        "the gunicorn warm-up (see hostels/startup.py); write JSON results that can be compared between commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=3, help="Processes per mode; medians are reported.")
+        parser.add_argument("--path", action="append", dest="paths", help="Request this path (repeatable).")
+        parser.add_argument("--top", type=int, default=10, help="Packages to list by import time.")
+        parser.add_argument("--output", help="Write the JSON results to this file (default: stdout).")
+        parser.add_argument("--compare", help="Earlier results file; report regressions against it.")
+        parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed slowdown before flagging, as a fraction.")
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or self.default_paths()
+        env = {**os.environ, "STARTUP_PROFILE_SESSION": self.session()}
+        results = {
+            "meta": {
+                "revision": benchmarking.git_revision(),
+                "timestamp": timezone.now().isoformat(),
+                "python": sys.version.split()[0],
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "runs": options["runs"],
+            },
+        }
+        for mode, flags in MODES.items():
+            results[mode] = self.profile(flags, paths, env, options["runs"])
+        self.report(results, paths, options["top"])
+
+        payload = json.dumps(results, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                output.write(payload + "\n")
+        else:
+            self.stdout.write(payload)
+
+        if options["compare"]:
+            self.compare(options["compare"], results, options["tolerance"])
+
+    def default_paths(self):
+        paths = [reverse("home"), reverse("hostel_search"), reverse("bookings_list"), reverse("staff_reports")]
+        hostel = Hostel.objects.order_by("id").first()
+        if hostel is not None:
+            paths.insert(1, reverse("hostel_detail", args=[hostel.id]))
+        return paths + [reverse("admin:index"), reverse("admin:reservations_booking_changelist")]
+
+    def session(self):
+        """A session cookie for a staff user, so staff pages are measured rather than redirected."""
+        user, _ = get_user_model().objects.get_or_create(
+            username="benchmark-admin", defaults={"is_staff": True, "is_superuser": True}
+        )
+        client = Client()
+        client.force_login(user)
+        return client.cookies[settings.SESSION_COOKIE_NAME].value
+
+    def profile(self, flags, paths, env, runs):
+        command = [sys.executable, "-X", "importtime", "-m", "hostels.startup", *flags, benchmarking.client_host(), *paths]
+        samples = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            child = subprocess.run(command, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+            elapsed = (time.perf_counter() - started) * 1000
+            if child.returncode:
+                raise CommandError(f"Startup probe failed:\n{child.stderr[-2000:]}")
+            samples.append((elapsed, json.loads(child.stdout), import_times(child.stderr)))
+
+        imports = defaultdict(list)
+        for _, _, packages in samples:
+            for package, ms in packages.items():
+                imports[package].append(ms)
+        return {
+            "process_ms": statistics.median(elapsed for elapsed, _, _ in samples),
+            "steps_ms": {
+                step: seconds * 1000 for step, seconds in median_of([data["steps"] for _, data, _ in samples]).items()
+            },
+            "requests": {
+                path: {
+                    "status": samples[-1][1]["requests"][path]["status"],
+                    "first_ms": statistics.median(data["requests"][path]["first"] * 1000 for _, data, _ in samples),
+                    "second_ms": statistics.median(data["requests"][path]["second"] * 1000 for _, data, _ in samples),
+                }
+                for path in paths
+            },
+            "imports_ms": {
+                package: statistics.median(times + [0.0] * (runs - len(times)))
+                for package, times in sorted(imports.items(), key=lambda item: -sum(item[1]))
+            },
+        }
+
+    def report(self, results, paths, top):
+        cold, warm = results["cold"], results["warm"]
+        self.stderr.write(f"{'':44s} {'cold':>9s} {'warm':>9s}   median of {results['meta']['runs']} process(es)")
+        self.stderr.write(f"{'process (start to exit)':44s} {cold['process_ms']:9.1f} {warm['process_ms']:9.1f}")
+        for step in warm["steps_ms"]:
+            before = cold["steps_ms"].get(step)
+            self.stderr.write(
+                f"{step:44s} {'-' if before is None else f'{before:.1f}':>9s} {warm['steps_ms'][step]:9.1f}"
+            )
+        for path in paths:
+            first, second = cold["requests"][path], warm["requests"][path]
+            self.stderr.write(
+                f"GET {path[:40]:40s} {first['first_ms']:9.1f} {second['first_ms']:9.1f}   "
+                f"then {second['second_ms']:.1f} ms  [{second['status']}]"
+            )
+        self.stderr.write("Import time by package (self, cold):")
+        for package, ms in list(cold["imports_ms"].items())[:top]:
+            self.stderr.write(f"  {package:30s} {ms:8.1f} ms")
+
+    def compare(self, path, results, tolerance):
+        with open(path) as source:
+            baseline = json.load(source)
+
+        def flatten(result):
+            values = {"process": result["process_ms"], **result["steps_ms"]}
+            values.update({f"GET {url}": request["first_ms"] for url, request in result["requests"].items()})
+            return values
+
+        regressions = []
+        for mode in MODES:
+            if mode not in baseline:
+                continue
+            before_values = flatten(baseline[mode])
+            for name, current in flatten(results[mode]).items():
+                before = before_values.get(name)
+                if before is None:
+                    continue
+                line = f"{mode:5s} {name[:40]:40s} {before:8.1f} -> {current:8.1f} ms"
+                if current > before * (1 + tolerance) and current - before > NOISE_MS:
+                    regressions.append(f"{mode} {name}")
+                    self.stderr.write(self.style.ERROR(line))
+                else:
+                    self.stderr.write(self.style.SUCCESS(line))
+
+        if regressions:
+            raise CommandError(f"Regressed against {baseline['meta'].get('revision') or path}: {', '.join(regressions)}")
@@ -0,0 +1,186 @@
+"""Serving uploaded media with long-lived caching.
+
+Files with immutable names (see ``reservations.storage``) are sent with
+``Cache-Control: public, max-age=31536000, immutable``. Other files are
+revalidated after ``MEDIA_MAX_AGE`` seconds. Private paths such as
+``receipts/`` are never served from here.
+
+``MEDIA_OFFLOAD`` controls who sends the file bytes:
+
+* ``""``: Django sends the file. It picks a ``.br``/``.gz`` sibling made
+  by ``collectmedia`` when the client accepts that encoding, and answers
+  single byte-range requests.
+* ``"x-accel"``: Django returns only headers plus ``X-Accel-Redirect:
+  MEDIA_OFFLOAD_PREFIX/<path>`` and nginx sends the file. Give that prefix
+  an ``internal`` location aliased to ``MEDIA_ROOT``, with ``gzip_static``
+  (and ``brotli_static``) on.
+* ``"x-sendfile"``: Django returns headers plus ``X-Sendfile: <absolute
+  path>`` for Apache mod_xsendfile or lighttpd.
+"""
+
+import gzip
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date
+
+from .storage import is_immutable, is_private
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip siblings are still written and served.
+    brotli = None
+
+IMMUTABLE_MAX_AGE = 31536000
+# Images and archives are already compressed; PDFs from reportlab and text
+# formats are not.
+COMPRESSIBLE = {".pdf", ".svg", ".txt", ".csv", ".json", ".xml", ".html", ".css", ".js"}
+# Keep a compressed sibling only when it saves at least this share of the bytes.
+MIN_SAVING = 0.05
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _compressors():
+    yield ".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield ".br", lambda data: brotli.compress(data, quality=11)
+
+
+def precompress(path):
+    """Write ``.gz`` (and ``.br``) siblings of ``path`` where they pay off; return how many were written."""
+    if os.path.splitext(path)[1].lower() not in COMPRESSIBLE:
+        return 0
+    mtime = os.path.getmtime(path)
+    data = None
+    written = 0
+    for suffix, compress in _compressors():
+        target = path + suffix
+        if os.path.exists(target) and os.path.getmtime(target) >= mtime:
+            continue
+        if data is None:
+            with open(path, "rb") as source:
+                data = source.read()
+        compressed = compress(data)
+        if len(compressed) <= len(data) * (1 - MIN_SAVING):
+            with open(target, "wb") as output:
+                output.write(compressed)
+            written += 1
+        elif os.path.exists(target):
+            os.remove(target)
+    return written
+
+
+def _pick_encoding(request, fullpath):
+    accepted = {
+        token.split(";")[0].strip().lower() for token in request.headers.get("Accept-Encoding", "").split(",")
+    }
+    for encoding, suffix in ENCODINGS:
+        if encoding in accepted and os.path.exists(fullpath + suffix):
+            return encoding, fullpath + suffix
+    return None, fullpath
+
+
+def _byte_range(request, size, etag):
+    """``(start, end)`` of a satisfiable single range, ``None`` for the whole file, or ``False``."""
+    header = request.headers.get("Range")
+    if not header:
+        return None
+    if_range = request.headers.get("If-Range")
+    if if_range and if_range != etag:
+        return None
+    match = RANGE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        # Multiple or malformed ranges: send the whole file.
+        return None
+    first, last = match.groups()
+    if first:
+        start, end = int(first), min(int(last) if last else size - 1, size - 1)
+    else:
+        start, end = max(size - int(last), 0), size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _cache_headers(response, path, etag, mtime):
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(mtime)
+    response["Accept-Ranges"] = "bytes"
+    if is_immutable(path):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=settings.MEDIA_MAX_AGE)
+    return response
+
+
+def _offload(path, fullpath, content_type):
+    response = HttpResponse(content_type=content_type)
+    if settings.MEDIA_OFFLOAD == "x-accel":
+        response["X-Accel-Redirect"] = settings.MEDIA_OFFLOAD_PREFIX.rstrip("/") + "/" + path
+    else:
+        response["X-Sendfile"] = fullpath
+    return response
+
+
+def serve_media(request, path):
+    if is_private(path):
+        raise Http404
+    try:
+        fullpath = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(fullpath):
+        raise Http404
+
+    content_type = mimetypes.guess_type(fullpath)[0] or "application/octet-stream"
+    if settings.MEDIA_OFFLOAD:
+        stat = os.stat(fullpath)
+        etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+        return _cache_headers(_offload(path, fullpath, content_type), path, etag, stat.st_mtime)
+
+    encoding, filepath = _pick_encoding(request, fullpath)
+    stat = os.stat(filepath)
+    etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}{"-" + encoding if encoding else ""}"'
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is not None:
+        patch_vary_headers(response, ["Accept-Encoding"])
+        return _cache_headers(response, path, etag, stat.st_mtime)
+
+    byte_range = _byte_range(request, stat.st_size, etag) if encoding is None else None
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{stat.st_size}"
+        return _cache_headers(response, path, etag, stat.st_mtime)
+
+    source = open(filepath, "rb")
+    if byte_range is None:
+        response = FileResponse(source, content_type=content_type)
+    else:
+        start, end = byte_range
+        source.seek(start)
+        response = StreamingHttpResponse(
+            _read_range(source, end - start + 1), content_type=content_type, status=206
+        )
+        response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+        response["Content-Length"] = str(end - start + 1)
+    if encoding:
+        response["Content-Encoding"] = encoding
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return _cache_headers(response, path, etag, stat.st_mtime)
+
+
+def _read_range(source, length, block_size=64 * 1024):
+    with source:
+        while length > 0:
+            block = source.read(min(block_size, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
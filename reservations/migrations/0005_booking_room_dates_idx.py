@@ -0,0 +1,14 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("reservations", "0004_booking_user"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="booking",
+            index=models.Index(fields=["room", "check_in", "check_out"], name="booking_room_dates_idx"),
+        ),
+    ]
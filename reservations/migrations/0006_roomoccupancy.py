@@ -0,0 +1,59 @@
+from array import array
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def build_occupancy(apps, schema_editor):
+    Booking = apps.get_model("reservations", "Booking")
+    Room = apps.get_model("reservations", "Room")
+    RoomOccupancy = apps.get_model("reservations", "RoomOccupancy")
+    db = schema_editor.connection.alias
+
+    today = timezone.localdate()
+    counts = {room_id: array("H") for room_id in Room.objects.using(db).values_list("id", flat=True)}
+    stays = (
+        Booking.objects.using(db)
+        .filter(check_out__gt=today)
+        .values_list("room_id", "check_in", "check_out", "guests")
+    )
+    for room_id, check_in, check_out, guests in stays.iterator():
+        nights = counts[room_id]
+        end = (check_out - today).days
+        if end > len(nights):
+            nights.extend(array("H", bytes(2 * (end - len(nights)))))
+        for night in range(max((check_in - today).days, 0), end):
+            nights[night] += guests
+
+    RoomOccupancy.objects.using(db).bulk_create(
+        [RoomOccupancy(room_id=room_id, start=today, counts=nights.tobytes()) for room_id, nights in counts.items()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("reservations", "0005_booking_room_dates_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RoomOccupancy",
+            fields=[
+                (
+                    "room",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="occupancy",
+                        serialize=False,
+                        to="reservations.room",
+                    ),
+                ),
+                ("start", models.DateField()),
+                ("counts", models.BinaryField(default=bytes)),
+            ],
+        ),
+        migrations.RunPython(build_occupancy, migrations.RunPython.noop),
+    ]
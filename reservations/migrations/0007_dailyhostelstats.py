@@ -0,0 +1,62 @@
+from collections import defaultdict
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_stats(apps, schema_editor):
+    Booking = apps.get_model("reservations", "Booking")
+    DailyHostelStats = apps.get_model("reservations", "DailyHostelStats")
+    db = schema_editor.connection.alias
+
+    counters = defaultdict(lambda: defaultdict(int))
+    bookings = Booking.objects.using(db).values_list(
+        "hostel_id", "check_in", "check_out", "guests", "created_at", "is_paid", "room__price_per_night"
+    )
+    for hostel_id, check_in, check_out, guests, created_at, is_paid, price in bookings.iterator():
+        nights = (check_out - check_in).days
+        made = counters[hostel_id, timezone.localdate(created_at)]
+        made["bookings"] += 1
+        made["nights"] += nights
+        if not is_paid:
+            made["unpaid_count"] += 1
+            made["unpaid_amount"] += nights * price
+        for offset in range(nights):
+            counters[hostel_id, check_in + timedelta(days=offset)]["occupied_beds"] += guests
+
+    DailyHostelStats.objects.using(db).bulk_create(
+        [
+            DailyHostelStats(hostel_id=hostel_id, day=day, **changes)
+            for (hostel_id, day), changes in counters.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0006_roomoccupancy'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyHostelStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('bookings', models.IntegerField(default=0)),
+                ('nights', models.IntegerField(default=0)),
+                ('unpaid_count', models.IntegerField(default=0)),
+                ('unpaid_amount', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('occupied_beds', models.IntegerField(default=0)),
+                ('hostel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='reservations.hostel')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'hostel'), name='dailystats_day_hostel_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0008_booking_created_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='receipt_pdf',
+            field=models.FileField(blank=True, upload_to='receipts/'),
+        ),
+    ]
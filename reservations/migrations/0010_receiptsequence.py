@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def seed_sequence(apps, schema_editor):
+    # Existing receipts are numbered after their booking id, so start above it.
+    Booking = apps.get_model("reservations", "Booking")
+    ReceiptSequence = apps.get_model("reservations", "ReceiptSequence")
+    db = schema_editor.connection.alias
+    highest = Booking.objects.using(db).aggregate(highest=Max("id"))["highest"] or 0
+    ReceiptSequence.objects.using(db).create(name="receipt", next_value=highest + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0009_booking_receipt_pdf'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReceiptSequence',
+            fields=[
+                ('name', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('next_value', models.BigIntegerField(default=1)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(condition=models.Q(('receipt_number', ''), _negated=True), fields=('receipt_number',), name='booking_receipt_number_uniq'),
+        ),
+        migrations.RunPython(seed_sequence, migrations.RunPython.noop),
+    ]
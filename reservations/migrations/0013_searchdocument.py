@@ -0,0 +1,92 @@
+from django.db import migrations, models
+
+POSTGRESQL_INDEX = [
+    """
+    ALTER TABLE reservations_searchdocument ADD COLUMN document tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', body), 'B')
+    ) STORED
+    """,
+    # One index per kind, so hostel searches never walk booking entries.
+    "CREATE INDEX searchdocument_hostel_gin ON reservations_searchdocument USING GIN (document) WHERE kind = 'hostel'",
+    "CREATE INDEX searchdocument_booking_gin ON reservations_searchdocument USING GIN (document) WHERE kind = 'booking'",
+]
+POSTGRESQL_DROP = [
+    "DROP INDEX IF EXISTS searchdocument_booking_gin",
+    "DROP INDEX IF EXISTS searchdocument_hostel_gin",
+    "ALTER TABLE reservations_searchdocument DROP COLUMN IF EXISTS document",
+]
+# An external-content FTS5 table: it stores only the index and reads the
+# text from reservations_searchdocument, which the triggers mirror into it.
+SQLITE_INDEX = [
+    """
+    CREATE VIRTUAL TABLE reservations_searchdocument_fts USING fts5(
+        kind, title, body,
+        content='reservations_searchdocument', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER reservations_searchdocument_ai AFTER INSERT ON reservations_searchdocument BEGIN
+        INSERT INTO reservations_searchdocument_fts(rowid, kind, title, body)
+        VALUES (new.id, new.kind, new.title, new.body);
+    END
+    """,
+    """
+    CREATE TRIGGER reservations_searchdocument_ad AFTER DELETE ON reservations_searchdocument BEGIN
+        INSERT INTO reservations_searchdocument_fts(reservations_searchdocument_fts, rowid, kind, title, body)
+        VALUES ('delete', old.id, old.kind, old.title, old.body);
+    END
+    """,
+    """
+    CREATE TRIGGER reservations_searchdocument_au AFTER UPDATE ON reservations_searchdocument BEGIN
+        INSERT INTO reservations_searchdocument_fts(reservations_searchdocument_fts, rowid, kind, title, body)
+        VALUES ('delete', old.id, old.kind, old.title, old.body);
+        INSERT INTO reservations_searchdocument_fts(rowid, kind, title, body)
+        VALUES (new.id, new.kind, new.title, new.body);
+    END
+    """,
+]
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS reservations_searchdocument_au",
+    "DROP TRIGGER IF EXISTS reservations_searchdocument_ad",
+    "DROP TRIGGER IF EXISTS reservations_searchdocument_ai",
+    "DROP TABLE IF EXISTS reservations_searchdocument_fts",
+]
+
+
+def _run(schema_editor, statements):
+    # Other databases fall back to substring matching in reservations.search.
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def create_index(apps, schema_editor):
+    _run(schema_editor, {"postgresql": POSTGRESQL_INDEX, "sqlite": SQLITE_INDEX})
+
+
+def drop_index(apps, schema_editor):
+    _run(schema_editor, {"postgresql": POSTGRESQL_DROP, "sqlite": SQLITE_DROP})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0012_booking_hold_expires_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('hostel', 'Hostel'), ('booking', 'Booking')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('title', models.TextField(blank=True)),
+                ('body', models.TextField(blank=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='searchdocument_kind_object_uniq')],
+            },
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
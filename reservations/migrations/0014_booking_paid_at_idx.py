@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0013_searchdocument'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(condition=models.Q(('is_paid', True)), fields=['paid_at', 'id'], name='booking_paid_at_idx'),
+        ),
+    ]
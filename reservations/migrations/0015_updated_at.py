@@ -0,0 +1,26 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0014_booking_paid_at_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='amenity',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='hostel',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
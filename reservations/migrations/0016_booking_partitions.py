@@ -0,0 +1,127 @@
+"""Partition reservations_booking by check-in year on PostgreSQL.
+
+The table is rebuilt as ``PARTITION BY RANGE (check_in)``, with one
+partition per year and a default partition for dates outside them.
+``manage.py manage_booking_partitions`` adds later years and archives old
+ones into ArchivedBooking (see reservations.archive). Other databases keep
+a plain table and archive by moving rows.
+
+Unique indexes on a partitioned table must include the partition column.
+The primary key becomes ``(id, check_in)``, and receipt numbers are unique
+per check-in date. Both stay unique across the table in practice: ids come
+from one sequence shared by all partitions, and receipt numbers from
+ReceiptSequence.
+"""
+
+import datetime
+
+import django.db.models.deletion
+import django.db.models.functions.datetime
+from django.conf import settings
+from django.db import migrations, models
+
+TABLE = "reservations_booking"
+SEQUENCE = f"{TABLE}_id_seq"
+# Later years are added by manage_booking_partitions.
+YEARS_AHEAD = 2
+
+
+def _rebuild(apps, schema_editor, partitioned):
+    """Copy the bookings into a new partitioned (or plain) table and restore its keys and indexes."""
+    Booking = apps.get_model("reservations", "Booking")
+    execute = schema_editor.execute
+    old = f"{TABLE}_old"
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"SELECT MIN(check_in) FROM {TABLE}")
+        first = cursor.fetchone()[0]
+
+    execute(f"ALTER TABLE {TABLE} RENAME TO {old}")
+    if partitioned:
+        execute(f"CREATE TABLE {TABLE} (LIKE {old} INCLUDING CONSTRAINTS) PARTITION BY RANGE (check_in)")
+        this_year = datetime.date.today().year
+        for year in range(min(first.year if first else this_year, this_year), this_year + YEARS_AHEAD + 1):
+            execute(
+                f"CREATE TABLE {TABLE}_y{year} PARTITION OF {TABLE} "
+                f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+            )
+        execute(f"CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT")
+    else:
+        execute(f"CREATE TABLE {TABLE} (LIKE {old} INCLUDING CONSTRAINTS)")
+    execute(f"INSERT INTO {TABLE} SELECT * FROM {old}")
+    # Drops the old table's id sequence and indexes, so the names are free again.
+    execute(f"DROP TABLE {old}")
+
+    # Archived ids are never handed out again.
+    next_id = (
+        f"GREATEST((SELECT MAX(id) FROM {TABLE}), (SELECT MAX(id) FROM reservations_archivedbooking), 0) + 1"
+    )
+    if partitioned:
+        # Identity columns on partitioned tables need PostgreSQL 17; a sequence works everywhere.
+        execute(f"CREATE SEQUENCE {SEQUENCE} AS bigint OWNED BY {TABLE}.id")
+        execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')")
+        execute(f"SELECT setval('{SEQUENCE}', {next_id}, false)")
+        execute(f"ALTER TABLE {TABLE} ADD PRIMARY KEY (id, check_in)")
+        execute(
+            f"CREATE UNIQUE INDEX booking_receipt_number_uniq ON {TABLE} (receipt_number, check_in) "
+            "WHERE receipt_number <> ''"
+        )
+    else:
+        execute(f"ALTER TABLE {TABLE} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY")
+        execute(f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), {next_id}, false)")
+        execute(f"ALTER TABLE {TABLE} ADD PRIMARY KEY (id)")
+        for constraint in Booking._meta.constraints:
+            execute(constraint.create_sql(Booking, schema_editor))
+
+    for name in ("user", "hostel", "room"):
+        field = Booking._meta.get_field(name)
+        execute(schema_editor._create_index_sql(Booking, fields=[field]))
+        execute(schema_editor._create_fk_sql(Booking, field, "_fk_%(to_table)s_%(to_column)s"))
+    for index in Booking._meta.indexes:
+        execute(index.create_sql(Booking, schema_editor))
+
+
+def partition(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        _rebuild(apps, schema_editor, partitioned=True)
+
+
+def unpartition(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        _rebuild(apps, schema_editor, partitioned=False)
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0015_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBooking',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('guest_name', models.CharField(max_length=120)),
+                ('guest_email', models.EmailField(max_length=254)),
+                ('check_in', models.DateField()),
+                ('check_out', models.DateField()),
+                ('guests', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField()),
+                ('is_paid', models.BooleanField(default=False)),
+                ('paid_at', models.DateTimeField(blank=True, null=True)),
+                ('amount_paid', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('receipt_number', models.CharField(blank=True, max_length=32)),
+                ('receipt_pdf', models.FileField(blank=True, upload_to='receipts/')),
+                ('archived_at', models.DateTimeField(db_default=django.db.models.functions.datetime.Now())),
+                ('hostel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to='reservations.hostel')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to='reservations.room')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_bookings', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'created_at', 'id'], name='archived_user_created_idx'), models.Index(fields=['check_in'], name='archived_check_in_idx'), models.Index(condition=models.Q(('is_paid', True)), fields=['paid_at', 'id'], name='archived_paid_at_idx')],
+            },
+        ),
+        migrations.RunPython(partition, unpartition),
+    ]
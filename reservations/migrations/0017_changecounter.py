@@ -0,0 +1,18 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0016_booking_partitions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeCounter',
+            fields=[
+                ('name', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+    ]
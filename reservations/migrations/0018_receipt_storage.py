@@ -0,0 +1,22 @@
+import reservations.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reservations', '0017_changecounter'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='archivedbooking',
+            name='receipt_pdf',
+            field=models.FileField(blank=True, storage=reservations.storage.receipt_storage, upload_to='receipts/'),
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='receipt_pdf',
+            field=models.FileField(blank=True, storage=reservations.storage.receipt_storage, upload_to='receipts/'),
+        ),
+    ]
@@ -1,11 +1,19 @@
+from datetime import timedelta
+
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import Now, TruncMonth
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 
+from .storage import receipt_storage
+
 
 class Amenity(models.Model):
     name = models.CharField(max_length=100, unique=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -18,6 +26,8 @@ class Hostel(models.Model):
     description = models.TextField(blank=True)
     image = models.ImageField(upload_to="hostels/", blank=True, null=True)
     amenities = models.ManyToManyField(Amenity, blank=True, related_name="hostels")
+    # Also moved when the hostel's rooms or amenities change; see reservations.conditional.
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"{self.name} ({self.city})"
@@ -30,11 +40,88 @@ class Room(models.Model):
     price_per_night = models.DecimalField(max_digits=8, decimal_places=2)
     is_private = models.BooleanField(default=False)
     image = models.ImageField(upload_to="rooms/", blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.hostel.name} - {self.name}"
 
 
+class DaysBetween(models.Func):
+    """Whole days from the second date expression to the first."""
+
+    arg_joiner = " - "
+    template = "(%(expressions)s)"
+    output_field = models.IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(
+            compiler,
+            connection,
+            template="CAST(julianday(%(expressions)s) AS integer)",
+            arg_joiner=") - julianday(",
+            **extra_context,
+        )
+
+
+def booking_nights():
+    return DaysBetween("check_out", "check_in")
+
+
+def booking_total():
+    return ExpressionWrapper(
+        booking_nights() * F("room__price_per_night"),
+        output_field=models.DecimalField(max_digits=14, decimal_places=2),
+    )
+
+
+class BookingQuerySet(models.QuerySet):
+    def staying(self, start, end=None):
+        """Bookings with at least one night from ``start`` up to ``end``, or open-ended without ``end``.
+
+        No stay is longer than ``BOOKING_MAX_NIGHTS``, so the check-in date
+        is bounded on both sides. PostgreSQL then reads only the partitions
+        of the years involved (see ``reservations.archive``).
+        """
+        earliest = start - timedelta(days=settings.BOOKING_MAX_NIGHTS)
+        queryset = self.filter(check_in__gt=earliest, check_out__gt=start)
+        return queryset if end is None else queryset.filter(check_in__lt=end)
+
+    def with_totals(self):
+        """Annotate ``nights`` and ``total_price`` so rows need no Python work or room lookup."""
+        return self.annotate(nights=booking_nights(), total_price=booking_total())
+
+    def revenue_by_month(self):
+        """Paid revenue and outstanding balance per hostel and check-in month, in one query."""
+        return (
+            self.annotate(month=TruncMonth("check_in"))
+            .values("hostel_id", "hostel__name", "month")
+            .annotate(
+                bookings=Count("id"),
+                nights=Sum(booking_nights()),
+                revenue=Sum("amount_paid", filter=Q(is_paid=True), default=0),
+                outstanding=Sum(booking_total(), filter=Q(is_paid=False), default=0),
+            )
+            .order_by("month", "hostel__name")
+        )
+
+
+class annotatable_property:
+    """A read-only property that a queryset annotation of the same name overrides.
+
+    It has no ``__set__``, so a value Django stores on the instance wins
+    over the Python fallback.
+    """
+
+    def __init__(self, func):
+        self.func = func
+        self.__doc__ = func.__doc__
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        return self.func(instance)
+
+
 class Booking(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -55,22 +142,279 @@ class Booking(models.Model):
     paid_at = models.DateTimeField(blank=True, null=True)
     amount_paid = models.DecimalField(max_digits=8, decimal_places=2, blank=True, null=True)
     receipt_number = models.CharField(max_length=32, blank=True)
+    receipt_pdf = models.FileField(upload_to="receipts/", storage=receipt_storage, blank=True)
+    # Unpaid bookings with a hold are released once it passes; see reservations.holds.
+    hold_expires_at = models.DateTimeField(blank=True, null=True)
+
+    objects = BookingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["room", "check_in", "check_out"], name="booking_room_dates_idx"),
+            models.Index(fields=["user", "created_at", "id"], name="booking_user_created_idx"),
+            models.Index(fields=["created_at", "id"], name="booking_created_idx"),
+            # The hold sweeper's range scan. Only unpaid bookings are indexed, and
+            # the condition (not a leading is_paid column) lets SQLite use it for
+            # ``NOT is_paid``.
+            models.Index(fields=["hold_expires_at"], condition=Q(is_paid=False), name="booking_hold_expiry_idx"),
+            # The payments export reads paid bookings in payment order from here.
+            models.Index(fields=["paid_at", "id"], condition=Q(is_paid=True), name="booking_paid_at_idx"),
+        ]
+        constraints = [
+            # Also the lookup index for settling payments by receipt number.
+            models.UniqueConstraint(
+                fields=["receipt_number"], condition=~Q(receipt_number=""), name="booking_receipt_number_uniq"
+            ),
+        ]
 
     def __str__(self):
         return f"{self.guest_name} - {self.hostel.name} ({self.check_in} to {self.check_out})"
 
+    def clean(self):
+        if self.check_in and self.check_out and (self.check_out - self.check_in).days > settings.BOOKING_MAX_NIGHTS:
+            raise ValidationError(f"Bookings are limited to {settings.BOOKING_MAX_NIGHTS} nights.")
+
+    @property
+    def reference(self):
+        """What guests quote on bank transfers and cash deposits."""
+        return f"BK-{self.id:06d}"
+
     @property
+    def hold_expired(self):
+        return not self.is_paid and self.hold_expires_at is not None and self.hold_expires_at <= timezone.now()
+
+    @annotatable_property
     def nights(self):
         return (self.check_out - self.check_in).days
 
-    @property
+    @annotatable_property
     def total_price(self):
         return self.nights * self.room.price_per_night
 
     def mark_paid(self):
+        was_paid = self.is_paid
         self.is_paid = True
         self.paid_at = timezone.now()
         self.amount_paid = self.total_price
+        self.hold_expires_at = None
         if not self.receipt_number:
-            self.receipt_number = f"RCPT-{self.id:06d}"
-        self.save(update_fields=["is_paid", "paid_at", "amount_paid", "receipt_number"])
+            self.receipt_number = ReceiptSequence.allocate(1)[0]
+        # The stored PDF shows the payment time, so render a fresh one on next download.
+        self.receipt_pdf = ""
+        self.save(
+            update_fields=["is_paid", "paid_at", "amount_paid", "hold_expires_at", "receipt_number", "receipt_pdf"]
+        )
+
+        if not was_paid:
+            from . import stats
+
+            stats.record_payment(self)
+
+
+class ArchivedBooking(models.Model):
+    """A booking of a past year, moved out of ``Booking`` by ``reservations.archive``.
+
+    Rows keep their booking id, so references and receipt links stay valid.
+    Archived bookings are read-only: they are listed under the guest's
+    earlier stays, counted in reports and revenue, and their receipts can
+    still be downloaded.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="archived_bookings",
+        null=True,
+        blank=True,
+    )
+    hostel = models.ForeignKey(Hostel, on_delete=models.CASCADE, related_name="archived_bookings")
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="archived_bookings")
+    guest_name = models.CharField(max_length=120)
+    guest_email = models.EmailField()
+    check_in = models.DateField()
+    check_out = models.DateField()
+    guests = models.PositiveIntegerField()
+    created_at = models.DateTimeField()
+    is_paid = models.BooleanField(default=False)
+    paid_at = models.DateTimeField(blank=True, null=True)
+    amount_paid = models.DecimalField(max_digits=8, decimal_places=2, blank=True, null=True)
+    receipt_number = models.CharField(max_length=32, blank=True)
+    receipt_pdf = models.FileField(upload_to="receipts/", storage=receipt_storage, blank=True)
+    archived_at = models.DateTimeField(db_default=Now())
+
+    objects = BookingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["user", "created_at", "id"], name="archived_user_created_idx"),
+            models.Index(fields=["check_in"], name="archived_check_in_idx"),
+            models.Index(fields=["paid_at", "id"], condition=Q(is_paid=True), name="archived_paid_at_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.guest_name} - {self.hostel.name} ({self.check_in} to {self.check_out}, archived)"
+
+    @property
+    def reference(self):
+        return f"BK-{self.id:06d}"
+
+    @annotatable_property
+    def nights(self):
+        return (self.check_out - self.check_in).days
+
+    @annotatable_property
+    def total_price(self):
+        return self.nights * self.room.price_per_night
+
+
+class RoomOccupancy(models.Model):
+    """Guests booked per night for one room.
+
+    ``counts`` holds unsigned 16-bit counters packed in native byte order,
+    one per night starting at ``start``. It is kept in step with ``Booking``
+    by ``reservations.signals`` so availability searches never scan bookings.
+    """
+
+    room = models.OneToOneField(Room, on_delete=models.CASCADE, primary_key=True, related_name="occupancy")
+    start = models.DateField()
+    counts = models.BinaryField(default=bytes)
+
+    def __str__(self):
+        return f"Occupancy for {self.room_id} from {self.start}"
+
+
+class DailyHostelStats(models.Model):
+    """Per-hostel counters for a single day, maintained by ``reservations.stats``.
+
+    Booking and payment counters are keyed by the day the booking was made;
+    ``occupied_beds`` is keyed by the night the guests stay.
+    """
+
+    hostel = models.ForeignKey(Hostel, on_delete=models.CASCADE, related_name="daily_stats")
+    day = models.DateField()
+    bookings = models.IntegerField(default=0)
+    nights = models.IntegerField(default=0)
+    unpaid_count = models.IntegerField(default=0)
+    unpaid_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    occupied_beds = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["day", "hostel"], name="dailystats_day_hostel_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.hostel_id} on {self.day}"
+
+
+class ReceiptSequence(models.Model):
+    """Hands out receipt numbers in blocks so bulk settlement needs no per-row saves."""
+
+    name = models.CharField(max_length=32, primary_key=True)
+    next_value = models.BigIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.name}: next {self.next_value}"
+
+    @classmethod
+    @transaction.atomic
+    def allocate(cls, count, name="receipt"):
+        """Reserve ``count`` consecutive receipt numbers and return them formatted."""
+        if count <= 0:
+            return []
+        cls.objects.get_or_create(name=name)
+        sequence = cls.objects.select_for_update().get(name=name)
+        first = sequence.next_value
+        sequence.next_value = first + count
+        sequence.save(update_fields=["next_value"])
+        return [f"RCPT-{value:06d}" for value in range(first, first + count)]
+
+
+class ChangeCounter(models.Model):
+    """A number that goes up whenever some derived data changes, read by every process.
+
+    Caches keyed on it stay correct when each process has a cache of its
+    own, unlike a version stamp kept in the cache itself.
+    """
+
+    name = models.CharField(max_length=32, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+    @classmethod
+    def bump(cls, name):
+        if not cls.objects.filter(name=name).update(value=F("value") + 1):
+            cls.objects.get_or_create(name=name)
+            cls.objects.filter(name=name).update(value=F("value") + 1)
+
+    @classmethod
+    async def aget(cls, name, using=None):
+        counters = cls.objects.using(using) if using else cls.objects
+        return await counters.filter(name=name).values_list("value", flat=True).afirst() or 0
+
+
+class Job(models.Model):
+    """A unit of background work, claimed and run by ``run_workers`` (see ``reservations.jobs``)."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [(QUEUED, "Queued"), (RUNNING, "Running"), (DONE, "Done"), (FAILED, "Failed")]
+
+    task = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    key = models.CharField(max_length=200, blank=True, help_text="At most one queued or running job per key.")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(blank=True, null=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "run_after"], name="job_status_run_after_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["key"],
+                condition=Q(status__in=["queued", "running"]) & ~Q(key=""),
+                name="job_active_key_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
+
+
+class SearchDocument(models.Model):
+    """The searchable text of one hostel or booking (see ``reservations.search``).
+
+    The database indexes ``title`` and ``body`` itself: a generated
+    ``tsvector`` column with GIN indexes on PostgreSQL, an FTS5 table kept in
+    step by triggers on SQLite. Both are created by migration 0013.
+    """
+
+    HOSTEL = "hostel"
+    BOOKING = "booking"
+    KIND_CHOICES = [(HOSTEL, "Hostel"), (BOOKING, "Booking")]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    title = models.TextField(blank=True)
+    body = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "object_id"], name="searchdocument_kind_object_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}"
@@ -0,0 +1,221 @@
+from array import array
+from collections import defaultdict
+
+from django.db import IntegrityError, connections, router, transaction
+from django.utils import timezone
+
+from . import holds
+from .models import Booking, Room, RoomOccupancy
+
+
+def unpack(data):
+    counts = array("H")
+    counts.frombytes(bytes(data))
+    return counts
+
+
+def peak(start, data, check_in, check_out, released=()):
+    """Highest per-night count between check_in and check_out (exclusive).
+
+    ``released`` holds ``(check_in, check_out, guests)`` stays still counted
+    but no longer occupying their beds, i.e. lapsed holds not yet swept.
+    """
+    if start is None:
+        return 0
+    counts = unpack(data)
+    for stay_in, stay_out, guests in released:
+        for night in range(max((stay_in - start).days, 0), min((stay_out - start).days, len(counts))):
+            counts[night] = max(counts[night] - guests, 0)
+    first = max((check_in - start).days, 0)
+    last = min((check_out - start).days, len(counts))
+    if first >= last:
+        return 0
+    return max(counts[first:last])
+
+
+def _shifted(row, check_in, check_out):
+    """Return the row's counts widened so the range is covered."""
+    counts = unpack(row.counts)
+    if check_in < row.start:
+        counts = array("H", bytes(2 * (row.start - check_in).days)) + counts
+        row.start = check_in
+    missing = (check_out - row.start).days - len(counts)
+    if missing > 0:
+        counts.extend(array("H", bytes(2 * missing)))
+    return counts
+
+
+def _locked_row(room_id, check_in, create=True):
+    row = RoomOccupancy.objects.select_for_update().filter(room_id=room_id).first()
+    if row is not None or not create:
+        return row
+    try:
+        with transaction.atomic():
+            return RoomOccupancy.objects.create(room_id=room_id, start=check_in)
+    except IntegrityError:
+        return RoomOccupancy.objects.select_for_update().get(room_id=room_id)
+
+
+@transaction.atomic
+def apply(changes):
+    """Apply ``(room_id, check_in, check_out, delta)`` changes to the counters.
+
+    Rows are locked in room order so concurrent updates cannot deadlock, and
+    written back with one prepared UPDATE run through ``executemany``.
+    Releases for a room without counters (e.g. one being deleted) are ignored.
+    """
+    by_room = defaultdict(list)
+    for room_id, check_in, check_out, delta in changes:
+        if delta and check_out > check_in:
+            by_room[room_id].append((check_in, check_out, delta))
+    if not by_room:
+        return
+
+    rows = {
+        row.room_id: row
+        for row in RoomOccupancy.objects.select_for_update().filter(room_id__in=by_room).order_by("room_id")
+    }
+    changed = []
+    for room_id in sorted(by_room):
+        stays = by_room[room_id]
+        row = rows.get(room_id)
+        if row is None:
+            create = any(delta > 0 for _, _, delta in stays)
+            row = _locked_row(room_id, min(check_in for check_in, _, _ in stays), create)
+            if row is None:
+                continue
+        counts = _shifted(row, min(s[0] for s in stays), max(s[1] for s in stays))
+        for check_in, check_out, delta in stays:
+            offset = (check_in - row.start).days
+            for night in range(offset, offset + (check_out - check_in).days):
+                counts[night] = max(counts[night] + delta, 0)
+        row.counts = counts.tobytes()
+        changed.append(row)
+    _write(changed)
+
+
+def _write(rows):
+    connection = connections[router.db_for_write(RoomOccupancy)]
+    quote = connection.ops.quote_name
+    opts = RoomOccupancy._meta
+    fields = [opts.get_field("start"), opts.get_field("counts")]
+    assignments = ", ".join(f"{quote(field.column)} = %s" for field in fields)
+    sql = f"UPDATE {quote(opts.db_table)} SET {assignments} WHERE {quote(opts.pk.column)} = %s"
+    params = [
+        [field.get_db_prep_save(getattr(row, field.attname), connection) for field in fields] + [row.pk]
+        for row in rows
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def rebuild(room_ids=None, since=None):
+    """Recompute counters from bookings, dropping nights before ``since``."""
+    since = since or timezone.localdate()
+    rooms = Room.objects.all()
+    if room_ids is not None:
+        rooms = rooms.filter(id__in=room_ids)
+
+    bookings = Booking.objects.staying(since).filter(room__in=rooms)
+    stays = defaultdict(list)
+    for room_id, check_in, check_out, guests in bookings.values_list(
+        "room_id", "check_in", "check_out", "guests"
+    ).iterator(chunk_size=5000):
+        stays[room_id].append((max(check_in, since), check_out, guests))
+
+    rows = []
+    for room_id in rooms.values_list("id", flat=True).iterator():
+        counts = array("H")
+        for check_in, check_out, guests in stays.get(room_id, ()):
+            end = (check_out - since).days
+            if end > len(counts):
+                counts.extend(array("H", bytes(2 * (end - len(counts)))))
+            for night in range((check_in - since).days, end):
+                counts[night] += guests
+        rows.append(RoomOccupancy(room_id=room_id, start=since, counts=counts.tobytes()))
+
+    with transaction.atomic():
+        RoomOccupancy.objects.filter(room__in=rooms).delete()
+        RoomOccupancy.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def _search_rows(guests, city, max_price, amenities):
+    rooms = Room.objects.filter(beds__gte=guests)
+    if city:
+        rooms = rooms.filter(hostel__city__iexact=city)
+    if max_price is not None:
+        rooms = rooms.filter(price_per_night__lte=max_price)
+    for amenity in amenities:
+        rooms = rooms.filter(hostel__amenities=amenity)
+
+    return rooms.order_by("hostel__name", "price_per_night").values_list(
+        "id",
+        "name",
+        "beds",
+        "price_per_night",
+        "is_private",
+        "hostel_id",
+        "hostel__name",
+        "hostel__city",
+        "occupancy__start",
+        "occupancy__counts",
+    )
+
+
+def _lapsed_holds(check_in, check_out):
+    """Lapsed holds overlapping the stay; the counters keep them until ``expire_holds`` runs."""
+    return (
+        Booking.objects.filter(holds.lapsed())
+        .staying(check_in, check_out)
+        .values_list("room_id", "check_in", "check_out", "guests")
+    )
+
+
+def _by_room(stays):
+    released = defaultdict(list)
+    for room_id, check_in, check_out, guests in stays:
+        released[room_id].append((check_in, check_out, guests))
+    return released
+
+
+def _available(rows, check_in, check_out, guests, released):
+    results = {}
+    for room_id, name, beds, price, is_private, hostel_id, hostel_name, hostel_city, start, data in rows:
+        free = beds - peak(start, data, check_in, check_out, released.get(room_id, ()))
+        if free < guests:
+            continue
+        hostel = results.setdefault(
+            hostel_id,
+            {"id": hostel_id, "name": hostel_name, "city": hostel_city, "rooms": []},
+        )
+        hostel["rooms"].append(
+            {
+                "id": room_id,
+                "name": name,
+                "price_per_night": str(price),
+                "is_private": is_private,
+                "available_beds": free,
+            }
+        )
+    return list(results.values())
+
+
+def search(check_in, check_out, guests=1, city=None, max_price=None, amenities=()):
+    """Rooms with at least ``guests`` free beds on every night of the stay.
+
+    Filters run in SQL; the per-night check reads only the packed counters,
+    so the cost does not depend on how many bookings exist. Lapsed holds
+    the sweeper has not deleted yet are taken off the counters, as
+    ``reserve`` ignores them too.
+    """
+    rows = _search_rows(guests, city, max_price, amenities)
+    released = _by_room(_lapsed_holds(check_in, check_out))
+    return _available(rows, check_in, check_out, guests, released)
+
+
+async def asearch(check_in, check_out, guests=1, city=None, max_price=None, amenities=()):
+    """Async version of :func:`search`."""
+    rows = _search_rows(guests, city, max_price, amenities)
+    released = _by_room([stay async for stay in _lapsed_holds(check_in, check_out)])
+    return _available([row async for row in rows], check_in, check_out, guests, released)
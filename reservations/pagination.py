@@ -0,0 +1,172 @@
+import base64
+from datetime import datetime, time, timedelta
+
+from django.core.paginator import Paginator
+from django.db import connections, models
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from .models import BookingQuerySet
+
+
+class KeysetPage:
+    """One page of a ``(created_at, id)`` keyset walk, newest first."""
+
+    def __init__(self, items, next_cursor=None, previous_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_other_pages(self):
+        return bool(self.next_cursor or self.previous_cursor)
+
+
+def encode_cursor(obj):
+    raw = f"{obj.created_at.isoformat()}|{obj.pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return ``(created_at, id)`` or None if the cursor is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def _keyset_slice(queryset, after, before, size):
+    key = decode_cursor(after or before or "")
+    backwards = bool(before) and key is not None
+    if key is not None:
+        created_at, pk = key
+        if before:
+            queryset = queryset.filter(
+                models.Q(created_at__gt=created_at) | models.Q(created_at=created_at, id__gt=pk)
+            )
+        else:
+            queryset = queryset.filter(
+                models.Q(created_at__lt=created_at) | models.Q(created_at=created_at, id__lt=pk)
+            )
+
+    if backwards:
+        return queryset.order_by("created_at", "id")[: size + 1], key, backwards
+    return queryset.order_by("-created_at", "-id")[: size + 1], key, backwards
+
+
+def _keyset_result(rows, size, key, backwards):
+    if backwards:
+        has_more = len(rows) > size
+        items = rows[:size][::-1]
+        return KeysetPage(
+            items,
+            next_cursor=encode_cursor(items[-1]) if items else None,
+            previous_cursor=encode_cursor(items[0]) if has_more else None,
+        )
+
+    items = rows[:size]
+    return KeysetPage(
+        items,
+        next_cursor=encode_cursor(items[-1]) if len(rows) > size else None,
+        previous_cursor=encode_cursor(items[0]) if items and key is not None else None,
+    )
+
+
+def keyset_page(queryset, after=None, before=None, size=20):
+    """Slice ``queryset`` by ``(created_at, id)`` instead of OFFSET.
+
+    ``after`` continues to older rows, ``before`` goes back to newer ones.
+    Each page costs one index range scan no matter how deep it is.
+    """
+    rows, key, backwards = _keyset_slice(queryset, after, before, size)
+    return _keyset_result(list(rows), size, key, backwards)
+
+
+async def akeyset_page(queryset, after=None, before=None, size=20):
+    """Async version of :func:`keyset_page`."""
+    rows, key, backwards = _keyset_slice(queryset, after, before, size)
+    return _keyset_result([row async for row in rows], size, key, backwards)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that trusts the planner's row estimate for large unfiltered tables.
+
+    On PostgreSQL an unfiltered changelist reads ``pg_class.reltuples``
+    instead of running ``COUNT(*)``; filtered lists and small tables are
+    still counted exactly. A partitioned table has no estimate of its own,
+    so its partitions' estimates are added up.
+    """
+
+    exact_below = 100_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == "postgresql" and not queryset.query.where:
+            with connection.cursor() as cursor:
+                # reltuples is -1 until a table is first analyzed.
+                cursor.execute(
+                    "SELECT SUM(GREATEST(reltuples, 0))::bigint FROM pg_class WHERE oid = %s::regclass "
+                    "OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = %s::regclass)",
+                    [queryset.model._meta.db_table] * 2,
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= self.exact_below:
+                return row[0]
+        return super().count
+
+
+class IndexedDatesQuerySet(BookingQuerySet):
+    """Booking QuerySet whose ``datetimes()`` probes an index instead of running DISTINCT.
+
+    The admin date hierarchy asks for the distinct years, months or days of
+    a column. Rather than truncating every row, each candidate period
+    between MIN and MAX is checked with an ``EXISTS`` range probe. The
+    ``BookingQuerySet`` methods stay available, e.g. to admin actions.
+    """
+
+    PROBED_KINDS = ("year", "month", "day")
+
+    def datetimes(self, field_name, kind, order="ASC", tzinfo=None, **kwargs):
+        if kind not in self.PROBED_KINDS:
+            return super().datetimes(field_name, kind, order, tzinfo, **kwargs)
+
+        bounds = self.aggregate(first=models.Min(field_name), last=models.Max(field_name))
+        if bounds["first"] is None:
+            return []
+
+        tz = tzinfo or timezone.get_current_timezone()
+        first = timezone.localtime(bounds["first"], tz)
+        last = timezone.localtime(bounds["last"], tz)
+        day = first.date()
+        if kind == "year":
+            day = day.replace(month=1, day=1)
+        elif kind == "month":
+            day = day.replace(day=1)
+
+        periods = []
+        while day <= last.date():
+            following = _next_period(day, kind)
+            start = datetime.combine(day, time(), tz)
+            end = datetime.combine(following, time(), tz)
+            if self.filter(**{f"{field_name}__gte": start, f"{field_name}__lt": end}).exists():
+                periods.append(start)
+            day = following
+        return periods if order == "ASC" else periods[::-1]
+
+
+def _next_period(day, kind):
+    if kind == "year":
+        return day.replace(year=day.year + 1)
+    if kind == "month":
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
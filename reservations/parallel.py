@@ -0,0 +1,45 @@
+"""Process pools for CPU-bound batch work (PDF and image rendering).
+
+Workers are spawned rather than forked so they never inherit the parent's
+database connections, and they set Django up before running any task.
+Task functions must live in modules that do not import models at import
+time, because the task is unpickled before ``django.setup()`` has run.
+``run_workers`` starts its job worker processes the same way.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+
+def init_worker():
+    import django
+
+    django.setup()
+
+
+def serve_jobs(threads, poll, visibility, burst):
+    """Entry point of a ``run_workers`` child process."""
+    init_worker()
+    from . import jobs
+
+    jobs.serve(threads, poll, visibility, burst)
+
+
+def process_pool(workers=None):
+    return ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count() or 1,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+    )
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
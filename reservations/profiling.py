@@ -0,0 +1,256 @@
+"""Opt-in request profiling (``PROFILING=1``).
+
+Each request records its wall time, SQL count and time, template render
+time and receipt render time. The numbers go into in-process histograms
+per view, which ``metrics`` serves in Prometheus text format. Every
+worker process keeps its own histograms. A statement repeated
+``PROFILING_N_PLUS_ONE`` times in one request is reported as a likely
+N+1, together with the line of project code that issued it. The cached
+fragment hit and miss counts are served alongside.
+"""
+
+import bisect
+import contextvars
+import logging
+import os
+import threading
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends.django import DjangoTemplates
+
+from . import fragments
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+
+_current = contextvars.ContextVar("request_profile", default=None)
+_lock = threading.Lock()
+_histograms = {}
+_n_plus_one = Counter()
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+    def samples(self):
+        """Cumulative ``(le, count)`` pairs, ending with ``+Inf``."""
+        running = 0
+        for bound, count in zip(list(self.buckets) + ["+Inf"], self.counts):
+            running += count
+            yield bound, running
+
+
+class RequestProfile:
+    __slots__ = ("sql_count", "sql_seconds", "template_seconds", "receipt_seconds", "statements", "sites")
+
+    def __init__(self):
+        self.sql_count = 0
+        self.sql_seconds = 0.0
+        self.template_seconds = 0.0
+        self.receipt_seconds = 0.0
+        self.statements = Counter()
+        self.sites = {}
+
+
+METRICS = {
+    "request_seconds": ("Wall time per request.", BUCKETS),
+    "sql_queries": ("SQL statements per request.", QUERY_BUCKETS),
+    "sql_seconds": ("Time spent in SQL per request.", BUCKETS),
+    "template_seconds": ("Time spent rendering templates per request.", BUCKETS),
+    "receipt_seconds": ("Time spent drawing receipt PDFs per request.", BUCKETS),
+}
+
+
+def observe(metric, view, value):
+    with _lock:
+        histogram = _histograms.get((metric, view))
+        if histogram is None:
+            histogram = _histograms[(metric, view)] = Histogram(METRICS[metric][1])
+        histogram.observe(value)
+
+
+def _call_site():
+    """The innermost frame of project code outside Django and this module."""
+    base = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack(limit=60)):
+        filename = frame.filename
+        if filename.startswith(base) and filename != __file__ and "site-packages" not in filename:
+            return f"{os.path.relpath(filename, base)}:{frame.lineno}"
+    return "unknown"
+
+
+def _execute(execute, sql, params, many, context):
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.sql_seconds += time.perf_counter() - started
+        profile.sql_count += 1
+        profile.statements[sql] += 1
+        # Only look at the stack once per repeated statement.
+        if profile.statements[sql] == settings.PROFILING_N_PLUS_ONE:
+            profile.sites[sql] = _call_site()
+
+
+def _install_wrapper(connection, **kwargs):
+    if _execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_execute)
+
+
+def install():
+    """Wrap every database connection; called from ``AppConfig.ready``."""
+    connection_created.connect(_install_wrapper, dispatch_uid="reservations.profiling")
+    for connection in connections.all(initialized_only=True):
+        _install_wrapper(connection)
+
+
+@contextmanager
+def span(field):
+    """Add the time spent in the block to ``field`` of the current profile."""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        setattr(profile, field, getattr(profile, field) + time.perf_counter() - started)
+
+
+class _ProfiledTemplate:
+    def __init__(self, template):
+        self.template = template
+        self.origin = template.origin
+
+    def render(self, context=None, request=None):
+        with span("template_seconds"):
+            return self.template.render(context, request)
+
+
+class ProfiledTemplates(DjangoTemplates):
+    """Django template backend that adds render time to the request profile."""
+
+    def from_string(self, template_code):
+        return _ProfiledTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _ProfiledTemplate(super().get_template(template_name))
+
+
+def _finish(request, profile, started):
+    match = getattr(request, "resolver_match", None)
+    view = match.view_name if match else "unresolved"
+    observe("request_seconds", view, time.perf_counter() - started)
+    observe("sql_queries", view, profile.sql_count)
+    observe("sql_seconds", view, profile.sql_seconds)
+    observe("template_seconds", view, profile.template_seconds)
+    if profile.receipt_seconds:
+        observe("receipt_seconds", view, profile.receipt_seconds)
+
+    for sql, site in profile.sites.items():
+        with _lock:
+            _n_plus_one[(view, site)] += 1
+        logger.warning(
+            "Possible N+1 in %s at %s: %d× %s", view, site, profile.statements[sql], sql[:200]
+        )
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        profile = RequestProfile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        try:
+            return self.get_response(request)
+        finally:
+            _current.reset(token)
+            _finish(request, profile, started)
+
+    async def __acall__(self, request):
+        profile = RequestProfile()
+        token = _current.set(profile)
+        started = time.perf_counter()
+        try:
+            return await self.get_response(request)
+        finally:
+            _current.reset(token)
+            _finish(request, profile, started)
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def render_metrics():
+    lines = []
+    with _lock:
+        histograms = sorted(_histograms.items())
+        suspects = sorted(_n_plus_one.items())
+
+    for metric, (description, _) in METRICS.items():
+        name = f"hostels_{metric}"
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} histogram")
+        for (key, view), histogram in histograms:
+            if key != metric:
+                continue
+            for bound, count in histogram.samples():
+                lines.append(f'{name}_bucket{{view="{_label(view)}",le="{bound}"}} {count}')
+            lines.append(f'{name}_sum{{view="{_label(view)}"}} {histogram.total}')
+            lines.append(f'{name}_count{{view="{_label(view)}"}} {sum(histogram.counts)}')
+
+    lines.append("# HELP hostels_n_plus_one_total Requests where one statement repeated past the threshold.")
+    lines.append("# TYPE hostels_n_plus_one_total counter")
+    for (view, site), count in suspects:
+        lines.append(f'hostels_n_plus_one_total{{view="{_label(view)}",site="{_label(site)}"}} {count}')
+
+    # Read from the cache, so with locmem these are this worker's own counts.
+    fragment_counts = fragments.stats()
+    for outcome in ("hits", "misses"):
+        name = f"hostels_fragment_cache_{outcome}_total"
+        lines.append(f"# HELP {name} Cached hostel page fragment {outcome}.")
+        lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name} {fragment_counts[outcome]}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics(request):
+    """Prometheus text for staff users or a scraper holding ``PROFILING_METRICS_TOKEN``."""
+    token = settings.PROFILING_METRICS_TOKEN
+    authorized = token and request.headers.get("Authorization") == f"Bearer {token}"
+    if not authorized and not (request.user.is_authenticated and request.user.is_staff):
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
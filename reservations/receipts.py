@@ -0,0 +1,245 @@
+import asyncio
+import hashlib
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+
+from . import profiling
+from .storage import receipt_storage
+
+
+def format_tzs(value):
+    if value is None:
+        return "TZS 0"
+    if not isinstance(value, Decimal):
+        try:
+            value = Decimal(value)
+        except Exception:
+            return f"TZS {value}"
+    return f"TZS {value:,.0f}"
+
+
+def receipt_data(booking):
+    """Plain values printed on a receipt; safe to send to worker processes."""
+    return {
+        "id": booking.id,
+        "receipt_number": booking.receipt_number,
+        "paid_at": booking.paid_at,
+        "amount_paid": booking.amount_paid,
+        "hostel": booking.hostel.name,
+        "room": booking.room.name,
+        "check_in": booking.check_in,
+        "check_out": booking.check_out,
+        "nights": booking.nights,
+        "guest_name": booking.guest_name,
+        "guest_email": booking.guest_email,
+    }
+
+
+# The logo is drawn 58pt wide; 3x that keeps it sharp in print.
+LOGO_PIXELS = 174
+
+
+@lru_cache(maxsize=1)
+def _logo():
+    """The receipt logo, decoded and downscaled once per process."""
+    from PIL import Image
+    from reportlab.lib.utils import ImageReader
+
+    logo_path = os.path.join(settings.BASE_DIR, "static", "images", "logo.png")
+    if not os.path.exists(logo_path):
+        return None
+    with Image.open(logo_path) as image:
+        image.thumbnail((LOGO_PIXELS, LOGO_PIXELS))
+        return ImageReader(image.copy())
+
+
+def render_receipt(data):
+    """Draw the receipt PDF and return its bytes.
+
+    Output is deterministic for the same data so identical receipts hash
+    to the same stored file.
+    """
+    with profiling.span("receipt_seconds"):
+        return _draw_receipt(data)
+
+
+def _draw_receipt(data):
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import letter
+    from reportlab.pdfgen import canvas
+
+    buffer = BytesIO()
+    c = canvas.Canvas(buffer, pagesize=letter, invariant=1)
+    width, height = letter
+
+    # Layout inspired by the provided receipt template.
+    page_margin = 36
+    receipt_width = 300
+    receipt_height = height - 2 * page_margin
+    receipt_x = page_margin
+    receipt_y = page_margin
+    aside_x = receipt_x + receipt_width + 28
+
+    # Receipt card
+    c.setFillColor(colors.white)
+    c.setStrokeColor(colors.HexColor("#d5dbe3"))
+    c.setLineWidth(1)
+    c.roundRect(receipt_x, receipt_y, receipt_width, receipt_height, 6, fill=1, stroke=1)
+
+    # Logo + header
+    logo = _logo()
+    if logo is not None:
+        c.drawImage(
+            logo,
+            receipt_x + 16,
+            height - 110,
+            width=58,
+            height=58,
+            preserveAspectRatio=True,
+            mask="auto",
+        )
+    c.setFillColor(colors.HexColor("#2d3748"))
+    c.setFont("Helvetica-Bold", 12)
+    c.drawString(receipt_x + 80, height - 70, "STUDENT HUB HOSTEL")
+    c.setFont("Helvetica", 9)
+    c.setFillColor(colors.HexColor("#4a5568"))
+    c.drawString(receipt_x + 80, height - 84, "PAYMENT RECEIPT")
+
+    # Key details block
+    c.setFont("Helvetica", 9)
+    c.setFillColor(colors.HexColor("#4a5568"))
+    c.drawString(receipt_x + 16, height - 135, f"Receipt #: {data['receipt_number']}")
+    c.drawString(receipt_x + 16, height - 150, f"Date: {data['paid_at'].strftime('%Y-%m-%d %H:%M')}")
+
+    # Table header
+    table_top = height - 185
+    c.setFillColor(colors.HexColor("#edf2f7"))
+    c.rect(receipt_x + 12, table_top - 20, receipt_width - 24, 20, fill=1, stroke=0)
+    c.setFillColor(colors.HexColor("#2d3748"))
+    c.setFont("Helvetica-Bold", 9)
+    c.drawString(receipt_x + 18, table_top - 14, "Description")
+    c.drawRightString(receipt_x + receipt_width - 18, table_top - 14, "Amount")
+
+    # Table rows
+    c.setFont("Helvetica", 9)
+    c.setFillColor(colors.HexColor("#2d3748"))
+    row_y = table_top - 38
+    line_gap = 16
+    c.drawString(receipt_x + 18, row_y, f"Hostel: {data['hostel']}")
+    c.drawRightString(receipt_x + receipt_width - 18, row_y, format_tzs(data["amount_paid"]))
+    row_y -= line_gap
+    c.setFillColor(colors.HexColor("#4a5568"))
+    c.drawString(receipt_x + 18, row_y, f"Room: {data['room']}")
+    row_y -= line_gap
+    c.drawString(receipt_x + 18, row_y, f"Dates: {data['check_in']} to {data['check_out']}")
+    row_y -= line_gap
+    c.drawString(receipt_x + 18, row_y, f"Nights: {data['nights']}")
+    row_y -= line_gap
+    c.drawString(receipt_x + 18, row_y, f"Guest: {data['guest_name']}")
+    row_y -= line_gap
+    c.drawString(receipt_x + 18, row_y, f"Email: {data['guest_email']}")
+
+    # Total section
+    total_y = receipt_y + 70
+    c.setFillColor(colors.HexColor("#f7fafc"))
+    c.rect(receipt_x + 12, total_y, receipt_width - 24, 32, fill=1, stroke=0)
+    c.setFillColor(colors.HexColor("#2d3748"))
+    c.setFont("Helvetica-Bold", 10)
+    c.drawString(receipt_x + 18, total_y + 10, "TOTAL PAID")
+    c.drawRightString(receipt_x + receipt_width - 18, total_y + 10, format_tzs(data["amount_paid"]))
+
+    # Footer note
+    c.setFont("Helvetica", 8.5)
+    c.setFillColor(colors.HexColor("#718096"))
+    c.drawString(receipt_x + 16, receipt_y + 30, "Payment confirmed. Thank you for your booking.")
+
+    # Right-side panel (title + tagline)
+    c.setFillColor(colors.HexColor("#2d3748"))
+    c.setFont("Helvetica-Bold", 18)
+    c.drawString(aside_x, height - 120, "Payment Receipt")
+    c.setFont("Helvetica", 9.5)
+    c.setFillColor(colors.HexColor("#4a5568"))
+    c.drawString(aside_x, height - 150, "Keep this receipt for your records.")
+    c.drawString(aside_x, height - 165, "We appreciate your stay.")
+
+    c.showPage()
+    c.save()
+    return buffer.getvalue()
+
+
+def store_receipt(pdf):
+    """Save PDF bytes under a name derived from their SHA-256 and return the name."""
+    digest = hashlib.sha256(pdf).hexdigest()
+    name = f"receipts/{digest[:2]}/{digest}.pdf"
+    storage = receipt_storage()
+    if not storage.exists(name):
+        name = storage.save(name, ContentFile(pdf))
+    return name
+
+
+def render_and_store(data):
+    return data["id"], store_receipt(render_receipt(data))
+
+
+def ensure_receipt(booking):
+    """Return the stored receipt name for a paid booking, rendering it on first use."""
+    if booking.receipt_pdf and receipt_storage().exists(booking.receipt_pdf.name):
+        return booking.receipt_pdf.name
+
+    _, name = render_and_store(receipt_data(booking))
+    booking.receipt_pdf.name = name
+    type(booking).objects.filter(pk=booking.pk).update(receipt_pdf=name)
+    return name
+
+
+# How often a download waiting for run_workers looks for the stored receipt.
+RECEIPT_POLL_SECONDS = 0.2
+
+
+@lru_cache(maxsize=1)
+def render_executor():
+    """Threads that do receipt file I/O for async views so the event loop keeps serving."""
+    return ThreadPoolExecutor(max_workers=settings.RECEIPT_RENDER_THREADS, thread_name_prefix="receipt-io")
+
+
+async def astored_receipt(booking):
+    """The booking's stored receipt name, or ``None`` while it has not been rendered."""
+    if not booking.receipt_pdf:
+        return None
+    loop = asyncio.get_running_loop()
+    if await loop.run_in_executor(render_executor(), receipt_storage().exists, booking.receipt_pdf.name):
+        return booking.receipt_pdf.name
+    return None
+
+
+async def await_receipt(booking, timeout):
+    """Wait up to ``timeout`` seconds for a worker to store the booking's receipt; return its name or ``None``."""
+    deadline = time.monotonic() + timeout
+    while True:
+        await booking.arefresh_from_db(fields=["receipt_pdf"])
+        name = await astored_receipt(booking)
+        if name is not None or time.monotonic() >= deadline:
+            return name
+        await asyncio.sleep(RECEIPT_POLL_SECONDS)
+
+
+async def aread_receipt(name):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(render_executor(), _read, name)
+
+
+def _read(name):
+    with receipt_storage().open(name) as source:
+        return source.read()
+
+
+def receipt_etag(name):
+    """Stored receipts are content-addressed, so the file name is the ETag."""
+    return '"%s"' % os.path.splitext(os.path.basename(name))[0]
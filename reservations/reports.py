@@ -0,0 +1,233 @@
+"""Occupancy, revenue and lead-time reports for staff, computed with NumPy.
+
+The bookings that overlap the period are loaded in one query as plain
+integers: room, first and last night as day offsets, guests and lead time.
+Per-room, per-day occupancy comes from a difference array. Each stay adds
+its guests on its first night and removes them after its last, and a
+cumulative sum along the days gives the beds in use each night. Nothing
+loops over bookings in Python.
+"""
+
+import base64
+from datetime import date, timedelta
+from io import BytesIO
+from itertools import chain
+
+import numpy as np
+from django.db import connections
+from django.db.models import DateField, Value
+from django.db.models.functions import Cast
+from django.utils import timezone
+
+from .models import ArchivedBooking, Booking, DaysBetween, Room
+
+# Lead time buckets in days before check-in; the last one is open-ended.
+LEAD_TIME_EDGES = [0, 1, 3, 7, 14, 30, 60, 90, 180, 365]
+# Empty, quiet, busy and full nights, from light blue to deep red.
+HEAT_STOPS = np.array([[237, 244, 255], [125, 180, 240], [250, 190, 60], [200, 40, 40]], dtype=float)
+DAY_WIDTH = 2
+ROW_HEIGHT = 12
+
+
+def _intervals(start, end, hostel_id=None):
+    """``(room_id, first, last, guests, lead)`` rows as an int64 array; nights are offsets from ``start``.
+
+    Archived bookings count too, so past years report the same after they are archived.
+    """
+    day_zero = Value(start, output_field=DateField())
+    rows = []
+    for model in (Booking, ArchivedBooking):
+        queryset = model.objects.staying(start, end)
+        if hostel_id is not None:
+            queryset = queryset.filter(hostel_id=hostel_id)
+        queryset = (
+            queryset.annotate(
+                first=DaysBetween("check_in", day_zero),
+                last=DaysBetween("check_out", day_zero),
+                lead=DaysBetween("check_in", Cast("created_at", DateField())),
+            )
+            .values_list("room_id", "first", "last", "guests", "lead")
+        )
+        # Fetch through the cursor: a million model rows would dominate the run time.
+        sql, params = queryset.query.sql_with_params()
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute(sql, params)
+            rows += cursor.fetchall()
+    # fromiter over the flattened rows is several times faster than np.array(rows).
+    return np.fromiter(chain.from_iterable(rows), dtype=np.int64, count=5 * len(rows)).reshape(-1, 5)
+
+
+def _per_night(room_index, first, last, weights, rooms, days):
+    """Sum of ``weights`` over the stays covering each room and night, shape ``(rooms, days)``."""
+    width = days + 1
+    size = rooms * width
+    diff = np.bincount(room_index * width + first, weights=weights, minlength=size)
+    diff -= np.bincount(room_index * width + last, weights=weights, minlength=size)
+    return diff.reshape(rooms, width)[:, :days].cumsum(axis=1)
+
+
+def occupancy(start, end, hostel_id=None):
+    """Beds in use and booked revenue per room and night between ``start`` and ``end``.
+
+    Rooms are ordered by hostel name, then room name, so each hostel's rooms
+    are contiguous.
+    """
+    days = (end - start).days
+    rooms = Room.objects.order_by("hostel__name", "hostel_id", "name", "id")
+    if hostel_id is not None:
+        rooms = rooms.filter(hostel_id=hostel_id)
+    room_rows = list(rooms.values_list("id", "name", "hostel_id", "hostel__name", "beds", "price_per_night"))
+    room_ids = np.array([row[0] for row in room_rows], dtype=np.int64)
+    beds = np.array([row[4] for row in room_rows], dtype=float)
+    prices = np.array([row[5] for row in room_rows], dtype=float)
+
+    data = _intervals(start, end, hostel_id)
+    order = np.argsort(room_ids)
+    room_index = order[np.searchsorted(room_ids, data[:, 0], sorter=order)]
+    first = np.clip(data[:, 1], 0, days)
+    last = np.clip(data[:, 2], 0, days)
+
+    guests = _per_night(room_index, first, last, data[:, 3].astype(float), len(room_rows), days)
+    stays = _per_night(room_index, first, last, None, len(room_rows), days)
+    starting = (data[:, 1] >= 0) & (data[:, 1] < days)
+    return {
+        "rooms": room_rows,
+        "beds": beds,
+        "guests": guests,
+        "revenue": stays * prices[:, None],
+        "lead": np.maximum(data[starting, 4], 0),
+    }
+
+
+def _group(values, keys):
+    """Sum the rows of ``values`` that share a key; keys must be contiguous."""
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    return np.add.reduceat(values, starts, axis=0), starts
+
+
+def _rates(guests, beds):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.nan_to_num(guests / beds[:, None])
+
+
+def heatmap(rates):
+    """A PNG data URI with one row per entry of ``rates`` and one column per night."""
+    from PIL import Image
+
+    rates = np.clip(rates, 0, 1)
+    positions = np.linspace(0, 1, len(HEAT_STOPS))
+    pixels = np.stack([np.interp(rates, positions, HEAT_STOPS[:, channel]) for channel in range(3)], axis=-1)
+    pixels = np.repeat(np.repeat(pixels.astype(np.uint8), ROW_HEIGHT, axis=0), DAY_WIDTH, axis=1)
+    buffer = BytesIO()
+    Image.fromarray(pixels, "RGB").save(buffer, "PNG", optimize=True)
+    return "data:image/png;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def _months(start, days):
+    firsts = [start]
+    while True:
+        following = date(firsts[-1].year + firsts[-1].month // 12, firsts[-1].month % 12 + 1, 1)
+        if (following - start).days >= days:
+            return firsts
+        firsts.append(following)
+
+
+def _lead_label(low, high):
+    if high == np.inf:
+        return f"{low}+ days"
+    if high == low + 1:
+        return f"{low} days"
+    return f"{low}–{high - 1} days"
+
+
+def report(year, hostel_id=None):
+    """Everything the staff report page shows for one calendar year."""
+    start, end = date(year, 1, 1), date(year + 1, 1, 1)
+    days = (end - start).days
+    result = occupancy(start, end, hostel_id)
+    rooms, beds, guests, revenue = result["rooms"], result["beds"], result["guests"], result["revenue"]
+    if not rooms:
+        return {"year": year, "start": start, "rows": [], "months": [], "lead_times": [], "totals": None}
+
+    if hostel_id is None:
+        # One heatmap row per hostel.
+        guests, starts = _group(guests, np.array([row[2] for row in rooms]))
+        revenue, _ = _group(revenue, np.array([row[2] for row in rooms]))
+        beds, _ = _group(beds, np.array([row[2] for row in rooms]))
+        labels = [(rooms[index][2], rooms[index][3]) for index in starts]
+    else:
+        labels = [(row[0], row[1]) for row in rooms]
+
+    bed_nights = beds * days
+    rows = [
+        {
+            "id": key,
+            "name": name,
+            "beds": int(beds[index]),
+            "occupancy": 100 * guests[index].sum() / bed_nights[index] if bed_nights[index] else 0,
+            "revenue": revenue[index].sum(),
+            "revpab": revenue[index].sum() / bed_nights[index] if bed_nights[index] else 0,
+        }
+        for index, (key, name) in enumerate(labels)
+    ]
+
+    month_starts = _months(start, days)
+    offsets = [(first - start).days for first in month_starts]
+    month_guests = np.add.reduceat(guests.sum(axis=0), offsets)
+    month_revenue = np.add.reduceat(revenue.sum(axis=0), offsets)
+    month_days = np.diff(offsets + [days])
+    months = [
+        {
+            "month": first,
+            "occupancy": 100 * month_guests[index] / (beds.sum() * month_days[index]),
+            "revenue": month_revenue[index],
+            "revpab": month_revenue[index] / (beds.sum() * month_days[index]),
+        }
+        for index, first in enumerate(month_starts)
+    ]
+
+    counts, _ = np.histogram(result["lead"], bins=LEAD_TIME_EDGES + [np.inf])
+    peak = counts.max() or 1
+    lead_times = [
+        {
+            "label": _lead_label(low, high),
+            "count": int(count),
+            "width": 100 * count / peak,
+        }
+        for low, high, count in zip(LEAD_TIME_EDGES, LEAD_TIME_EDGES[1:] + [np.inf], counts)
+    ]
+
+    return {
+        "year": year,
+        "start": start,
+        "rows": rows,
+        "months": months,
+        "lead_times": lead_times,
+        "median_lead": float(np.median(result["lead"])) if len(result["lead"]) else 0,
+        "heatmap": heatmap(_rates(guests, beds)),
+        "heatmap_width": days * DAY_WIDTH,
+        "row_height": ROW_HEIGHT,
+        "totals": {
+            "beds": int(beds.sum()),
+            "occupancy": 100 * guests.sum() / bed_nights.sum() if bed_nights.sum() else 0,
+            "revenue": revenue.sum(),
+            "revpab": revenue.sum() / bed_nights.sum() if bed_nights.sum() else 0,
+        },
+        "month_marks": [
+            {"label": first.strftime("%b"), "left": (first - start).days * DAY_WIDTH} for first in month_starts
+        ],
+    }
+
+
+def available_years(today=None):
+    today = today or timezone.localdate()
+    first = (
+        ArchivedBooking.objects.order_by("check_in").values_list("check_in", flat=True).first()
+        or Booking.objects.order_by("check_in").values_list("check_in", flat=True).first()
+    )
+    last = Booking.objects.order_by("-check_out").values_list("check_out", flat=True).first() or (
+        ArchivedBooking.objects.order_by("-check_out").values_list("check_out", flat=True).first()
+    )
+    low = first.year if first else today.year
+    high = (last - timedelta(days=1)).year if last else today.year
+    return list(range(min(low, today.year), max(high, today.year) + 1))
@@ -0,0 +1,103 @@
+"""Read-replica routing, enabled by ``DATABASE_REPLICA_URL``.
+
+``ReplicaRoutingMiddleware`` lets GET and HEAD requests for the views in
+``DATABASE_REPLICA_VIEWS``, and for admin changelists, read reservation data
+from the replica. Everything else uses the primary: writes, other views,
+sessions and users, management commands and job workers.
+
+Once a request has written reservation data, the browser gets a cookie
+that keeps its reads on the primary for ``DATABASE_REPLICA_PIN_SECONDS``.
+Guests therefore see their own bookings and payments straight away, even
+while the replica lags.
+"""
+
+import contextvars
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.urls import Resolver404, resolve
+
+REPLICA = "replica"
+REPLICA_APPS = {"reservations"}
+PIN_COOKIE = "db_primary"
+
+_current = contextvars.ContextVar("db_routing", default=None)
+
+
+class RequestRouting:
+    __slots__ = ("replica", "wrote")
+
+    def __init__(self, replica):
+        self.replica = replica
+        self.wrote = False
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        routing = _current.get()
+        if routing is None or not routing.replica or model._meta.app_label not in REPLICA_APPS:
+            return None
+        # Reads inside a transaction must see its own writes.
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        routing = _current.get()
+        if routing is not None and model._meta.app_label in REPLICA_APPS:
+            routing.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data.
+        return True
+
+
+def replica_allowed(request):
+    if request.method not in ("GET", "HEAD") or PIN_COOKIE in request.COOKIES:
+        return False
+    try:
+        view = resolve(request.path_info).view_name
+    except Resolver404:
+        return False
+    if view.startswith("admin:") and view.endswith("_changelist"):
+        return True
+    return view in settings.DATABASE_REPLICA_VIEWS
+
+
+def _pin(response, routing):
+    if routing.wrote:
+        response.set_cookie(
+            PIN_COOKIE, "1", max_age=settings.DATABASE_REPLICA_PIN_SECONDS, httponly=True, samesite="Lax"
+        )
+    return response
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        routing = RequestRouting(replica_allowed(request))
+        token = _current.set(routing)
+        try:
+            return _pin(self.get_response(request), routing)
+        finally:
+            _current.reset(token)
+
+    async def __acall__(self, request):
+        routing = RequestRouting(replica_allowed(request))
+        token = _current.set(routing)
+        try:
+            return _pin(await self.get_response(request), routing)
+        finally:
+            _current.reset(token)
@@ -0,0 +1,215 @@
+"""Full-text search over hostels and bookings.
+
+Every hostel and booking has a ``SearchDocument`` row. The title is the
+hostel or guest name. The body holds the other searchable text: city,
+address, description and amenities for hostels; email, reference and
+account for bookings. Both are stored lower-cased as plain words, so every
+backend tokenizes them the same way. ``reservations.signals`` keeps the
+rows current when models are saved. Bulk writers that skip the signals
+call :func:`index_hostels`, :func:`index_bookings` or :func:`forget`
+themselves.
+
+The database indexes the rows (see migration 0013). PostgreSQL uses a
+generated ``tsvector`` column with a GIN index per kind. SQLite uses an
+FTS5 table fed by triggers. Other databases fall back to substring
+matching.
+
+A query is reduced to at most ``MAX_TERMS`` words. Each word matches as a
+prefix and all of them must match, so "dar back" finds "Dar Backpackers".
+"""
+
+import re
+
+from django.db import connections, router, transaction
+from django.db.models import Count, Q
+from django.db.models.expressions import RawSQL
+
+from .models import Amenity, Booking, Hostel, SearchDocument
+
+HOSTEL = SearchDocument.HOSTEL
+BOOKING = SearchDocument.BOOKING
+MAX_TERMS = 8
+WORD = re.compile(r"\w+")
+TABLE = SearchDocument._meta.db_table
+FTS_TABLE = f"{TABLE}_fts"
+# bm25() weights for the FTS5 columns kind, title and body.
+SQLITE_WEIGHTS = "0.0, 10.0, 1.0"
+
+
+def words(*values):
+    return " ".join(WORD.findall(" ".join(str(value) for value in values if value).lower()))
+
+
+def terms(query):
+    return WORD.findall(query.lower())[:MAX_TERMS]
+
+
+def hostel_documents(hostel_ids):
+    hostels = Hostel.objects.filter(id__in=hostel_ids).prefetch_related("amenities")
+    return [
+        SearchDocument(
+            kind=HOSTEL,
+            object_id=hostel.id,
+            title=words(hostel.name),
+            body=words(
+                hostel.city,
+                hostel.address,
+                hostel.description,
+                *(amenity.name for amenity in hostel.amenities.all()),
+            ),
+        )
+        for hostel in hostels
+    ]
+
+
+def booking_documents(booking_ids):
+    rows = Booking.objects.filter(id__in=booking_ids).values_list(
+        "id", "guest_name", "guest_email", "user__username", "user__email"
+    )
+    return [
+        SearchDocument(
+            kind=BOOKING,
+            object_id=pk,
+            title=words(guest_name),
+            # The reference both as quoted (BK-000123) and as the bare id.
+            body=words(guest_email, f"BK-{pk:06d}", pk, username, user_email),
+        )
+        for pk, guest_name, guest_email, username, user_email in rows
+    ]
+
+
+def _save(documents):
+    SearchDocument.objects.bulk_create(
+        documents,
+        update_conflicts=True,
+        unique_fields=["kind", "object_id"],
+        update_fields=["title", "body"],
+        batch_size=500,
+    )
+
+
+def index_hostels(hostel_ids):
+    """Write the documents of these hostels, dropping those of hostels that are gone."""
+    hostel_ids = set(hostel_ids)
+    documents = hostel_documents(hostel_ids)
+    _save(documents)
+    forget(HOSTEL, hostel_ids - {document.object_id for document in documents})
+
+
+def index_bookings(booking_ids):
+    booking_ids = set(booking_ids)
+    documents = booking_documents(booking_ids)
+    _save(documents)
+    forget(BOOKING, booking_ids - {document.object_id for document in documents})
+
+
+def forget(kind, object_ids):
+    if object_ids:
+        SearchDocument.objects.filter(kind=kind, object_id__in=list(object_ids)).delete()
+
+
+def rebuild(kind=None, batch_size=2000):
+    """Rewrite the documents of every hostel and booking; return how many were written."""
+    sources = {HOSTEL: (Hostel, index_hostels), BOOKING: (Booking, index_bookings)}
+    written = 0
+    for name, (model, index) in sources.items():
+        if kind not in (None, name):
+            continue
+        with transaction.atomic():
+            SearchDocument.objects.filter(kind=name).delete()
+            ids = list(model.objects.order_by("id").values_list("id", flat=True))
+            for start in range(0, len(ids), batch_size):
+                index(ids[start:start + batch_size])
+            written += len(ids)
+    return written
+
+
+def _connection():
+    return connections[router.db_for_read(SearchDocument)]
+
+
+def _match_sql(kind, tokens, ranked=False):
+    """SQL selecting the ``object_id`` of matching documents, best matches first when ``ranked``."""
+    vendor = _connection().vendor
+    if vendor == "postgresql":
+        query = " & ".join(f"{token}:*" for token in tokens)
+        sql = f"SELECT object_id FROM {TABLE} WHERE kind = %s AND document @@ to_tsquery('simple', %s)"
+        params = [kind, query]
+        if ranked:
+            sql += " ORDER BY ts_rank(document, to_tsquery('simple', %s)) DESC, object_id"
+            params.append(query)
+        return sql, params
+    if vendor == "sqlite":
+        prefixes = " AND ".join(f'"{token}"*' for token in tokens)
+        query = f"kind : {kind} AND {{title body}} : ({prefixes})"
+        sql = f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s"
+        if ranked:
+            sql += f" ORDER BY bm25({FTS_TABLE}, {SQLITE_WEIGHTS})"
+        # The FTS rowid is the document id.
+        return f"SELECT d.object_id FROM ({sql}) AS m JOIN {TABLE} AS d ON d.id = m.rowid", [query]
+    return None
+
+
+def _fallback(kind, tokens):
+    documents = SearchDocument.objects.filter(kind=kind)
+    for token in tokens:
+        documents = documents.filter(Q(title__contains=token) | Q(body__contains=token))
+    return documents.values("object_id")
+
+
+def matching(kind, query):
+    """Object ids matching ``query``, for ``filter(id__in=...)``."""
+    tokens = terms(query)
+    match = _match_sql(kind, tokens)
+    if match is None:
+        return _fallback(kind, tokens)
+    return RawSQL(*match)
+
+
+def ranked(kind, query):
+    """Object ids matching ``query``, best matches first."""
+    tokens = terms(query)
+    match = _match_sql(kind, tokens, ranked=True)
+    if match is None:
+        return list(_fallback(kind, tokens).order_by("object_id").values_list("object_id", flat=True))
+    with _connection().cursor() as cursor:
+        cursor.execute(*match)
+        return [row[0] for row in cursor.fetchall()]
+
+
+def search_hostels(query="", city="", amenity_ids=(), limit=50):
+    """Hostels for the public search page, with city and amenity facet counts.
+
+    City counts ignore the chosen city so guests can switch between cities;
+    amenity counts apply every filter, as each chosen amenity is required.
+    """
+    hostels = Hostel.objects.all()
+    if terms(query):
+        hostels = hostels.filter(id__in=matching(HOSTEL, query))
+    for amenity_id in amenity_ids:
+        hostels = hostels.filter(amenities__id=amenity_id)
+
+    cities = list(
+        hostels.values("city").annotate(count=Count("id")).order_by("-count", "city").values_list("city", "count")
+    )
+    if city:
+        hostels = hostels.filter(city=city)
+    amenities = list(
+        Amenity.objects.filter(hostels__in=hostels)
+        .annotate(count=Count("hostels"))
+        .order_by("-count", "name")
+        .values_list("id", "name", "count")
+    )
+
+    if terms(query):
+        found = set(hostels.values_list("id", flat=True))
+        ordered = [hostel_id for hostel_id in ranked(HOSTEL, query) if hostel_id in found]
+    else:
+        ordered = list(hostels.order_by("name", "id").values_list("id", flat=True))
+    return {
+        "hostel_ids": ordered[:limit],
+        "total": len(ordered),
+        "limit": limit,
+        "cities": cities,
+        "amenities": amenities,
+    }
@@ -0,0 +1,164 @@
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import conditional, images, jobs, occupancy, search, stats, tasks
+from .models import Amenity, Booking, Hostel, Room
+
+TRACKED_FIELDS = {"hostel", "hostel_id", "room", "room_id", "check_in", "check_out", "guests"}
+# Fields that end up in a booking's search document.
+SEARCHED_BOOKING_FIELDS = {"guest_name", "guest_email", "user", "user_id"}
+SEARCHED_USER_FIELDS = {"username", "email"}
+
+
+def _tracked(update_fields):
+    return update_fields is None or bool(TRACKED_FIELDS & set(update_fields))
+
+
+def _stored_snapshot(pk):
+    row = Booking.objects.filter(pk=pk).values(*stats.SNAPSHOT_LOOKUPS.values()).first()
+    if row is None:
+        return None
+    return {key: row[lookup] for key, lookup in stats.SNAPSHOT_LOOKUPS.items()}
+
+
+def _stay(snapshot, sign):
+    return (snapshot["room_id"], snapshot["check_in"], snapshot["check_out"], sign * snapshot["guests"])
+
+
+@receiver(pre_save, sender=Booking)
+def remember_stored_booking(sender, instance, update_fields=None, raw=False, **kwargs):
+    instance._snapshot_before = None
+    if raw or instance.pk is None or not _tracked(update_fields):
+        return
+    instance._snapshot_before = _stored_snapshot(instance.pk)
+
+
+@receiver(post_save, sender=Booking)
+def update_aggregates_on_save(sender, instance, update_fields=None, raw=False, **kwargs):
+    if raw or not _tracked(update_fields):
+        return
+    after = stats.snapshot(instance)
+    before = getattr(instance, "_snapshot_before", None)
+    if before == after:
+        return
+
+    deltas = stats.booking_deltas([after])
+    if before is None:
+        occupancy.apply([_stay(after, 1)])
+    else:
+        if _stay(before, 1) != _stay(after, 1):
+            occupancy.apply([_stay(after, 1), _stay(before, -1)])
+        stats.booking_deltas([before], sign=-1, deltas=deltas)
+    stats.apply(deltas)
+
+
+def _deleting_hostel(origin):
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model is Hostel
+
+
+@receiver(post_delete, sender=Booking)
+def update_aggregates_on_delete(sender, instance, origin=None, **kwargs):
+    if _deleting_hostel(origin):
+        # The hostel's counters are being deleted along with it.
+        return
+    snapshot = stats.snapshot(instance)
+    occupancy.apply([_stay(snapshot, -1)])
+    stats.record_bookings([snapshot], sign=-1)
+
+
+@receiver(post_save, sender=Booking)
+def index_booking(sender, instance, update_fields=None, raw=False, **kwargs):
+    if not raw and (update_fields is None or SEARCHED_BOOKING_FIELDS & set(update_fields)):
+        search.index_bookings([instance.pk])
+
+
+@receiver(post_delete, sender=Booking)
+def forget_booking(sender, instance, **kwargs):
+    search.forget(search.BOOKING, [instance.pk])
+
+
+@receiver(post_save, sender=get_user_model())
+def index_user_bookings(sender, instance, update_fields=None, raw=False, created=False, **kwargs):
+    # Logins save last_login only, which is not searched.
+    if raw or created or not (update_fields is None or SEARCHED_USER_FIELDS & set(update_fields)):
+        return
+    search.index_bookings(Booking.objects.filter(user=instance).values_list("id", flat=True))
+
+
+@receiver(post_save, sender=Hostel)
+def index_hostel(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.index_hostels([instance.pk])
+
+
+@receiver(post_delete, sender=Hostel)
+def forget_hostel(sender, instance, **kwargs):
+    search.forget(search.HOSTEL, [instance.pk])
+
+
+@receiver(post_save, sender=Hostel)
+@receiver(post_save, sender=Room)
+def build_image_variants(sender, instance, raw=False, **kwargs):
+    if raw or not instance.image:
+        return
+    name = instance.image.name
+    if not images.has_variants(name):
+        jobs.enqueue(tasks.build_image_variants, {"name": name}, key=f"variants:{name}")
+
+
+def _amenities_changed(hostel_ids):
+    hostel_ids = list(hostel_ids)
+    # Also moves the hostels' fragment stamps (see reservations.fragments).
+    conditional.touch(hostel_ids)
+    # Amenity names are part of the hostels' search documents.
+    search.index_hostels(hostel_ids)
+
+
+@receiver(pre_save, sender=Room)
+def remember_room_hostel(sender, instance, raw=False, **kwargs):
+    instance._hostel_id_before = None
+    if not raw and instance.pk is not None:
+        instance._hostel_id_before = Room.objects.filter(pk=instance.pk).values_list("hostel_id", flat=True).first()
+
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+def invalidate_room_fragments(sender, instance, origin=None, **kwargs):
+    hostel_ids = [instance.hostel_id, getattr(instance, "_hostel_id_before", None)]
+    if not _deleting_hostel(origin):
+        conditional.touch(hostel_ids)
+
+
+@receiver(pre_delete, sender=Amenity)
+def remember_amenity_hostels(sender, instance, **kwargs):
+    instance._hostel_ids_before_delete = list(instance.hostels.values_list("id", flat=True))
+
+
+@receiver(post_save, sender=Amenity)
+@receiver(post_delete, sender=Amenity)
+def invalidate_amenity_fragments(sender, instance, created=False, **kwargs):
+    if created:
+        return
+    hostel_ids = getattr(instance, "_hostel_ids_before_delete", None)
+    if hostel_ids is None:
+        hostel_ids = instance.hostels.values_list("id", flat=True)
+    _amenities_changed(hostel_ids)
+
+
+@receiver(m2m_changed, sender=Hostel.amenities.through)
+def invalidate_amenity_links(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            _amenities_changed([instance.pk])
+        return
+    # amenity.hostels.add()/remove()/clear(): pk_set holds hostel ids, and
+    # clear() only reports them before the rows go.
+    if action == "pre_clear":
+        instance._hostel_ids_before_clear = list(instance.hostels.values_list("id", flat=True))
+    elif action == "post_clear":
+        _amenities_changed(instance._hostel_ids_before_clear)
+    elif action in ("post_add", "post_remove"):
+        _amenities_changed(pk_set)
@@ -0,0 +1,219 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.db.models import Q, Sum
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+
+from . import conditional
+from .models import ChangeCounter, DailyHostelStats, Hostel, Room
+
+COUNTER_FIELDS = ["bookings", "nights", "unpaid_count", "unpaid_amount", "occupied_beds"]
+# The ChangeCounter that goes up whenever the counters change.
+VERSION_COUNTER = "dashboard"
+DASHBOARD_TIMEOUT = 60 * 60 * 24
+
+
+def _nights(snapshot):
+    return (snapshot["check_out"] - snapshot["check_in"]).days
+
+
+def booking_deltas(snapshots, sign=1, deltas=None):
+    """Accumulate counter changes for bookings appearing (+1) or vanishing (-1)."""
+    deltas = deltas if deltas is not None else defaultdict(lambda: defaultdict(int))
+    # Stays with the same dates are spread over their nights once, which
+    # matters for bulk changes such as a cohort moving in.
+    stays = defaultdict(int)
+    for snapshot in snapshots:
+        hostel_id = snapshot["hostel_id"]
+        made = deltas[hostel_id, timezone.localdate(snapshot["created_at"])]
+        nights = _nights(snapshot)
+        made["bookings"] += sign
+        made["nights"] += sign * nights
+        if not snapshot["is_paid"]:
+            made["unpaid_count"] += sign
+            made["unpaid_amount"] += sign * nights * snapshot["price_per_night"]
+        stays[hostel_id, snapshot["check_in"], nights] += sign * snapshot["guests"]
+    for (hostel_id, check_in, nights), guests in stays.items():
+        for offset in range(nights):
+            deltas[hostel_id, check_in + timedelta(days=offset)]["occupied_beds"] += guests
+    return deltas
+
+
+def payment_deltas(snapshots, deltas=None):
+    deltas = deltas if deltas is not None else defaultdict(lambda: defaultdict(int))
+    for snapshot in snapshots:
+        made = deltas[snapshot["hostel_id"], timezone.localdate(snapshot["created_at"])]
+        made["unpaid_count"] -= 1
+        made["unpaid_amount"] -= _nights(snapshot) * snapshot["price_per_night"]
+    return deltas
+
+
+@transaction.atomic
+def apply(deltas):
+    """Add ``{(hostel_id, day): {field: delta}}`` to the daily counters.
+
+    Missing rows are created first; a row that only loses counts must
+    already exist. Every row is then incremented in place by one prepared
+    UPDATE run with ``executemany``, in (hostel, day) order so concurrent
+    writers lock rows in the same order.
+    """
+    deltas = {key: changes for key, changes in deltas.items() if any(changes.values())}
+    if not deltas:
+        return
+
+    connection = connections[router.db_for_write(DailyHostelStats)]
+    quote = connection.ops.quote_name
+    opts = DailyHostelStats._meta
+    _create_missing(
+        connection, [key for key, changes in deltas.items() if any(value > 0 for value in changes.values())]
+    )
+
+    assignments = ", ".join(
+        f"{quote(opts.get_field(field).column)} = {quote(opts.get_field(field).column)} + %s"
+        for field in COUNTER_FIELDS
+    )
+    sql = (
+        f"UPDATE {quote(opts.db_table)} SET {assignments} "
+        f"WHERE {quote(opts.get_field('hostel').column)} = %s AND {quote(opts.get_field('day').column)} = %s"
+    )
+    params = [
+        [*(changes.get(field, 0) for field in COUNTER_FIELDS), hostel_id, connection.ops.adapt_datefield_value(day)]
+        for (hostel_id, day), changes in sorted(deltas.items())
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+    bump()
+
+
+def _create_missing(connection, keys):
+    """Insert zeroed counter rows for ``(hostel_id, day)`` keys that have none.
+
+    One prepared INSERT that skips existing rows, run with ``executemany``;
+    ``bulk_create`` spends most of its time building model instances.
+    """
+    if not keys:
+        return
+    quote = connection.ops.quote_name
+    opts = DailyHostelStats._meta
+    fields = [opts.get_field(field) for field in ["hostel", "day", *COUNTER_FIELDS]]
+    sql = (
+        f"{connection.ops.insert_statement(on_conflict=OnConflict.IGNORE)} {quote(opts.db_table)} "
+        f"({', '.join(quote(field.column) for field in fields)}) VALUES ({', '.join(['%s'] * len(fields))}) "
+        f"{connection.ops.on_conflict_suffix_sql(fields, OnConflict.IGNORE, None, None)}"
+    )
+    params = [
+        [hostel_id, connection.ops.adapt_datefield_value(day), *(0 for _ in COUNTER_FIELDS)]
+        for hostel_id, day in sorted(keys)
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def bump():
+    """Mark the counters as changed once the current transaction commits.
+
+    The version lives in the database, so a change made by a command, the
+    sweeper or another web worker reaches every process's cached dashboard.
+    """
+    transaction.on_commit(lambda: ChangeCounter.bump(VERSION_COUNTER))
+
+
+async def aversion():
+    """The counters' version, read from the primary database like the counters themselves."""
+    return await ChangeCounter.aget(VERSION_COUNTER, using=DEFAULT_DB_ALIAS)
+
+
+def record_bookings(snapshots, sign=1):
+    apply(booking_deltas(snapshots, sign))
+
+
+def record_payments(snapshots):
+    apply(payment_deltas(snapshots))
+
+
+def record_payment(booking):
+    record_payments([snapshot(booking)])
+
+
+# Snapshot key -> lookup that reads it from a stored booking row.
+SNAPSHOT_LOOKUPS = {
+    "hostel_id": "hostel_id",
+    "room_id": "room_id",
+    "check_in": "check_in",
+    "check_out": "check_out",
+    "guests": "guests",
+    "created_at": "created_at",
+    "is_paid": "is_paid",
+    "price_per_night": "room__price_per_night",
+}
+
+
+def snapshot(booking):
+    """The booking fields the counters depend on."""
+    return {
+        "hostel_id": booking.hostel_id,
+        "room_id": booking.room_id,
+        "check_in": booking.check_in,
+        "check_out": booking.check_out,
+        "guests": booking.guests,
+        "created_at": booking.created_at,
+        "is_paid": booking.is_paid,
+        "price_per_night": booking.room.price_per_night,
+    }
+
+
+def _dashboard_totals(today):
+    week_start = today - timedelta(days=6)
+    month_start = today - timedelta(days=29)
+    return {
+        "weekly_bookings": Sum("bookings", filter=Q(day__gte=week_start, day__lte=today)),
+        "recent_bookings": Sum("bookings", filter=Q(day__gte=month_start, day__lte=today)),
+        "recent_nights": Sum("nights", filter=Q(day__gte=month_start, day__lte=today)),
+        "occupied_beds": Sum("occupied_beds", filter=Q(day__gte=month_start, day__lte=today)),
+        "unpaid_count": Sum("unpaid_count"),
+        "unpaid_amount": Sum("unpaid_amount"),
+    }
+
+
+def _dashboard_metrics(totals, beds, total_hostels):
+    beds = beds or 0
+    recent_bookings = totals["recent_bookings"] or 0
+    return {
+        "total_hostels": total_hostels,
+        "weekly_bookings": totals["weekly_bookings"] or 0,
+        "avg_stay": (totals["recent_nights"] or 0) / recent_bookings if recent_bookings else 0,
+        "unpaid_count": totals["unpaid_count"] or 0,
+        "unpaid_amount": totals["unpaid_amount"] or Decimal("0"),
+        "occupancy_rate": 100 * (totals["occupied_beds"] or 0) / (beds * 30) if beds else 0,
+    }
+
+
+def dashboard(today=None):
+    """Headline metrics for the home page, read from the daily counters."""
+    totals = DailyHostelStats.objects.aggregate(**_dashboard_totals(today or timezone.localdate()))
+    beds = Room.objects.aggregate(beds=Sum("beds"))["beds"]
+    return _dashboard_metrics(totals, beds, Hostel.objects.count())
+
+
+async def adashboard(today=None):
+    """Async version of :func:`dashboard`, cached until the counters or the hostels change or the day ends.
+
+    Computed from the primary database, as a lagging replica would store
+    old figures under the new version stamps.
+    """
+    today = today or timezone.localdate()
+    updated_at, hostels = await conditional.alisting_state()
+    listing = f"{hostels}:{updated_at.timestamp() if updated_at else 0}"
+    key = f"stats:dashboard:{await aversion()}:{listing}:{today}"
+    metrics = await cache.aget(key)
+    if metrics is None:
+        counters = DailyHostelStats.objects.using(DEFAULT_DB_ALIAS)
+        totals = await counters.aaggregate(**_dashboard_totals(today))
+        beds = (await Room.objects.using(DEFAULT_DB_ALIAS).aaggregate(beds=Sum("beds")))["beds"]
+        metrics = _dashboard_metrics(totals, beds, await Hostel.objects.using(DEFAULT_DB_ALIAS).acount())
+        await cache.aset(key, metrics, DASHBOARD_TIMEOUT)
+    return metrics
@@ -0,0 +1,72 @@
+"""Media storage that names uploads after their content.
+
+``hostels/front.jpg`` is stored as ``hostels/front.3f2a9c01b7de.jpg``: the
+first 12 hex digits of its SHA-256. A name therefore never changes meaning,
+so it can be cached forever, and uploading the same file again stores it once.
+Image variants already have immutable names and keep them. Receipts are
+not media: they live in the private ``receipts`` storage (``RECEIPT_ROOT``),
+and ``PRIVATE_PREFIXES`` keeps any left behind in ``MEDIA_ROOT`` by older
+releases from being served.
+"""
+
+import hashlib
+import os
+import re
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage, storages
+
+HASH_LENGTH = 12
+HASHED_NAME = re.compile(r"\.[0-9a-f]{%d}\.[^./]+$" % HASH_LENGTH)
+IMMUTABLE_PREFIXES = ("derived/",)
+PRIVATE_PREFIXES = ("receipts/",)
+
+
+def receipt_storage():
+    """Where receipt PDFs live: the private ``receipts`` storage, never MEDIA_ROOT."""
+    return storages["receipts"]
+
+
+def is_private(name):
+    return name.startswith(PRIVATE_PREFIXES)
+
+
+def is_immutable(name):
+    return name.startswith(IMMUTABLE_PREFIXES) or bool(HASHED_NAME.search(name))
+
+
+def hashed_name(name, content):
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks():
+        digest.update(chunk)
+    content.seek(0)
+    root, ext = os.path.splitext(name)
+    return f"{root}.{digest.hexdigest()[:HASH_LENGTH]}{ext}"
+
+
+class HashedMediaStorage(FileSystemStorage):
+    def get_available_name(self, name, max_length=None):
+        if is_immutable(name):
+            return super().get_available_name(name, max_length)
+        # The final name depends on the content and is chosen in _save();
+        # leave room in max_length for the ".<hash>" it adds.
+        excess = len(name) + HASH_LENGTH + 1 - max_length if max_length else 0
+        if excess > 0:
+            dir_name, file_name = os.path.split(name)
+            file_root, file_ext = os.path.splitext(file_name)
+            if excess >= len(file_root):
+                raise SuspiciousFileOperation(
+                    f'Storage can not find an available filename for "{name}". '
+                    'Please make sure that the corresponding file field allows sufficient "max_length".'
+                )
+            name = os.path.join(dir_name, file_root[:-excess] + file_ext)
+        return name
+
+    def _save(self, name, content):
+        if is_immutable(name):
+            return super()._save(name, content)
+        name = hashed_name(name, content)
+        if self.exists(name):
+            return name
+        return super()._save(name, content)
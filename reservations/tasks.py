@@ -0,0 +1,43 @@
+"""Background tasks queued by views and signals and run by ``run_workers``."""
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.template.loader import render_to_string
+
+from . import conditional, images, jobs, receipts
+from .models import ArchivedBooking, Booking, Hostel, Room
+
+
+@jobs.task()
+def render_receipt(booking_id):
+    for model in (Booking, ArchivedBooking):
+        booking = (
+            model.objects.select_related("hostel", "room").with_totals().filter(pk=booking_id, is_paid=True).first()
+        )
+        if booking is not None:
+            break
+    if booking is not None:
+        receipts.ensure_receipt(booking)
+
+
+@jobs.task()
+def build_image_variants(name):
+    if not images.build_variants(name):
+        return
+    # Pages cached before the variants existed show the original upload.
+    hostel_ids = set(Hostel.objects.filter(image=name).values_list("id", flat=True))
+    hostel_ids.update(Room.objects.filter(image=name).values_list("hostel_id", flat=True))
+    conditional.touch(hostel_ids)
+
+
+@jobs.task(max_attempts=5)
+def send_booking_confirmation(booking_id):
+    booking = Booking.objects.select_related("hostel", "room").with_totals().filter(pk=booking_id).first()
+    if booking is None:
+        return
+    send_mail(
+        f"Booking {booking.reference} at {booking.hostel.name}",
+        render_to_string("reservations/emails/booking_confirmation.txt", {"booking": booking}),
+        settings.DEFAULT_FROM_EMAIL,
+        [booking.guest_email],
+    )
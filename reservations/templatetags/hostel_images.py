@@ -0,0 +1,28 @@
+from django import template
+from django.utils.html import format_html
+
+from reservations import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(image, alt, sizes, width=320):
+    """A <picture> with WebP and JPEG ``srcset`` variants of an uploaded image.
+
+    Falls back to the upload itself until its variants have been built.
+    """
+    if not image:
+        return ""
+    if not images.has_variants(image.name):
+        return format_html('<img src="{}" alt="{}" loading="lazy" decoding="async" />', image.url, alt)
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}" />'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" loading="lazy" decoding="async" /></picture>',
+        images.srcset(image.name, "webp"),
+        sizes,
+        images.variant_url(image.name, width),
+        images.srcset(image.name, "jpg"),
+        sizes,
+        alt,
+    )
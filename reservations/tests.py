@@ -0,0 +1,682 @@
+import tempfile
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.http import Http404
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import allocation, fragments, holds, jobs, occupancy, search, settlement, stats, tasks
+from .availability import reserve
+from .media import serve_media
+from .models import Booking, ChangeCounter, DailyHostelStats, Hostel, Job, Room, RoomOccupancy
+from .pagination import akeyset_page, decode_cursor, encode_cursor, keyset_page
+from .storage import HashedMediaStorage, is_immutable
+
+
+def dashboard_counters():
+    """The non-zero dashboard counters by ``(hostel_id, day)``."""
+    return {
+        (row["hostel_id"], row["day"]): {field: row[field] for field in stats.COUNTER_FIELDS}
+        for row in DailyHostelStats.objects.values("hostel_id", "day", *stats.COUNTER_FIELDS)
+        if any(row[field] for field in stats.COUNTER_FIELDS)
+    }
+
+
+class LapsedHoldSearchTests(TestCase):
+    def setUp(self):
+        self.hostel = Hostel.objects.create(name="Hold Hostel", city="Dodoma", address="1 Campus Road")
+        self.room = Room.objects.create(hostel=self.hostel, name="Single", beds=1, price_per_night=5000)
+        self.check_in = timezone.localdate() + timedelta(days=10)
+        self.check_out = self.check_in + timedelta(days=3)
+
+    def hold(self, expires_at):
+        return Booking.objects.create(
+            hostel=self.hostel,
+            room=self.room,
+            guest_name="Held Guest",
+            guest_email="held@example.com",
+            check_in=self.check_in,
+            check_out=self.check_out,
+            guests=1,
+            hold_expires_at=expires_at,
+        )
+
+    def free_beds(self, results):
+        return {room["id"]: room["available_beds"] for hostel in results for room in hostel["rooms"]}
+
+    def test_lapsed_hold_frees_its_bed_before_the_sweep(self):
+        self.hold(timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(self.free_beds(occupancy.search(self.check_in, self.check_out)), {self.room.id: 1})
+        self.assertEqual(self.free_beds(async_to_sync(occupancy.asearch)(self.check_in, self.check_out)), {self.room.id: 1})
+        # The booking the search offers is accepted.
+        reserve(
+            Booking(
+                hostel=self.hostel,
+                room=self.room,
+                guest_name="New Guest",
+                guest_email="new@example.com",
+                check_in=self.check_in,
+                check_out=self.check_out,
+                guests=1,
+            )
+        )
+        self.assertEqual(self.free_beds(occupancy.search(self.check_in, self.check_out)), {})
+
+    def test_active_hold_keeps_its_bed(self):
+        self.hold(timezone.now() + timedelta(hours=1))
+
+        self.assertEqual(self.free_beds(occupancy.search(self.check_in, self.check_out)), {})
+        self.assertEqual(self.free_beds(async_to_sync(occupancy.asearch)(self.check_in, self.check_out)), {})
+
+
+class FragmentCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.hostel = Hostel.objects.create(name="Old Name", city="Dodoma", address="1 Campus Road")
+        self.room = Room.objects.create(hostel=self.hostel, name="Dorm", beds=4, price_per_night=5000)
+
+    def test_listing_follows_changes_made_by_other_processes(self):
+        self.assertIn("Old Name", fragments.listing_html())
+        # A write from another process sends no signal to this one's cache.
+        Hostel.objects.filter(pk=self.hostel.pk).update(name="New Name", updated_at=timezone.now())
+        self.assertIn("New Name", fragments.listing_html())
+
+    def test_listing_drops_deleted_hostels(self):
+        other = Hostel.objects.create(name="Gone Hostel", city="Arusha", address="2 Campus Road")
+        self.assertIn("Gone Hostel", fragments.listing_html())
+        Hostel.objects.filter(pk=other.pk).delete()
+        self.assertNotIn("Gone Hostel", fragments.listing_html())
+
+    def test_room_changes_replace_the_room_grid(self):
+        self.assertIn("Dorm", fragments.room_grid_html(self.hostel))
+        self.room.name = "Quiet Dorm"
+        self.room.save()
+        self.hostel.refresh_from_db()
+        self.assertIn("Quiet Dorm", fragments.room_grid_html(self.hostel))
+        self.assertEqual(fragments.stats()["hits"], 0)
+
+
+class DashboardStatsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.hostel = Hostel.objects.create(name="Stats Hostel", city="Dodoma", address="1 Campus Road")
+        self.room = Room.objects.create(hostel=self.hostel, name="Dorm", beds=6, price_per_night=5000)
+        self.today = timezone.localdate()
+
+    def book(self, days_ahead, nights, guests=1):
+        return Booking.objects.create(
+            hostel=self.hostel,
+            room=self.room,
+            guest_name="Stats Guest",
+            guest_email="stats@example.com",
+            check_in=self.today + timedelta(days=days_ahead),
+            check_out=self.today + timedelta(days=days_ahead + nights),
+            guests=guests,
+        )
+
+    def test_incremental_counters_match_a_backfill(self):
+        paid = self.book(-3, 4, guests=2)
+        moved = self.book(2, 3)
+        gone = self.book(5, 2)
+        paid.mark_paid()
+        moved.check_out += timedelta(days=2)
+        moved.save()
+        gone.delete()
+
+        incremental = dashboard_counters()
+        self.assertTrue(incremental)
+        call_command("backfill_dashboard_stats", stdout=StringIO())
+        self.assertEqual(incremental, dashboard_counters())
+
+    def test_dashboard_follows_changes_made_by_other_processes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.book(-1, 2)
+        self.assertEqual(async_to_sync(stats.adashboard)()["weekly_bookings"], 1)
+
+        # Another process writes the counters and bumps the version; this
+        # process's cached dashboard must not be served.
+        DailyHostelStats.objects.filter(hostel=self.hostel, day=self.today).update(bookings=F("bookings") + 4)
+        ChangeCounter.bump(stats.VERSION_COUNTER)
+        self.assertEqual(async_to_sync(stats.adashboard)()["weekly_bookings"], 5)
+
+
+class HomeValidatorTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.hostel = Hostel.objects.create(name="Etag Hostel", city="Dodoma", address="1 Campus Road")
+        self.user = User.objects.create_user("etag", password="unused-password")
+        self.client.force_login(self.user)
+        # Pages without a CSRF secret are always rendered and carry no ETag.
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = "a" * 32
+
+    def etag(self):
+        response = self.client.get(reverse("home"), HTTP_HOST="localhost")
+        self.assertEqual(response.status_code, 200)
+        return response["ETag"]
+
+    def test_etag_follows_writes_from_other_processes(self):
+        first = self.etag()
+        self.assertEqual(first, self.etag())
+        ChangeCounter.bump(stats.VERSION_COUNTER)
+        second = self.etag()
+        self.assertNotEqual(first, second)
+        Hostel.objects.filter(pk=self.hostel.pk).update(updated_at=timezone.now())
+        self.assertNotEqual(second, self.etag())
+
+
+class ReceiptStorageTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        receipt_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.addCleanup(receipt_root.cleanup)
+        self.media_root, self.receipt_root = Path(media_root.name), Path(receipt_root.name)
+        storages = {
+            **settings.STORAGES,
+            "default": {**settings.STORAGES["default"], "OPTIONS": {"location": self.media_root}},
+            "receipts": {**settings.STORAGES["receipts"], "OPTIONS": {"location": self.receipt_root}},
+        }
+        overrides = override_settings(STORAGES=storages, MEDIA_ROOT=self.media_root, RECEIPT_WAIT_SECONDS=0)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        self.user = User.objects.create_user("receipts", password="unused-password")
+        self.client.force_login(self.user)
+        hostel = Hostel.objects.create(name="Receipt Hostel", city="Dodoma", address="1 Campus Road")
+        room = Room.objects.create(hostel=hostel, name="Dorm", beds=4, price_per_night=5000)
+        check_in = timezone.localdate() + timedelta(days=3)
+        self.booking = Booking.objects.create(
+            user=self.user,
+            hostel=hostel,
+            room=room,
+            guest_name="Paying Guest",
+            guest_email="paying@example.com",
+            check_in=check_in,
+            check_out=check_in + timedelta(days=2),
+            guests=1,
+        )
+        self.booking.mark_paid()
+
+    def test_receipts_are_kept_out_of_media_root(self):
+        response = self.client.get(reverse("booking_receipt", args=[self.booking.id]), HTTP_HOST="localhost")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertIn("private", response["Cache-Control"])
+
+        self.booking.refresh_from_db()
+        self.assertTrue((self.receipt_root / self.booking.receipt_pdf.name).is_file())
+        self.assertEqual(list(self.media_root.rglob("*.pdf")), [])
+
+
+class MediaServingTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.media_root = Path(media_root.name)
+        overrides = override_settings(MEDIA_ROOT=self.media_root, MEDIA_OFFLOAD="")
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        for name in ("receipts/ab/abcdef.pdf", "hostels/front.3f2a9c01b7de.jpg"):
+            (self.media_root / name).parent.mkdir(parents=True, exist_ok=True)
+            (self.media_root / name).write_bytes(b"data")
+
+    def test_receipts_left_in_media_root_are_not_served(self):
+        with self.assertRaises(Http404):
+            serve_media(RequestFactory().get("/media/receipts/ab/abcdef.pdf"), "receipts/ab/abcdef.pdf")
+
+    def test_hashed_uploads_are_immutable(self):
+        response = serve_media(RequestFactory().get("/media/"), "hostels/front.3f2a9c01b7de.jpg")
+        self.assertIn("immutable", response["Cache-Control"])
+        response.close()
+
+
+class HashedMediaStorageTests(TestCase):
+    def setUp(self):
+        location = tempfile.TemporaryDirectory()
+        self.addCleanup(location.cleanup)
+        self.storage = HashedMediaStorage(location=location.name)
+
+    def test_long_names_fit_max_length_with_their_hash(self):
+        name = self.storage.save("hostels/" + "x" * 120 + ".jpg", ContentFile(b"photo"), max_length=100)
+        self.assertEqual(len(name), 100)
+        self.assertTrue(is_immutable(name))
+        self.assertTrue(self.storage.exists(name))
+
+    def test_same_content_is_stored_once(self):
+        first = self.storage.save("rooms/dorm.jpg", ContentFile(b"photo"), max_length=100)
+        self.assertEqual(first, self.storage.save("rooms/dorm.jpg", ContentFile(b"photo"), max_length=100))
+
+
+class BookingAdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "unused-password")
+        self.client.force_login(self.admin)
+        self.check_in = timezone.localdate() + timedelta(days=5)
+
+    def add_bookings(self, count):
+        for number in range(count):
+            user = User.objects.create_user(f"guest{Booking.objects.count()}")
+            hostel = Hostel.objects.create(name=f"Hostel {user.username}", city="Dodoma", address="1 Campus Road")
+            room = Room.objects.create(hostel=hostel, name="Dorm", beds=4, price_per_night=5000)
+            Booking.objects.create(
+                user=user,
+                hostel=hostel,
+                room=room,
+                guest_name=user.username,
+                guest_email=f"{user.username}@example.com",
+                check_in=self.check_in,
+                check_out=self.check_in + timedelta(days=2),
+                guests=1,
+            )
+
+    def changelist_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("admin:reservations_booking_changelist"), HTTP_HOST="localhost")
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_the_page(self):
+        self.add_bookings(2)
+        few = self.changelist_queries()
+        self.add_bookings(20)
+        self.assertEqual(few, self.changelist_queries())
+
+
+@override_settings(JOBS_EAGER=False)
+class HoldSweepTests(TestCase):
+    def setUp(self):
+        hostel = Hostel.objects.create(name="Sweep Hostel", city="Dodoma", address="1 Campus Road")
+        self.room = Room.objects.create(hostel=hostel, name="Dorm", beds=4, price_per_night=5000)
+        check_in = timezone.localdate() + timedelta(days=4)
+        self.lapsed, self.held = [
+            Booking.objects.create(
+                hostel=hostel,
+                room=self.room,
+                guest_name="Sweep Guest",
+                guest_email="sweep@example.com",
+                check_in=check_in,
+                check_out=check_in + timedelta(days=2),
+                guests=1,
+                hold_expires_at=timezone.now() + offset,
+            )
+            for offset in (timedelta(minutes=-5), timedelta(hours=1))
+        ]
+        for booking in (self.lapsed, self.held):
+            jobs.enqueue(tasks.send_booking_confirmation, {"booking_id": booking.id})
+            jobs.enqueue(tasks.render_receipt, {"booking_id": booking.id}, key=f"receipt:{booking.id}")
+
+    def test_sweep_removes_lapsed_holds_with_their_jobs(self):
+        self.assertEqual(holds.expire().expired, 1)
+
+        self.assertEqual(list(Booking.objects.values_list("id", flat=True)), [self.held.id])
+        self.assertEqual({job.payload["booking_id"] for job in Job.objects.all()}, {self.held.id})
+        self.assertEqual(Job.objects.count(), 2)
+        row = RoomOccupancy.objects.get(room=self.room)
+        self.assertEqual(occupancy.peak(row.start, row.counts, self.held.check_in, self.held.check_out), 1)
+
+
+class ReserveTests(TestCase):
+    def setUp(self):
+        self.hostel = Hostel.objects.create(name="Reserve Hostel", city="Dodoma", address="1 Campus Road")
+        self.room = Room.objects.create(hostel=self.hostel, name="Dorm", beds=3, price_per_night=5000)
+        self.check_in = timezone.localdate() + timedelta(days=7)
+
+    def booking(self, guests, days_after=0, nights=3):
+        check_in = self.check_in + timedelta(days=days_after)
+        return Booking(
+            hostel=self.hostel,
+            room=self.room,
+            guest_name="Reserving Guest",
+            guest_email="reserving@example.com",
+            check_in=check_in,
+            check_out=check_in + timedelta(days=nights),
+            guests=guests,
+        )
+
+    def test_reserve_fills_the_room_and_then_refuses(self):
+        reserve(self.booking(2))
+        reserve(self.booking(1, days_after=1))
+        with self.assertRaisesMessage(ValidationError, "fully booked"):
+            reserve(self.booking(1, days_after=2, nights=1))
+        self.assertEqual(Booking.objects.count(), 2)
+
+    def test_reserve_reports_the_beds_left(self):
+        reserve(self.booking(2))
+        with self.assertRaisesMessage(ValidationError, "Only 1 bed(s) left"):
+            reserve(self.booking(2, days_after=2))
+
+    def test_back_to_back_stays_share_beds(self):
+        reserve(self.booking(3))
+        reserve(self.booking(3, days_after=3))
+        self.assertEqual(Booking.objects.count(), 2)
+
+    def test_new_bookings_are_held(self):
+        booking = reserve(self.booking(1))
+        self.assertIsNotNone(Booking.objects.get(pk=booking.pk).hold_expires_at)
+
+
+class OccupancyCounterTests(TestCase):
+    def setUp(self):
+        self.hostel = Hostel.objects.create(name="Counter Hostel", city="Dodoma", address="1 Campus Road")
+        self.rooms = [
+            Room.objects.create(hostel=self.hostel, name=name, beds=6, price_per_night=5000) for name in ("A", "B")
+        ]
+        self.today = timezone.localdate()
+
+    def book(self, room, days_ahead, nights, guests):
+        return Booking.objects.create(
+            hostel=self.hostel,
+            room=room,
+            guest_name="Counted Guest",
+            guest_email="counted@example.com",
+            check_in=self.today + timedelta(days=days_ahead),
+            check_out=self.today + timedelta(days=days_ahead + nights),
+            guests=guests,
+        )
+
+    def nightly(self):
+        rows = {row.room_id: row for row in RoomOccupancy.objects.all()}
+        return {
+            room.id: [
+                occupancy.peak(row.start, row.counts, day, day + timedelta(days=1)) if row else 0
+                for day in (self.today + timedelta(days=offset) for offset in range(20))
+            ]
+            for room in self.rooms
+            for row in [rows.get(room.id)]
+        }
+
+    def test_signals_keep_counters_equal_to_a_rebuild(self):
+        first, second = self.rooms
+        kept = self.book(first, 1, 4, 2)
+        moved = self.book(first, 3, 3, 1)
+        resized = self.book(second, 0, 5, 3)
+        gone = self.book(second, 2, 2, 2)
+        self.book(first, -2, 4, 1)
+
+        moved.room = second
+        moved.check_in -= timedelta(days=1)
+        moved.save()
+        resized.guests = 1
+        resized.save()
+        gone.delete()
+        kept.check_out += timedelta(days=3)
+        kept.save()
+
+        incremental = self.nightly()
+        self.assertTrue(any(any(nights) for nights in incremental.values()))
+        occupancy.rebuild()
+        self.assertEqual(incremental, self.nightly())
+
+    def test_apply_ignores_releases_for_rooms_without_counters(self):
+        occupancy.apply([(self.rooms[0].id, self.today, self.today + timedelta(days=2), -1)])
+        self.assertFalse(RoomOccupancy.objects.exists())
+
+
+class KeysetCursorTests(TestCase):
+    def setUp(self):
+        hostel = Hostel.objects.create(name="Page Hostel", city="Dodoma", address="1 Campus Road")
+        room = Room.objects.create(hostel=hostel, name="Dorm", beds=50, price_per_night=5000)
+        check_in = timezone.localdate() + timedelta(days=3)
+        created_at = timezone.now()
+        for number in range(7):
+            booking = Booking.objects.create(
+                hostel=hostel,
+                room=room,
+                guest_name=f"Guest {number}",
+                guest_email="paged@example.com",
+                check_in=check_in,
+                check_out=check_in + timedelta(days=1),
+                guests=1,
+            )
+            # Two bookings share each timestamp, so the id breaks the tie.
+            Booking.objects.filter(pk=booking.pk).update(created_at=created_at - timedelta(minutes=number // 2))
+
+    def test_cursor_round_trip(self):
+        booking = Booking.objects.first()
+        self.assertEqual(decode_cursor(encode_cursor(booking)), (booking.created_at, booking.pk))
+
+    def test_malformed_cursors_decode_to_none(self):
+        # Bad base64, no separator, a bad date and a bad id.
+        for cursor in ("%%%", "bm90LWEtY3Vyc29y", "eWVzdGVyZGF5fDE", "MjAyNi0wMS0wMXxvbmU"):
+            with self.subTest(cursor=cursor):
+                self.assertIsNone(decode_cursor(cursor))
+
+    def test_pages_walk_forwards_and_back(self):
+        newest_first = list(Booking.objects.order_by("-created_at", "-id"))
+        bookings = Booking.objects.all()
+
+        first = keyset_page(bookings, size=3)
+        second = keyset_page(bookings, after=first.next_cursor, size=3)
+        third = keyset_page(bookings, after=second.next_cursor, size=3)
+        self.assertEqual(first.items + second.items + third.items, newest_first)
+        self.assertIsNone(first.previous_cursor)
+        self.assertIsNone(third.next_cursor)
+
+        back = keyset_page(bookings, before=second.previous_cursor, size=3)
+        self.assertEqual(back.items, first.items)
+        self.assertEqual(async_to_sync(akeyset_page)(bookings, after=first.next_cursor, size=3).items, second.items)
+
+    def test_malformed_cursor_starts_from_the_newest(self):
+        page = keyset_page(Booking.objects.all(), after="not-a-cursor", size=2)
+        self.assertEqual(page.items, list(Booking.objects.order_by("-created_at", "-id")[:2]))
+
+
+class SettlementTests(TestCase):
+    def setUp(self):
+        self.hostel = Hostel.objects.create(name="Settle Hostel", city="Dodoma", address="1 Campus Road")
+        self.room = Room.objects.create(hostel=self.hostel, name="Dorm", beds=10, price_per_night=5000)
+        self.due, self.paid, self.lapsed, self.short = [
+            self.book(hold_expires_at=timezone.now() + offset)
+            for offset in (timedelta(hours=1), timedelta(hours=1), timedelta(hours=-1), timedelta(hours=1))
+        ]
+        self.paid.mark_paid()
+
+    def book(self, **fields):
+        check_in = timezone.localdate() + timedelta(days=6)
+        return Booking.objects.create(
+            hostel=self.hostel,
+            room=self.room,
+            guest_name="Settling Guest",
+            guest_email="settling@example.com",
+            check_in=check_in,
+            check_out=check_in + timedelta(days=2),
+            guests=1,
+            **fields,
+        )
+
+    def test_settle_matches_references_and_reports_mismatches(self):
+        rows = [
+            {"reference": self.due.reference.lower(), "amount": "10,000", "paid_at": "2026-03-01"},
+            {"reference": str(self.due.id), "amount": "10000"},
+            {"reference": self.paid.reference, "amount": "10000"},
+            {"reference": self.lapsed.reference, "amount": "10000"},
+            {"reference": self.short.reference, "amount": "9000"},
+            {"reference": "BK-999999", "amount": "10000"},
+            {"reference": self.paid.receipt_number, "amount": "10000"},
+            {"reference": "", "amount": "10000"},
+            {"reference": self.short.reference, "amount": "ten thousand"},
+        ]
+        result = settlement.settle(enumerate(rows, start=2))
+
+        self.assertEqual((result.settled, result.amount), (1, Decimal("10000")))
+        self.assertEqual(
+            [(row["line"], row["reason"]) for row in result.mismatches],
+            [
+                (8, settlement.INVALID),
+                (9, settlement.INVALID),
+                (10, settlement.INVALID),
+                (3, settlement.DUPLICATE),
+                (4, settlement.ALREADY_PAID),
+                (5, settlement.HOLD_EXPIRED),
+                (6, settlement.AMOUNT),
+                (7, settlement.UNKNOWN),
+            ],
+        )
+        due = Booking.objects.get(pk=self.due.pk)
+        self.assertTrue(due.is_paid)
+        self.assertIsNone(due.hold_expires_at)
+        self.assertEqual(due.paid_at.date(), date(2026, 3, 1))
+        self.assertTrue(due.receipt_number)
+        self.assertFalse(Booking.objects.get(pk=self.short.pk).is_paid)
+
+    def test_dry_run_changes_nothing(self):
+        result = settlement.settle([(2, {"reference": self.due.reference, "amount": "10000"})], dry_run=True)
+        self.assertEqual(result.settled, 1)
+        self.assertFalse(Booking.objects.get(pk=self.due.pk).is_paid)
+
+    def test_settled_counters_match_a_backfill(self):
+        settlement.settle([(2, {"reference": self.due.reference, "amount": "10000"})])
+        settled = dashboard_counters()
+        call_command("backfill_dashboard_stats", stdout=StringIO())
+        self.assertEqual(settled, dashboard_counters())
+
+
+class SearchQueryTests(TestCase):
+    def setUp(self):
+        self.lodge = Hostel.objects.create(
+            name="Kilimanjaro Lodge", city="Moshi", address="1 Mountain Road", description="Near the park gate."
+        )
+        self.inn = Hostel.objects.create(
+            name="Campus Inn", city="Moshi", address="2 College Road", description="A short walk to Kilimanjaro views."
+        )
+        Hostel.objects.create(name="Harbour House", city="Dar es Salaam", address="3 Ocean Road")
+
+    def test_terms_are_lowercased_words_up_to_the_limit(self):
+        self.assertEqual(search.terms('Kili* "lodge" OR -inn'), ["kili", "lodge", "or", "inn"])
+        self.assertEqual(len(search.terms(" ".join(f"word{n}" for n in range(20)))), search.MAX_TERMS)
+
+    def test_terms_match_as_prefixes_of_every_word(self):
+        def found(query):
+            return set(Hostel.objects.filter(id__in=search.matching(search.HOSTEL, query)))
+
+        self.assertEqual(found("kilim"), {self.lodge, self.inn})
+        self.assertEqual(found("kilim road mount"), {self.lodge})
+        self.assertEqual(found("kilimanjaro or"), set())
+
+    def test_query_syntax_is_treated_as_words(self):
+        # Every word must still match, so operators never widen a search.
+        for query in ('"kilimanjaro', "kilimanjaro*)", "kilimanjaro:lodge", "NEAR(kili)", "-lodge ^kili"):
+            with self.subTest(query=query):
+                self.assertIn(self.lodge.id, search.ranked(search.HOSTEL, query))
+
+    def test_title_matches_rank_first(self):
+        self.assertEqual(search.ranked(search.HOSTEL, "kilimanjaro"), [self.lodge.id, self.inn.id])
+
+    def test_search_hostels_counts_cities_of_matches(self):
+        found = search.search_hostels("road", city="Moshi")
+        self.assertEqual(found["total"], 2)
+        self.assertEqual(found["cities"], [("Moshi", 2), ("Dar es Salaam", 1)])
+
+
+class AllocationTests(TestCase):
+    def setUp(self):
+        self.check_in = timezone.localdate() + timedelta(days=20)
+        self.rooms = {}
+        for name, price in (("North", 5000), ("South", 5000), ("East", 9000)):
+            hostel = Hostel.objects.create(name=f"{name} Hall", city="Dodoma", address=f"{name} Road")
+            self.rooms[name] = Room.objects.create(hostel=hostel, name="Single", beds=1, price_per_night=price)
+
+    def student(self, name, **fields):
+        return {
+            "student": name,
+            "email": f"{name.lower()}@example.com",
+            "check_in": self.check_in.isoformat(),
+            "check_out": (self.check_in + timedelta(days=30)).isoformat(),
+            "city": "Dodoma",
+            **fields,
+        }
+
+    def placements(self, result):
+        return {row["student"]: (row["status"], row["hostel"] if "hostel" in row else "") for row in result.rows}
+
+    def test_repair_moves_a_flexible_student_to_place_a_constrained_one(self):
+        records = [
+            self.student("Asha", hostels="North Hall;South Hall"),
+            self.student("Baraka", hostels=["North Hall", "South Hall"]),
+            self.student("Chausiku", budget="5,000"),
+        ]
+        result = allocation.allocate(enumerate(records, start=2))
+
+        self.assertEqual(result.moved, 1)
+        self.assertEqual(result.statuses[allocation.PLACED], 3)
+        placements = self.placements(result)
+        self.assertEqual(placements["Asha"], (allocation.PLACED, "East Hall"))
+        self.assertEqual(placements["Chausiku"][1], "North Hall")
+        self.assertEqual(result.rows[0]["detail"], "moved to make room")
+        self.assertEqual(
+            set(Booking.objects.values_list("guest_name", "room__hostel__name")),
+            {("Asha", "East Hall"), ("Baraka", "South Hall"), ("Chausiku", "North Hall")},
+        )
+
+    def booked_beds(self):
+        # rebuild() writes a row for every room, booked or not.
+        check_out = self.check_in + timedelta(days=30)
+        beds = {
+            row.room_id: occupancy.peak(row.start, row.counts, self.check_in, check_out)
+            for row in RoomOccupancy.objects.all()
+        }
+        return {room_id: count for room_id, count in beds.items() if count}
+
+    def test_counters_match_a_rebuild_and_a_backfill(self):
+        allocation.allocate(enumerate([self.student("Asha"), self.student("Baraka")], start=2))
+
+        beds, counters = self.booked_beds(), dashboard_counters()
+        self.assertEqual(sum(beds.values()), 2)
+        occupancy.rebuild()
+        call_command("backfill_dashboard_stats", stdout=StringIO())
+        self.assertEqual(beds, self.booked_beds())
+        self.assertEqual(counters, dashboard_counters())
+
+    def test_rejections_are_reported(self):
+        Booking.objects.create(
+            hostel=self.rooms["East"].hostel,
+            room=self.rooms["East"],
+            guest_name="Booked",
+            guest_email="booked@example.com",
+            check_in=self.check_in,
+            check_out=self.check_in + timedelta(days=2),
+            guests=1,
+        )
+        records = [
+            self.student("Booked"),
+            self.student("Asha"),
+            self.student("Asha"),
+            self.student("Baraka", hostels="Nowhere Hall"),
+            self.student("Chausiku", city="Arusha"),
+            self.student("Dotto", room_type="suite"),
+        ]
+        result = allocation.allocate(enumerate(records, start=2), dry_run=True)
+
+        self.assertEqual(
+            [row["status"] for row in result.rows],
+            [
+                allocation.ALREADY_BOOKED,
+                allocation.PLACED,
+                allocation.DUPLICATE,
+                allocation.INVALID,
+                allocation.NO_MATCH,
+                allocation.INVALID,
+            ],
+        )
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_students_beyond_the_free_beds_are_left_unplaced(self):
+        records = [self.student(f"Student{number}", budget="5000") for number in range(3)]
+        result = allocation.allocate(enumerate(records, start=2))
+        self.assertEqual(result.statuses, {allocation.PLACED: 2, allocation.NO_BED: 1})
+        self.assertEqual(result.rows[2]["status"], allocation.NO_BED)
@@ -4,10 +4,15 @@ from . import views
 urlpatterns = [
     path("accounts/signup/", views.signup, name="signup"),
     path("", views.home, name="home"),
+    path("search/", views.hostel_search, name="hostel_search"),
+    path("search/availability/", views.availability_search, name="availability_search"),
     path("hostels/<int:hostel_id>/", views.hostel_detail, name="hostel_detail"),
     path("hostels/<int:hostel_id>/book/", views.book_hostel, name="book_hostel"),
     path("bookings/<int:booking_id>/success/", views.booking_success, name="booking_success"),
     path("bookings/<int:booking_id>/payment/", views.booking_payment, name="booking_payment"),
     path("bookings/<int:booking_id>/receipt/", views.booking_receipt, name="booking_receipt"),
     path("bookings/", views.bookings_list, name="bookings_list"),
+    path("bookings/earlier/", views.archived_bookings, name="archived_bookings"),
+    path("reports/", views.staff_reports, name="staff_reports"),
+    path("reports/payments/", views.payment_export, name="payment_export"),
 ]
@@ -1,30 +1,135 @@
-import os
-from decimal import Decimal
-
+from asgiref.sync import sync_to_async
 from django.conf import settings
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import login as auth_login, authenticate
 from django.contrib.auth.forms import AuthenticationForm
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse
 from django.utils import timezone
-from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.shortcuts import aget_object_or_404, get_object_or_404, redirect, render
 from django.urls import reverse
-from .models import Hostel, Booking
-from .forms import BookingForm, SignupForm, PaymentForm
+from . import bulk, conditional, fragments, holds, jobs, occupancy, receipts, reports, search, stats, tasks
+from .availability import reserve
+from .models import ArchivedBooking, Hostel, Booking
+from .pagination import akeyset_page
+from .forms import AvailabilitySearchForm, BookingForm, HostelSearchForm, PaymentExportForm, SignupForm, PaymentForm
+
+
+async def _resolve_user(request):
+    # Templates read request.user synchronously; load it on the async path
+    # first so rendering never touches the database.
+    request.user = await request.auser()
 
 
 @login_required
-def home(request):
-    hostels = Hostel.objects.prefetch_related("amenities").all().order_by("name")
-    return render(request, "reservations/home.html", {"hostels": hostels})
+async def home(request):
+    await _resolve_user(request)
+    # The metrics follow the booking counters and the date, so the page has
+    # an ETag but no Last-Modified. Both parts of it are database state,
+    # so a write made by any process changes it.
+    page = conditional.validators(
+        request, await conditional.alisting_state(), await stats.aversion(), timezone.localdate()
+    )
+    if (response := conditional.not_modified(request, page)) is not None:
+        return response
+    listing_html = await sync_to_async(fragments.listing_html)()
+    response = render(
+        request,
+        "reservations/home.html",
+        {"listing_html": listing_html, "metrics": await stats.adashboard()},
+    )
+    return conditional.finish(response, page)
 
 
 @login_required
-def hostel_detail(request, hostel_id):
-    hostel = get_object_or_404(Hostel, id=hostel_id)
-    rooms = hostel.rooms.all().order_by("price_per_night")
-    return render(request, "reservations/hostel_detail.html", {"hostel": hostel, "rooms": rooms})
+async def hostel_detail(request, hostel_id):
+    await _resolve_user(request)
+    updated_at = await conditional.ahostel_updated_at(hostel_id)
+    if updated_at is None:
+        raise Http404("No Hostel matches the given query.")
+    page = conditional.validators(request, "hostel", hostel_id, updated_at=updated_at)
+    if (response := conditional.not_modified(request, page)) is not None:
+        return response
+    hostel = await aget_object_or_404(Hostel, id=hostel_id)
+    response = render(
+        request,
+        "reservations/hostel_detail.html",
+        {"hostel": hostel, "room_grid": await sync_to_async(fragments.room_grid_html)(hostel)},
+    )
+    return conditional.finish(response, page)
+
+
+@login_required
+async def availability_search(request):
+    form = AvailabilitySearchForm(request.GET)
+    # Validating the amenity choices queries the database.
+    if not await sync_to_async(form.is_valid)():
+        return JsonResponse({"errors": form.errors}, status=400)
+
+    data = form.cleaned_data
+    hostels = await occupancy.asearch(
+        data["check_in"],
+        data["check_out"],
+        guests=data["guests"] or 1,
+        city=data["city"],
+        max_price=data["max_price"],
+        amenities=data["amenity"],
+    )
+    return JsonResponse(
+        {
+            "check_in": data["check_in"].isoformat(),
+            "check_out": data["check_out"].isoformat(),
+            "hostels": hostels,
+        }
+    )
+
+
+def _facet_url(params, key, value):
+    """The current search with ``value`` toggled for ``key``."""
+    query = params.copy()
+    values = query.getlist(key)
+    if key == "city":
+        values = [] if value in values else [value]
+    else:
+        values = [other for other in values if other != value] if value in values else values + [value]
+    query.setlist(key, values)
+    return "?" + query.urlencode()
+
+
+def _search_page(params):
+    form = HostelSearchForm(params)
+    form.is_valid()
+    data = form.cleaned_data
+    query, city, amenities = data.get("q", ""), data.get("city", ""), data.get("amenity") or []
+    results = search.search_hostels(query, city, [amenity.id for amenity in amenities])
+    chosen = {amenity.name for amenity in amenities}
+    return {
+        "form": form,
+        "query": query,
+        "total": results["total"],
+        "limit": results["limit"],
+        "rows_html": fragments.rows_html(results["hostel_ids"]),
+        "cities": [
+            {"name": name, "count": count, "active": name == city, "url": _facet_url(params, "city", name)}
+            for name, count in results["cities"]
+        ],
+        "amenities": [
+            {"name": name, "count": count, "active": name in chosen, "url": _facet_url(params, "amenity", name)}
+            for _, name, count in results["amenities"]
+        ],
+    }
+
+
+@login_required
+async def hostel_search(request):
+    await _resolve_user(request)
+    context = await sync_to_async(_search_page)(request.GET)
+    return render(request, "reservations/search.html", context)
 
 
 @login_required
@@ -38,8 +143,13 @@ def book_hostel(request, hostel_id):
             booking = form.save(commit=False)
             booking.hostel = hostel
             booking.user = request.user
-            booking.save()
-            return redirect(reverse("booking_success", args=[booking.id]))
+            try:
+                reserve(booking)
+            except ValidationError as exc:
+                form.add_error(None, exc)
+            else:
+                jobs.enqueue(tasks.send_booking_confirmation, {"booking_id": booking.id})
+                return redirect(reverse("booking_success", args=[booking.id]))
     else:
         form = BookingForm(room_queryset=rooms)
 
@@ -48,27 +158,53 @@ def book_hostel(request, hostel_id):
 
 @login_required
 def booking_success(request, booking_id):
-    booking = get_object_or_404(Booking, id=booking_id, user=request.user)
+    booking = get_object_or_404(
+        Booking.objects.select_related("hostel", "room").with_totals(), id=booking_id, user=request.user
+    )
     return render(request, "reservations/booking_success.html", {"booking": booking})
 
 
 @login_required
-def bookings_list(request):
-    bookings = (
-        Booking.objects.select_related("hostel", "room")
-        .filter(user=request.user)
-        .order_by("-created_at")
-    )
-    return render(request, "reservations/bookings_list.html", {"bookings": bookings})
+async def bookings_list(request):
+    await _resolve_user(request)
+    bookings = Booking.objects.select_related("hostel", "room").with_totals().filter(user=request.user)
+    page = await akeyset_page(bookings, after=request.GET.get("after"), before=request.GET.get("before"))
+    return render(request, "reservations/bookings_list.html", {"bookings": page, "page": page})
+
+
+@login_required
+async def archived_bookings(request):
+    """The guest's stays from archived years, with their receipts."""
+    await _resolve_user(request)
+    bookings = ArchivedBooking.objects.select_related("hostel", "room").filter(user=request.user)
+    page = await akeyset_page(bookings, after=request.GET.get("after"), before=request.GET.get("before"))
+    return render(request, "reservations/archived_bookings.html", {"bookings": page, "page": page})
+
+
+def _hold_expired(request, booking):
+    messages.error(request, f"The hold on booking {booking.reference} has expired. Please book again.")
+    return redirect("hostel_detail", hostel_id=booking.hostel_id)
 
 
 @login_required
 def booking_payment(request, booking_id):
-    booking = get_object_or_404(Booking, id=booking_id, user=request.user)
+    booking = get_object_or_404(
+        Booking.objects.select_related("hostel").with_totals(), id=booking_id, user=request.user
+    )
+    if booking.hold_expired:
+        return _hold_expired(request, booking)
+
     if request.method == "POST":
         form = PaymentForm(request.POST)
         if form.is_valid():
-            booking.mark_paid()
+            with transaction.atomic():
+                # The sweeper skips locked rows, so the hold cannot be
+                # released while the payment is recorded.
+                if not Booking.objects.select_for_update().filter(pk=booking.pk).exclude(holds.lapsed()).exists():
+                    return _hold_expired(request, booking)
+                booking.mark_paid()
+            # Render the receipt now so it is usually ready by the first download.
+            jobs.enqueue(tasks.render_receipt, {"booking_id": booking.id}, key=f"receipt:{booking.id}")
             return redirect("booking_success", booking_id=booking.id)
     else:
         form = PaymentForm()
@@ -81,127 +217,91 @@ def booking_payment(request, booking_id):
 
 
 @login_required
-def booking_receipt(request, booking_id):
-    booking = get_object_or_404(Booking, id=booking_id, user=request.user)
+async def booking_receipt(request, booking_id):
+    await _resolve_user(request)
+    booking = await (
+        Booking.objects.select_related("hostel", "room").with_totals().filter(id=booking_id, user=request.user).afirst()
+    )
+    if booking is None:
+        # Receipts of archived stays stay available.
+        booking = await aget_object_or_404(
+            ArchivedBooking.objects.select_related("hostel", "room").with_totals(),
+            id=booking_id,
+            user=request.user,
+            is_paid=True,
+        )
     if not booking.is_paid:
         return redirect("booking_payment", booking_id=booking.id)
 
-    from reportlab.lib import colors
-    from reportlab.lib.pagesizes import letter
-    from reportlab.lib.units import inch
-    from reportlab.pdfgen import canvas
-
-    def format_tzs(value):
-        if value is None:
-            return "TZS 0"
-        if not isinstance(value, Decimal):
-            try:
-                value = Decimal(value)
-            except Exception:
-                return f"TZS {value}"
-        return f"TZS {value:,.0f}"
-
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = f'attachment; filename="receipt-{booking.id}.pdf"'
-
-    c = canvas.Canvas(response, pagesize=letter)
-    width, height = letter
-
-    # Layout inspired by the provided receipt template.
-    page_margin = 36
-    receipt_width = 300
-    receipt_height = height - 2 * page_margin
-    receipt_x = page_margin
-    receipt_y = page_margin
-    aside_x = receipt_x + receipt_width + 28
-
-    # Receipt card
-    c.setFillColor(colors.white)
-    c.setStrokeColor(colors.HexColor("#d5dbe3"))
-    c.setLineWidth(1)
-    c.roundRect(receipt_x, receipt_y, receipt_width, receipt_height, 6, fill=1, stroke=1)
-
-    # Logo + header
-    logo_path = os.path.join(settings.BASE_DIR, "static", "images", "logo.png")
-    if os.path.exists(logo_path):
-        c.drawImage(
-            logo_path,
-            receipt_x + 16,
-            height - 110,
-            width=58,
-            height=58,
-            preserveAspectRatio=True,
-            mask="auto",
+    name = await receipts.astored_receipt(booking)
+    if name is None:
+        # Rendering happens in run_workers, not in this web worker.
+        await sync_to_async(jobs.enqueue)(
+            tasks.render_receipt, {"booking_id": booking.id}, key=f"receipt:{booking.id}"
         )
-    c.setFillColor(colors.HexColor("#2d3748"))
-    c.setFont("Helvetica-Bold", 12)
-    c.drawString(receipt_x + 80, height - 70, "STUDENT HUB HOSTEL")
-    c.setFont("Helvetica", 9)
-    c.setFillColor(colors.HexColor("#4a5568"))
-    c.drawString(receipt_x + 80, height - 84, "PAYMENT RECEIPT")
-
-    # Key details block
-    c.setFont("Helvetica", 9)
-    c.setFillColor(colors.HexColor("#4a5568"))
-    c.drawString(receipt_x + 16, height - 135, f"Receipt #: {booking.receipt_number}")
-    c.drawString(receipt_x + 16, height - 150, f"Date: {booking.paid_at.strftime('%Y-%m-%d %H:%M')}")
-
-    # Table header
-    table_top = height - 185
-    c.setFillColor(colors.HexColor("#edf2f7"))
-    c.rect(receipt_x + 12, table_top - 20, receipt_width - 24, 20, fill=1, stroke=0)
-    c.setFillColor(colors.HexColor("#2d3748"))
-    c.setFont("Helvetica-Bold", 9)
-    c.drawString(receipt_x + 18, table_top - 14, "Description")
-    c.drawRightString(receipt_x + receipt_width - 18, table_top - 14, "Amount")
-
-    # Table rows
-    c.setFont("Helvetica", 9)
-    c.setFillColor(colors.HexColor("#2d3748"))
-    row_y = table_top - 38
-    line_gap = 16
-    c.drawString(receipt_x + 18, row_y, f"Hostel: {booking.hostel.name}")
-    c.drawRightString(receipt_x + receipt_width - 18, row_y, format_tzs(booking.amount_paid))
-    row_y -= line_gap
-    c.setFillColor(colors.HexColor("#4a5568"))
-    c.drawString(receipt_x + 18, row_y, f"Room: {booking.room.name}")
-    row_y -= line_gap
-    c.drawString(receipt_x + 18, row_y, f"Dates: {booking.check_in} to {booking.check_out}")
-    row_y -= line_gap
-    c.drawString(receipt_x + 18, row_y, f"Nights: {booking.nights}")
-    row_y -= line_gap
-    c.drawString(receipt_x + 18, row_y, f"Guest: {booking.guest_name}")
-    row_y -= line_gap
-    c.drawString(receipt_x + 18, row_y, f"Email: {booking.guest_email}")
-
-    # Total section
-    total_y = receipt_y + 70
-    c.setFillColor(colors.HexColor("#f7fafc"))
-    c.rect(receipt_x + 12, total_y, receipt_width - 24, 32, fill=1, stroke=0)
-    c.setFillColor(colors.HexColor("#2d3748"))
-    c.setFont("Helvetica-Bold", 10)
-    c.drawString(receipt_x + 18, total_y + 10, "TOTAL PAID")
-    c.drawRightString(receipt_x + receipt_width - 18, total_y + 10, format_tzs(booking.amount_paid))
-
-    # Footer note
-    c.setFont("Helvetica", 8.5)
-    c.setFillColor(colors.HexColor("#718096"))
-    c.drawString(receipt_x + 16, receipt_y + 30, "Payment confirmed. Thank you for your booking.")
-
-    # Right-side panel (title + tagline)
-    c.setFillColor(colors.HexColor("#2d3748"))
-    c.setFont("Helvetica-Bold", 18)
-    c.drawString(aside_x, height - 120, "Payment Receipt")
-    c.setFont("Helvetica", 9.5)
-    c.setFillColor(colors.HexColor("#4a5568"))
-    c.drawString(aside_x, height - 150, "Keep this receipt for your records.")
-    c.drawString(aside_x, height - 165, "We appreciate your stay.")
-
-    c.showPage()
-    c.save()
+        name = await receipts.await_receipt(booking, settings.RECEIPT_WAIT_SECONDS)
+    if name is None:
+        # No worker got to it in time, or none is running.
+        name = await sync_to_async(receipts.ensure_receipt)(booking)
+
+    etag = receipts.receipt_etag(name)
+    last_modified = int(booking.paid_at.timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        # Receipts are small; reading them whole avoids a sync file iterator
+        # on the event loop.
+        response = HttpResponse(await receipts.aread_receipt(name), content_type="application/pdf")
+        response["Content-Disposition"] = f'attachment; filename="receipt-{booking.id}.pdf"'
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    patch_cache_control(response, private=True, max_age=86400)
     return response
 
 
+@staff_member_required
+def staff_reports(request):
+    years = reports.available_years()
+    try:
+        year = int(request.GET.get("year", ""))
+    except ValueError:
+        year = timezone.localdate().year
+    if year not in years:
+        year = timezone.localdate().year
+    hostels = list(Hostel.objects.order_by("name").values_list("id", "name"))
+    hostel_id = request.GET.get("hostel")
+    hostel_id = int(hostel_id) if hostel_id and hostel_id.isdigit() else None
+    if hostel_id not in {None, *(pk for pk, _ in hostels)}:
+        hostel_id = None
+    return render(
+        request,
+        "reservations/reports.html",
+        {
+            "report": reports.report(year, hostel_id),
+            "years": years,
+            "hostels": hostels,
+            "hostel_id": hostel_id,
+        },
+    )
+
+
+@staff_member_required
+def payment_export(request):
+    """Stream payments for accounting, filtered by hostel and payment date."""
+    form = PaymentExportForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(" ".join(message for errors in form.errors.values() for message in errors))
+    since, until, hostel = (form.cleaned_data[key] for key in ("since", "until", "hostel"))
+    # Payments of archived stays are merged in by payment time.
+    bookings = [bulk.payments(model.objects.all(), since, until) for model in (ArchivedBooking, Booking)]
+    filename = "payments"
+    if hostel:
+        bookings = [queryset.filter(hostel=hostel) for queryset in bookings]
+        filename += f"-hostel{hostel.id}"
+    if since or until:
+        filename += f"-{since or 'start'}-to-{until or 'now'}"
+    return bulk.export_response(request, bookings, form.cleaned_data["format"] or "xlsx", filename, bulk.PAYMENTS)
+
+
 def signup(request):
     if request.method == "POST":
         form = SignupForm(request.POST)